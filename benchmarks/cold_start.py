@@ -0,0 +1,167 @@
+"""Measure cold start: module import time and time to the first recognition.
+
+Examples:
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --repeat 5 --ui-setup 1.5 --json startup.json
+
+Every measurement runs in a fresh interpreter so nothing is already
+imported or cached in memory.
+
+    imports  seconds to import each entry module, and the slowest imports
+             underneath them (python -X importtime)
+    cold     build the UI (a --ui-setup second stand-in), load the gallery,
+             then recognise the first frame; dlib's models load inside
+             that first call, one step after another
+    warm     the GUI's start-up path: a background Warmup loads the gallery
+             and the models while the UI is built, then the first frame
+             is recognised
+
+time_to_first_s runs from the first project import to the first
+recognition result.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODULES = ['gui', 'check_in', 'monitor', 'detection', 'face_recognition']
+
+def run_child(args, *child_args: str) -> dict:
+    """Run this script in a fresh interpreter and return the JSON it prints last."""
+    command = [sys.executable, os.path.abspath(__file__), *child_args]
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    lines = [line for line in result.stdout.splitlines() if line.startswith('{')]
+    if result.returncode != 0 or not lines:
+        return {'skipped': (result.stderr.strip().splitlines() or ['no output'])[-1]}
+    return json.loads(lines[-1])
+
+def child_import(module: str):
+    started = time.perf_counter()
+    __import__(module)
+    print(json.dumps({'import_s': time.perf_counter() - started}))
+
+def child_recognise(mode: str, frames: str, faces: str, ui_setup: float):
+    started = time.perf_counter()
+    import cv2
+    from detection import DetectionRegion, detect_faces, face_recognition, warm_up
+    from gallery import FaceGallery
+    from startup import Warmup
+    imported = time.perf_counter()
+    import_seconds = imported - started
+    # Reading the test frame is benchmark harness, not start-up: leave it out of the times
+    from run import load_frames
+    loaded = load_frames(frames, limit=1)
+    if not loaded:
+        raise SystemExit(f"No frames found at {frames}")
+    frame = loaded[0]
+    started += time.perf_counter() - imported
+    galleries = []
+    
+    def load_gallery():
+        galleries.append(FaceGallery.load_dir(faces))
+        galleries[0].warm()
+    
+    if mode == 'warm':
+        warmup = Warmup([('gallery', load_gallery), ('models', warm_up)]).start()
+        time.sleep(ui_setup)  # Stand-in for building the UI and opening the camera
+        warmup.wait()
+    else:
+        time.sleep(ui_setup)
+        load_gallery()
+    ready = time.perf_counter()
+    gallery = galleries[0]
+    locations, _ = detect_faces(frame, DetectionRegion(None), 1.0, 1)
+    encodings = face_recognition.face_encodings(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), locations)
+    matches = [gallery.match(encoding, tolerance=0.6) for encoding in encodings]
+    finished = time.perf_counter()
+    print(json.dumps({
+        'import_s': import_seconds,
+        'ready_s': ready - started,
+        'recognition_s': finished - ready,
+        'time_to_first_s': finished - started,
+        'faces': len(locations),
+        'recognised': sum(1 for student_id, _ in matches if student_id is not None)
+    }))
+
+def slowest_imports(module: str, top: int) -> List[dict]:
+    """Largest cumulative import times under module, from python -X importtime."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        try:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            rows.append({'module': name.strip(), 'cumulative_ms': int(cumulative) / 1000.0})
+        except ValueError:
+            continue  # The header line
+    rows = [row for row in rows if row['module'] != module]
+    return sorted(rows, key=lambda row: row['cumulative_ms'], reverse=True)[:top]
+
+def summarise(runs: List[dict], key: str) -> Dict[str, float]:
+    values = [run[key] for run in runs if key in run]
+    if not values:
+        return {}
+    return {'median_s': statistics.median(values), 'min_s': min(values), 'max_s': max(values)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', default=','.join(MODULES), help='comma separated modules to import')
+    parser.add_argument('--frames', default=os.path.join(ROOT, 'faces', '*.jpg'),
+                        help='video file, image directory or glob; the first frame is recognised')
+    parser.add_argument('--faces', default=os.path.join(ROOT, 'faces'), help='gallery directory')
+    parser.add_argument('--repeat', type=int, default=3, help='fresh interpreters per measurement')
+    parser.add_argument('--ui-setup', type=float, default=1.0,
+                        help='seconds the warm mode spends "building the UI" while models load')
+    parser.add_argument('--top', type=int, default=5, help='slowest imports to list per module')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--child', nargs='+', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        if args.child[0] == 'import':
+            child_import(args.child[1])
+        else:
+            child_recognise(args.child[0], args.frames, args.faces, args.ui_setup)
+        return
+    
+    results = {'imports': {}, 'first_recognition': {}}
+    for module in args.modules.split(','):
+        runs = [run_child(args, '--child', 'import', module) for _ in range(args.repeat)]
+        skipped = [run['skipped'] for run in runs if 'skipped' in run]
+        if skipped:
+            results['imports'][module] = {'skipped': skipped[0]}
+            print(f"import {module:18s} skipped: {skipped[0]}")
+            continue
+        results['imports'][module] = dict(summarise(runs, 'import_s'), slowest=slowest_imports(module, args.top))
+        print(f"import {module:18s} {results['imports'][module]['median_s'] * 1000:8.1f}ms  "
+              f"(slowest: {', '.join(row['module'] for row in results['imports'][module]['slowest'][:3])})")
+    for mode in ('cold', 'warm'):
+        runs = [run_child(args, '--frames', args.frames, '--faces', args.faces, '--ui-setup', str(args.ui_setup),
+                          '--child', mode) for _ in range(args.repeat)]
+        skipped = [run['skipped'] for run in runs if 'skipped' in run]
+        if skipped:
+            results['first_recognition'][mode] = {'skipped': skipped[0]}
+            print(f"{mode:5s} skipped: {skipped[0]}")
+            continue
+        results['first_recognition'][mode] = {key: summarise(runs, key)
+                                              for key in ('import_s', 'ready_s', 'recognition_s', 'time_to_first_s')}
+        stats = results['first_recognition'][mode]
+        print(f"{mode:5s} import {stats['import_s']['median_s']:.2f}s  ready {stats['ready_s']['median_s']:.2f}s  "
+              f"first recognition {stats['recognition_s']['median_s']:.2f}s  "
+              f"time to first {stats['time_to_first_s']['median_s']:.2f}s")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
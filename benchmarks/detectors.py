@@ -0,0 +1,189 @@
+"""Compare face detector backends for speed and recall on recorded frames.
+
+Examples:
+    python benchmarks/detectors.py --frames recordings/room1.mp4
+    python benchmarks/detectors.py --frames recordings/hall/ --backends hog,yunet,haar,hog+haar --min-face 24
+    python benchmarks/detectors.py --frames recordings/hall.mp4 --save-labels hall_labels.json
+    python benchmarks/detectors.py --frames recordings/hall.mp4 --labels hall_labels.json --json out.json
+
+Every backend runs through detect_faces at the scale the monitor would
+pick for --min-face, so the numbers match what a camera configured with
+that `detector` would do. Recall and precision are measured against
+--labels (a JSON list with one list of [top, right, bottom, left] boxes
+per frame) or, without labels, against the --reference backend's
+detections. --save-labels writes the reference's boxes in that format so
+they can be corrected by hand once and reused. "a+b" runs backend a
+gated by backend b (e.g. hog+haar).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from detection import FaceDetector, Location, detect_faces, detection_scale, make_detector
+from run import load_frames
+
+def parse_backend(name: str) -> dict:
+    """Detector spec for a backend name, where 'a+b' is backend a gated by b."""
+    backend, _, gate = name.partition('+')
+    spec = {'backend': backend}
+    if gate:
+        spec['gate'] = gate
+    return spec
+
+def load_backend(name: str, upsample: int) -> Optional[FaceDetector]:
+    """The named detector, or None if its model or OpenCV support is missing (no HOG fallback here)."""
+    spec = parse_backend(name)
+    detector = make_detector(spec, upsample, fallback=False)
+    if detector is None or detector.name != name:
+        return None  # The backend or its gate failed to load
+    return detector
+
+def iou(a: Location, b: Location) -> float:
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    overlap = max(0, right - left) * max(0, bottom - top)
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    union = area_a + area_b - overlap
+    return overlap / union if union > 0 else 0.0
+
+def match_boxes(found: Sequence[Location], truth: Sequence[Location], threshold: float) -> int:
+    """Greedy one-to-one matches between found and true boxes with IoU of at least threshold."""
+    pairs = sorted(((iou(f, t), i, j) for i, f in enumerate(found) for j, t in enumerate(truth)), reverse=True)
+    used_found, used_truth = set(), set()
+    for overlap, i, j in pairs:
+        if overlap < threshold:
+            break
+        if i not in used_found and j not in used_truth:
+            used_found.add(i)
+            used_truth.add(j)
+    return len(used_found)
+
+def run_backend(detector: FaceDetector, frames: List[np.ndarray], scale: float,
+                repeat: int) -> (List[List[Location]], List[float]):
+    """Detections per frame (from the last run) and the seconds each frame took (best of repeat)."""
+    detections: List[List[Location]] = []
+    times = [float('inf')] * len(frames)
+    detect_faces(frames[0], scale=scale, detector=detector)  # Load models and size input buffers
+    for _ in range(repeat):
+        detections = []
+        for index, frame in enumerate(frames):
+            started = time.perf_counter()
+            locations, _ = detect_faces(frame, scale=scale, detector=detector)
+            times[index] = min(times[index], time.perf_counter() - started)
+            detections.append(locations)
+    return detections, times
+
+def score(detections: List[List[Location]], truth: List[List[Location]], threshold: float) -> Dict[str, float]:
+    found = sum(len(boxes) for boxes in detections)
+    expected = sum(len(boxes) for boxes in truth)
+    matched = sum(match_boxes(boxes, true_boxes, threshold) for boxes, true_boxes in zip(detections, truth))
+    return {
+        'faces': found,
+        'matched': matched,
+        'recall': matched / expected if expected else None,
+        'precision': matched / found if found else None
+    }
+
+def run(args) -> dict:
+    frames = load_frames(args.frames, args.limit)
+    if not frames:
+        raise SystemExit(f"No frames read from {args.frames}")
+    min_face_size = [args.min_face, args.min_face]
+    
+    if args.labels:
+        with open(args.labels, 'r') as f:
+            truth = [[tuple(box) for box in boxes] for boxes in json.load(f)]
+        truth_source = args.labels
+        if len(truth) < len(frames):
+            raise SystemExit(f"{args.labels} labels {len(truth)} frames, but {len(frames)} were read")
+        truth = truth[:len(frames)]
+    else:
+        reference = load_backend(args.reference, args.upsample)
+        if reference is None:
+            raise SystemExit(f"Reference backend {args.reference} is not available")
+        # The reference scans full frames so its misses are as few as possible
+        truth, _ = run_backend(reference, frames, 1.0, 1)
+        truth_source = f"{args.reference} at full scale"
+    if args.save_labels:
+        with open(args.save_labels, 'w') as f:
+            json.dump([[list(box) for box in boxes] for boxes in truth], f)
+    
+    results = {
+        'frames': len(frames),
+        'resolution': list(frames[0].shape[:2]),
+        'min_face': args.min_face,
+        'truth': truth_source,
+        'true_faces': sum(len(boxes) for boxes in truth),
+        'backends': {}
+    }
+    for name in args.backends.split(','):
+        name = name.strip()
+        detector = load_backend(name, args.upsample)
+        if detector is None:
+            results['backends'][name] = {'skipped': 'model file or OpenCV support missing'}
+            continue
+        scale = detection_scale(min_face_size, args.upsample, detector=detector)
+        detections, times = run_backend(detector, frames, scale, args.repeat)
+        result = {
+            'scale': scale,
+            'median_ms': float(np.median(times)) * 1000,
+            'p95_ms': float(np.percentile(times, 95)) * 1000,
+            'fps': len(times) / sum(times) if sum(times) else None
+        }
+        result.update(score(detections, truth, args.iou))
+        if hasattr(detector, 'passed'):
+            result['gate_pass_rate'] = detector.passed / detector.frames if detector.frames else None
+        results['backends'][name] = result
+    return results
+
+def percent(value: Optional[float]) -> str:
+    return '   -  ' if value is None else f"{value * 100:5.1f}%"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', default=os.path.join(ROOT, 'faces', '*.jpg'),
+                        help='recorded frames: video file, image directory or glob')
+    parser.add_argument('--limit', type=int, default=100, help='frames to read')
+    parser.add_argument('--backends', default='hog,yunet,ssd,haar,hog+haar',
+                        help="comma separated backends; 'cnn' is slow without a GPU")
+    parser.add_argument('--reference', default='cnn', help='backend treated as ground truth without --labels')
+    parser.add_argument('--labels', help='JSON ground-truth boxes, one list per frame')
+    parser.add_argument('--save-labels', help='write the ground-truth boxes used to this file')
+    parser.add_argument('--min-face', type=int, default=30, help='smallest face (pixels) to find; sets the scale')
+    parser.add_argument('--upsample', type=int, default=1, help='dlib upsampling for hog and cnn')
+    parser.add_argument('--iou', type=float, default=0.3,
+                        help='overlap counted as the same face (backends frame faces differently)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per backend; the fastest time per frame counts')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+    
+    results = run(args)
+    print(f"{results['frames']} frames at {results['resolution'][1]}x{results['resolution'][0]}, "
+          f"{results['true_faces']} faces in {results['truth']}, min face {results['min_face']}px")
+    print(f"{'backend':12s} {'scale':>6s} {'median':>9s} {'p95':>9s} {'fps':>7s} {'faces':>6s} "
+          f"{'recall':>7s} {'precision':>9s}")
+    for name, result in results['backends'].items():
+        if 'skipped' in result:
+            print(f"{name:12s} skipped: {result['skipped']}")
+            continue
+        line = (f"{name:12s} {result['scale']:6.3f} {result['median_ms']:7.1f}ms {result['p95_ms']:7.1f}ms "
+                f"{result['fps'] or 0:7.1f} {result['faces']:6d} {percent(result['recall']):>7s} "
+                f"{percent(result['precision']):>9s}")
+        if 'gate_pass_rate' in result:
+            line += f"  gate passed {percent(result['gate_pass_rate']).strip()} of frames"
+        print(line)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
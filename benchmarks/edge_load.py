@@ -0,0 +1,197 @@
+"""Load-test the edge/central split with local processes standing in for camera nodes.
+
+Examples:
+    python benchmarks/edge_load.py --nodes 24 --cameras 2 --rate 2 --faces 3
+    python benchmarks/edge_load.py --nodes 48 --compression 0 --json edge.json
+
+Starts a central MonitoringSystem (role "central", no local cameras) in a
+scratch directory with a synthetic gallery and attendance log, then spawns
+--nodes processes that each stream synthetic embeddings for --cameras
+cameras through an EdgeSender, exactly as an edge MonitoringSystem would
+after detect + encode. Each camera has --faces seats, each with a fixed
+box, so the central node's identity voting can follow them; a seat's
+student changes every --dwell frames. Reports throughput, match rate
+(faces named by a confirmed track), identity confirmations, the delay
+from encoding to central matching, and bytes per embedding on the wire.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Tuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from edge import EdgeSender
+from gallery import save_encodings
+from run import synthetic_attendance, synthetic_gallery
+
+def run_node(index: int, port: int, args, centres: np.ndarray, ready, results):
+    """One simulated edge node: --cameras cameras, --faces faces per frame at --rate frames/s."""
+    sender = EdgeSender(f"node{index:02d}", '127.0.0.1', port, args.batch_size, args.max_delay,
+                        args.compression).start()
+    ready.wait()  # Start streaming together once every node has finished importing
+    rng = np.random.default_rng(index)
+    cameras = [f"Camera {number + 1}" for number in range(args.cameras)]
+    period = 1.0 / args.rate
+    deadline = time.monotonic() + args.duration
+    next_frame = time.monotonic()
+    frame = submitted = 0
+    # One box per seat, side by side, so every seat keeps its own track
+    boxes = [[40, 120 + 100 * seat, 120, 40 + 100 * seat] for seat in range(args.faces)]
+    seated = {camera: rng.integers(0, len(centres), args.faces) for camera in cameras}
+    while time.monotonic() < deadline:
+        for camera in cameras:
+            if frame and frame % args.dwell == 0:
+                seated[camera] = rng.integers(0, len(centres), args.faces)
+            for box, student in zip(boxes, seated[camera]):
+                encoding = centres[student] + rng.normal(0, 0.02, centres.shape[1])
+                sender.submit(camera, frame, time.time(), box, encoding)
+                submitted += 1
+        frame += 1
+        next_frame += period
+        time.sleep(max(0.0, next_frame - time.monotonic()))
+    sender.stop(timeout=10)
+    results.put({
+        'node': sender.node,
+        'submitted': submitted,
+        'sent': int(sender.embeddings_sent.value),
+        'dropped': int(sender.embeddings_dropped.value),
+        'batches': int(sender.batches_sent.value),
+        'raw_bytes': sender.raw_bytes,
+        'wire_bytes': sender.wire_bytes
+    })
+
+def prepare_workdir(args, rng: np.random.Generator) -> Tuple[str, np.ndarray]:
+    """Scratch directory with a synthetic gallery, attendance log and central-role config."""
+    workdir = tempfile.mkdtemp(prefix='edge_load_')
+    gallery = synthetic_gallery(args.students, rng)
+    os.makedirs(os.path.join(workdir, 'faces'))
+    for student_id, templates in gallery.templates.items():
+        save_encodings(os.path.join(workdir, 'faces', f"{student_id}.npy"), templates)
+    attendance = synthetic_attendance(args.students, rng)
+    attendance['student_id'] = list(gallery.templates)
+    attendance.to_excel(os.path.join(workdir, 'attendance.xlsx'), index=False)
+    with open(os.path.join(ROOT, 'camera_config.json'), 'r') as f:
+        config = json.load(f)
+    config['monitoring_cameras'] = []
+    config['edge'] = dict(config.get('edge', {}), role='central', host='127.0.0.1', port=0,
+                          match_interval=args.match_interval)
+    with open(os.path.join(workdir, 'camera_config.json'), 'w') as f:
+        json.dump(config, f, indent=4)
+    centres = np.array([templates[0] for templates in gallery.templates.values()])
+    return workdir, centres
+
+def run(args) -> dict:
+    from monitor import MonitoringSystem  # Not needed in the node processes
+    rng = np.random.default_rng(args.seed)
+    workdir, centres = prepare_workdir(args, rng)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    context = mp.get_context('spawn')
+    results = context.Queue()
+    ready = context.Barrier(args.nodes + 1)
+    matched = {'faces': 0, 'recognised': 0, 'confirmed': 0}
+    
+    def on_detection(event):
+        if event.get('type') != 'detection':
+            return
+        matched['faces'] += len(event['faces'])
+        matched['recognised'] += sum(1 for face in event['faces'] if face['student_id'] is not None)
+        matched['confirmed'] += len(event.get('confirmed', []))
+    
+    try:
+        monitor = MonitoringSystem('camera_config.json', 'faces')
+        monitor.add_listener(on_detection)
+        monitor.start()
+        port = monitor.edge_receiver.port
+        nodes = [context.Process(target=run_node, args=(index, port, args, centres, ready, results), daemon=True)
+                 for index in range(args.nodes)]
+        for node in nodes:
+            node.start()
+        ready.wait()
+        wall_start = time.perf_counter()
+        node_stats = [results.get(timeout=args.duration + 60) for _ in nodes]
+        for node in nodes:
+            node.join()
+        # Let the central node drain what is still queued
+        expected = sum(stats['sent'] for stats in node_stats)
+        drain_deadline = time.monotonic() + 30
+        while matched['faces'] < expected and time.monotonic() < drain_deadline:
+            time.sleep(0.1)
+        wall = time.perf_counter() - wall_start
+        received = {node: dict(stats) for node, stats in monitor.edge_receiver.nodes.items()}
+        dropped_batches = int(monitor.edge_receiver.batches_dropped.value)
+        monitor.stop()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    raw = sum(stats['raw_bytes'] for stats in node_stats)
+    wire = sum(stats['wire_bytes'] for stats in node_stats)
+    sent = sum(stats['sent'] for stats in node_stats)
+    return {
+        'nodes': args.nodes,
+        'cameras': args.nodes * args.cameras,
+        'students': args.students,
+        'wall_seconds': wall,
+        'submitted': sum(stats['submitted'] for stats in node_stats),
+        'sent': sent,
+        'dropped_at_edge': sum(stats['dropped'] for stats in node_stats),
+        'dropped_at_central_batches': dropped_batches,
+        'received': sum(stats['embeddings'] for stats in received.values()),
+        'matched': matched['faces'],
+        'match_rate': matched['recognised'] / matched['faces'] if matched['faces'] else 0.0,
+        'confirmations': matched['confirmed'],
+        'embeddings_per_second': matched['faces'] / wall if wall else 0.0,
+        'match_delay': monitor.edge_latency.summary(),
+        'match_latency': monitor.stage_latency['match'].summary(),
+        'last_seen_flush': monitor.flush_latency['last_seen'].summary(),
+        'bytes_per_embedding': wire / sent if sent else 0.0,
+        'compression_ratio': raw / wire if wire else 1.0,
+        'batches': sum(stats['batches'] for stats in node_stats)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=12, help='edge node processes')
+    parser.add_argument('--cameras', type=int, default=2, help='cameras per node')
+    parser.add_argument('--rate', type=float, default=2.0, help='frames per second per camera')
+    parser.add_argument('--faces', type=int, default=3, help='faces per frame')
+    parser.add_argument('--students', type=int, default=500, help='synthetic gallery size')
+    parser.add_argument('--dwell', type=int, default=20, help='frames a student stays in a seat')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds each node streams for')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--max-delay', type=float, default=0.2, help='seconds a partial batch may wait')
+    parser.add_argument('--compression', type=int, default=1, help='zlib level, 0 disables compression')
+    parser.add_argument('--match-interval', type=float, default=0.05, help='central drain period (seconds)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+    
+    results = run(args)
+    delay = results['match_delay']
+    print(f"{results['nodes']} nodes / {results['cameras']} cameras, {results['students']} students, "
+          f"{results['wall_seconds']:.1f}s")
+    print(f"Embeddings: {results['submitted']} submitted, {results['sent']} sent, {results['received']} received, "
+          f"{results['matched']} matched ({results['match_rate'] * 100:.1f}% recognised by a confirmed track, "
+          f"{results['confirmations']} identity confirmations)")
+    print(f"Dropped: {results['dropped_at_edge']} at edge, {results['dropped_at_central_batches']} batches at central")
+    print(f"Throughput: {results['embeddings_per_second']:.0f} embeddings/s")
+    print(f"Encode-to-match delay: p50 {delay['p50_ms']:.0f}ms p95 {delay['p95_ms']:.0f}ms "
+          f"p99 {delay['p99_ms']:.0f}ms")
+    print(f"Wire: {results['bytes_per_embedding']:.0f} bytes/embedding over {results['batches']} batches, "
+          f"compression {results['compression_ratio']:.2f}x")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Compare embedding backends side by side: dlib versus an ONNX model run by ONNX Runtime.
+
+Examples:
+    python benchmarks/embedders.py --dataset datasets/lfw_subset --model models/arcface.onnx
+    python benchmarks/embedders.py --dataset datasets/class --model models/arcface.onnx --threads 1,2,4 --json out.json
+    python benchmarks/embedders.py                      # dlib only, on the registration snapshots in faces/
+
+--dataset is a directory with one subdirectory of images per person
+(LFW layout); a flat directory such as faces/ counts every image as a
+different person, which still measures throughput and how far apart
+different people land. For each backend the largest face of every image
+is detected once (dlib HOG), then aligned and embedded in batches of
+--batch-sizes (and, for ONNX, with each --threads setting). Match
+quality uses every same-person and different-person pair: the equal
+error rate and its threshold, the true accept rate at 1% and 0.1% false
+accepts, and rank-1 identification with each person's first image as
+the gallery. Thresholds are in each backend's own distance units, so
+use them to set recognition_threshold after a migration.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from detection import make_detector
+from encoder import DlibEmbedder, FaceEmbedder, OnnxEmbedder
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def load_dataset(path: str, limit: int) -> List[Tuple[str, str]]:
+    """(person, image path) pairs: subdirectories are people, or each loose image is its own person."""
+    images = []
+    for entry in sorted(os.listdir(path)):
+        full = os.path.join(path, entry)
+        if os.path.isdir(full):
+            images.extend((entry, os.path.join(full, name)) for name in sorted(os.listdir(full))
+                          if name.lower().endswith(IMAGE_EXTENSIONS))
+        elif entry.lower().endswith(IMAGE_EXTENSIONS):
+            images.append((os.path.splitext(entry)[0], full))
+    return images[:limit]
+
+def detect_largest(images: List[Tuple[str, str]]) -> List[Tuple[str, np.ndarray, tuple]]:
+    """(person, RGB image, largest face) for every image where a face is found."""
+    import cv2
+    detector = make_detector('hog')
+    faces = []
+    for person, path in images:
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        locations = detector.detect(frame)
+        if locations:
+            largest = max(locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]))
+            faces.append((person, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), largest))
+    return faces
+
+def throughput(embedder: FaceEmbedder, chips: List[np.ndarray], batch_size: int, repeat: int) -> float:
+    """Embeddings per second at batch_size (best of repeat)."""
+    best = float('inf')
+    embedder.embed(chips[:batch_size])  # First run allocates buffers
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for start in range(0, len(chips), batch_size):
+            embedder.embed(chips[start:start + batch_size])
+        best = min(best, time.perf_counter() - started)
+    return len(chips) / best if best > 0 else 0.0
+
+def quality(people: List[str], embeddings: np.ndarray) -> Dict[str, Optional[float]]:
+    """Verification and rank-1 identification metrics over every pair of embeddings."""
+    labels = np.array(people)
+    distances = np.linalg.norm(embeddings[:, np.newaxis, :] - embeddings[np.newaxis, :, :], axis=2)
+    upper = np.triu_indices(len(labels), k=1)
+    same = (labels[:, np.newaxis] == labels[np.newaxis, :])[upper]
+    pair_distances = distances[upper]
+    genuine = np.sort(pair_distances[same])
+    impostor = np.sort(pair_distances[~same])
+    result: Dict[str, Optional[float]] = {
+        'genuine_pairs': int(len(genuine)),
+        'impostor_pairs': int(len(impostor)),
+        'impostor_min': float(impostor[0]) if len(impostor) else None,
+        'eer': None, 'eer_threshold': None, 'tar_at_far_1e-2': None, 'tar_at_far_1e-3': None, 'rank1': None
+    }
+    if not len(genuine) or not len(impostor):
+        return result
+    # Accept below threshold: false rejects are genuine pairs above it, false accepts impostors below it
+    thresholds = np.concatenate((genuine, impostor))
+    thresholds.sort()
+    frr = 1.0 - np.searchsorted(genuine, thresholds, side='right') / len(genuine)
+    far = np.searchsorted(impostor, thresholds, side='right') / len(impostor)
+    crossing = int(np.argmin(np.abs(frr - far)))
+    result['eer'] = float((frr[crossing] + far[crossing]) / 2)
+    result['eer_threshold'] = float(thresholds[crossing])
+    for name, target in (('tar_at_far_1e-2', 1e-2), ('tar_at_far_1e-3', 1e-3)):
+        allowed = int(np.floor(target * len(impostor)))
+        threshold = impostor[allowed] if allowed < len(impostor) else np.inf
+        result[name] = float(np.searchsorted(genuine, threshold, side='left') / len(genuine))
+    # Rank-1: each person's first image is enrolled, every other image is a probe
+    enrolled = {}
+    for index, person in enumerate(people):
+        enrolled.setdefault(person, index)
+    gallery = np.array(list(enrolled.values()))
+    probes = [index for index in range(len(people)) if index not in set(gallery)]
+    if probes:
+        nearest = gallery[np.argmin(distances[np.ix_(probes, gallery)], axis=1)]
+        result['rank1'] = float(np.mean(labels[nearest] == labels[probes]))
+    return result
+
+def run_backend(embedder: FaceEmbedder, faces, args) -> dict:
+    started = time.perf_counter()
+    chips, people = [], []
+    for person, rgb, location in faces:
+        for chip in embedder.align(rgb, [location]):
+            chips.append(chip)
+            people.append(person)
+    align_seconds = time.perf_counter() - started
+    result = {
+        'size': embedder.size,
+        'faces': len(chips),
+        'align_ms_per_face': align_seconds / len(chips) * 1000 if chips else None,
+        'embeddings_per_sec': {str(batch_size): throughput(embedder, chips, batch_size, args.repeat)
+                               for batch_size in args.batch_sizes}
+    }
+    result.update(quality(people, embedder.embed(chips)))
+    return result
+
+def run(args) -> dict:
+    images = load_dataset(args.dataset, args.limit)
+    faces = detect_largest(images)
+    if not faces:
+        raise SystemExit(f"No faces found in {args.dataset}")
+    results = {
+        'dataset': args.dataset,
+        'images': len(images),
+        'faces': len(faces),
+        'people': len({person for person, _, _ in faces}),
+        'backends': {}
+    }
+    results['backends'][f"dlib.landmarks={args.landmarks}"] = run_backend(DlibEmbedder(args.landmarks), faces, args)
+    if args.model:
+        for threads in args.threads:
+            try:
+                embedder = OnnxEmbedder(args.model, threads, max(args.batch_sizes))
+            except (ImportError, OSError) as e:
+                results['backends']['onnx'] = {'skipped': str(e)}
+                break
+            results['backends'][f"onnx.threads={threads}"] = run_backend(embedder, faces, args)
+    return results
+
+def percent(value: Optional[float]) -> str:
+    return '-' if value is None else f"{value * 100:.1f}%"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(ROOT, 'faces'),
+                        help='directory of per-person image directories (or loose images)')
+    parser.add_argument('--limit', type=int, default=2000, help='images to read')
+    parser.add_argument('--model', help='ONNX embedding model to compare with dlib')
+    parser.add_argument('--threads', type=lambda s: [int(n) for n in s.split(',')], default=[0],
+                        help='ONNX Runtime intra-op thread counts to try (0 lets it decide)')
+    parser.add_argument('--batch-sizes', type=lambda s: [int(n) for n in s.split(',')], default=[1, 8, 32])
+    parser.add_argument('--landmarks', default='large', choices=('large', 'small'), help='dlib alignment model')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+    
+    results = run(args)
+    print(f"{results['faces']} faces of {results['people']} people ({results['images']} images) in {results['dataset']}")
+    for name, result in results['backends'].items():
+        if 'skipped' in result:
+            print(f"{name}: skipped: {result['skipped']}")
+            continue
+        rates = ', '.join(f"batch {size}: {rate:.1f}/s" for size, rate in result['embeddings_per_sec'].items())
+        print(f"{name} ({result['size']}-d): align {result['align_ms_per_face']:.1f} ms/face; embed {rates}")
+        if result['eer'] is None:
+            closest = result['impostor_min']
+            print(f"    no same-person pairs; closest different people {closest:.3f} apart" if closest is not None
+                  else "    too few faces to compare")
+            continue
+        print(f"    EER {percent(result['eer'])} at distance {result['eer_threshold']:.3f}, "
+              f"TAR {percent(result['tar_at_far_1e-2'])} @ FAR 1%, {percent(result['tar_at_far_1e-3'])} @ FAR 0.1%, "
+              f"rank-1 {percent(result['rank1'])}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
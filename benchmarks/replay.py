@@ -0,0 +1,146 @@
+"""Drive the full MonitoringSystem against recorded sources and report throughput.
+
+Examples:
+    python benchmarks/replay.py --source recordings/room1.mp4 --replay max
+    python benchmarks/replay.py --config replay_config.json --replay realtime --duration 120 --json out.json
+
+Runs in a scratch directory with copies of attendance.xlsx and faces/ so the
+real logs and gallery are never touched.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from monitor import MonitoringSystem
+
+def build_config(args) -> dict:
+    """Base config with monitoring cameras replaced by the requested sources."""
+    with open(args.config or os.path.join(ROOT, 'camera_config.json'), 'r') as f:
+        config = json.load(f)
+    if args.source:
+        template = config['monitoring_cameras'][0] if config['monitoring_cameras'] else {}
+        config['monitoring_cameras'] = [
+            dict(template, name=f"Replay {index + 1}", source=os.path.abspath(source))
+            for index, source in enumerate(args.source)
+        ]
+    else:
+        # Make relative recording paths independent of the scratch directory
+        base = os.path.dirname(os.path.abspath(args.config)) if args.config else ROOT
+        for cam_config in config['monitoring_cameras']:
+            source = cam_config['source']
+            if isinstance(source, dict):
+                source['path'] = os.path.join(base, source['path'])
+            elif isinstance(source, str) and not source.isdigit():
+                cam_config['source'] = os.path.join(base, source)
+    if args.interval is not None:
+        config['processing']['face_detection_interval'] = args.interval
+    elif args.replay == 'max':
+        # Process every frame as fast as the pipeline allows (period 0 runs every scheduler tick)
+        config['processing']['face_detection_interval'] = 0
+    return config
+
+def prepare_workdir(config: dict, faces_dir: str) -> str:
+    workdir = tempfile.mkdtemp(prefix='replay_bench_')
+    with open(os.path.join(workdir, 'camera_config.json'), 'w') as f:
+        json.dump(config, f, indent=4)
+    attendance = os.path.join(ROOT, 'attendance.xlsx')
+    if os.path.exists(attendance):
+        shutil.copy(attendance, workdir)
+    shutil.copytree(faces_dir, os.path.join(workdir, 'faces'))
+    return workdir
+
+def run(args) -> dict:
+    config = build_config(args)
+    workdir = prepare_workdir(config, args.faces)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        monitor = MonitoringSystem('camera_config.json', 'faces', replay=args.replay)
+        monitor.scheduler.retry_delay = 0.001
+        usage_start = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        monitor.start()
+        while time.perf_counter() - wall_start < args.duration:
+            if not monitor.monitor_thread.is_alive():
+                print("Monitor thread stopped; ending the replay early")
+                break
+            if monitor.streams_finished():
+                # Give the monitor thread a moment to drain the last frames
+                time.sleep(0.2)
+                break
+            time.sleep(0.1)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        usage_end = resource.getrusage(resource.RUSAGE_SELF)
+        monitor.stop()
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    captured = sum(camera.frames_captured for camera in monitor.cameras.values())
+    dropped = sum(camera.frames_dropped for camera in monitor.cameras.values())
+    return {
+        'replay': args.replay,
+        'cameras': len(monitor.cameras),
+        'gallery_size': len(monitor.gallery),
+        'wall_seconds': wall,
+        'frames_captured': captured,
+        'frames_dropped': dropped,
+        'frames_processed': monitor.frames_processed,
+        'end_to_end_fps': monitor.frames_processed / wall if wall else 0.0,
+        'recognition_latency': monitor.recognition_latency.summary(),
+        'cpu_seconds': cpu,
+        'cpu_user_seconds': usage_end.ru_utime - usage_start.ru_utime,
+        'cpu_system_seconds': usage_end.ru_stime - usage_start.ru_stime,
+        'cpu_utilisation': cpu / wall if wall else 0.0,
+        'match_cache': monitor.match_cache.savings(),
+        'per_camera': {
+            name: dict(stats, pixels_per_second=monitor.pixel_rates[name].rate())
+            for name, stats in monitor.detection_rate_report().items()
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', help='camera config whose monitoring_cameras use recorded sources')
+    parser.add_argument('--source', action='append', help='video file, image directory or glob (repeatable)')
+    parser.add_argument('--replay', choices=['realtime', 'max'], default='max')
+    parser.add_argument('--interval', type=float, help='override face_detection_interval (seconds)')
+    parser.add_argument('--duration', type=float, default=300.0, help='stop after this many seconds')
+    parser.add_argument('--faces', default=os.path.join(ROOT, 'faces'), help='gallery directory to copy')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch directory')
+    args = parser.parse_args()
+    if not args.config and not args.source:
+        parser.error('give --config or at least one --source')
+    
+    results = run(args)
+    latency = results['recognition_latency']
+    print(f"Frames processed: {results['frames_processed']} / captured {results['frames_captured']} "
+          f"(dropped {results['frames_dropped']}) in {results['wall_seconds']:.1f}s")
+    print(f"End-to-end: {results['end_to_end_fps']:.2f} frames/s")
+    print(f"Recognition latency: mean {latency['mean_ms']:.1f}ms p50 {latency['p50_ms']:.0f}ms "
+          f"p95 {latency['p95_ms']:.0f}ms p99 {latency['p99_ms']:.0f}ms")
+    print(f"CPU: {results['cpu_seconds']:.1f}s ({results['cpu_utilisation'] * 100:.0f}% of one core)")
+    cache = results['match_cache']
+    print(f"Match cache: {cache['hit_rate'] * 100:.1f}% hits ({cache['hits']}/{cache['hits'] + cache['misses']}), "
+          f"hit {cache['hit_mean_ms']:.2f}ms vs miss {cache['miss_mean_ms']:.2f}ms, {cache['saved_ms']:.0f}ms saved")
+    for name, stats in results['per_camera'].items():
+        print(f"  {name}: {stats['achieved_hz']:.1f}/{stats['target_hz']:.1f} detections/s, "
+              f"{stats['skipped']} skipped, {stats['pixels_per_second'] / 1e6:.2f} Mpixels/s")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
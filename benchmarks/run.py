@@ -0,0 +1,467 @@
+"""Stage-by-stage benchmarks for the recognition pipeline.
+
+Examples:
+    python benchmarks/run.py                                  # every stage, print results
+    python benchmarks/run.py --stages gallery --json out.json
+    python benchmarks/run.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run.py --baseline benchmarks/baseline.json   # exit 1 on regressions
+
+Stages: detection (HOG/Haar/CNN at several scales), encoding (per-frame
+face_encodings calls versus the batch encoder's alignment and batched
+embedding, in embeddings/s), gallery
+matching against synthetic students, quantized (float16/int8) gallery
+matching versus exact face_distance, the recent-match cache on a
+lecture-hall stream, roster-first matching for a scheduled event,
+attendance persistence (xlsx vs
+alternatives) and report preparation. Detection and encoding use recorded
+frames (--frames, default faces/*.jpg); stages whose dependencies are
+missing are reported as skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from camera_sources import ImageSequenceSource, VideoFileSource
+from gallery import ENCODING_SIZE, PRECISIONS, FaceGallery, MatchCache
+from report import prepare_report, report_rows
+
+DETECTION_SCALES = [1.0, 0.5, 0.25]
+GALLERY_SIZES = [100, 1000, 10000, 100000]
+PERSISTENCE_ROWS = 500
+REPORT_ROWS = [1000, 10000]
+ENCODE_BATCH_SIZES = [1, 4, 16]
+
+def measure(func: Callable[[], object], repeat: int = 5, warmup: int = 1, **extra) -> Dict[str, float]:
+    """Time func over repeat runs after warmup runs; times in milliseconds."""
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    result = {
+        'median_ms': statistics.median(times),
+        'min_ms': min(times),
+        'mean_ms': statistics.fmean(times),
+        'runs': repeat
+    }
+    result.update(extra)
+    return result
+
+def load_frames(pattern: str, limit: int = 10) -> List[np.ndarray]:
+    """Read up to limit recorded frames from a video file, image directory or glob."""
+    if os.path.isdir(pattern) or any(ch in pattern for ch in '*?[') or pattern.lower().endswith(('.jpg', '.png')):
+        source = ImageSequenceSource(pattern, replay='max')
+    else:
+        source = VideoFileSource(pattern, replay='max')
+    frames = []
+    while len(frames) < limit:
+        ret, frame = source.read()
+        if not ret:
+            break
+        frames.append(frame)
+    source.release()
+    return frames
+
+def bench_detection(args, frames: List[np.ndarray]) -> Dict[str, dict]:
+    import cv2
+    results = {}
+    try:
+        cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml'))
+    except AttributeError as e:
+        cascade = None
+        results['detection.haar'] = {'skipped': str(e)}
+    if cascade is not None:
+        gray_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames]
+        for scale in DETECTION_SCALES:
+            def haar():
+                for gray in gray_frames:
+                    small = cv2.resize(gray, (0, 0), fx=scale, fy=scale) if scale != 1.0 else gray
+                    cascade.detectMultiScale(small, scaleFactor=1.1, minNeighbors=5)
+            results[f"detection.haar.scale={scale}"] = measure(haar, args.repeat, frames=len(frames))
+    try:
+        from detection import detect_faces
+    except ImportError as e:
+        results['detection.hog'] = {'skipped': str(e)}
+        return results
+    models = ['hog', 'cnn'] if args.cnn else ['hog']
+    for model in models:
+        for scale in DETECTION_SCALES:
+            found = []
+            def run():
+                found.clear()
+                for frame in frames:
+                    found.extend(detect_faces(frame, scale=scale, upsample=1, model=model)[0])
+            result = measure(run, args.repeat, frames=len(frames))
+            result['faces'] = len(found)
+            results[f"detection.{model}.scale={scale}"] = result
+    return results
+
+def bench_encoding(args, frames: List[np.ndarray]) -> Dict[str, dict]:
+    try:
+        import cv2
+        import face_recognition
+        from encoder import encode_chips, face_chips
+    except ImportError as e:
+        return {'encoding': {'skipped': str(e)}}
+    rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+    located = [(rgb, face_recognition.face_locations(rgb)) for rgb in rgb_frames]
+    faces = sum(len(locations) for _, locations in located)
+    if not faces:
+        return {'encoding': {'skipped': 'no faces found in the recorded frames'}}
+    results = {}
+    for jitters in (1, 5):
+        def run():
+            for rgb, locations in located:
+                face_recognition.face_encodings(rgb, locations, num_jitters=jitters)
+        result = measure(run, args.repeat, faces=faces)
+        result['per_face_ms'] = result['median_ms'] / faces
+        result['embeddings_per_sec'] = faces / result['median_ms'] * 1000
+        results[f"encoding.jitters={jitters}"] = result
+    # The batch encoder: align per frame, then embed the chips of all frames in batches of batch_size
+    for landmarks in ('large', 'small'):
+        def align():
+            return [chip for rgb, locations in located for chip in face_chips(rgb, locations, landmarks)]
+        aligned = measure(align, args.repeat, faces=faces)
+        aligned['per_face_ms'] = aligned['median_ms'] / faces
+        results[f"encoding.align.landmarks={landmarks}"] = aligned
+        chips = align()
+        for batch_size in args.encode_batch_sizes:
+            def run():
+                for start in range(0, len(chips), batch_size):
+                    encode_chips(chips[start:start + batch_size])
+            result = measure(run, args.repeat, faces=faces)
+            result['per_face_ms'] = result['median_ms'] / faces
+            # Alignment included, so the rate compares directly with face_encodings above
+            result['embeddings_per_sec'] = faces / (aligned['median_ms'] + result['median_ms']) * 1000
+            results[f"encoding.batched.landmarks={landmarks}.batch={batch_size}"] = result
+    return results
+
+def synthetic_gallery(students: int, rng: np.random.Generator) -> FaceGallery:
+    """Gallery of students with 1-3 templates each, clustered like real encodings."""
+    gallery = FaceGallery()
+    centres = rng.normal(0, 0.09, (students, ENCODING_SIZE))
+    counts = rng.integers(1, 4, students)
+    for index in range(students):
+        templates = centres[index] + rng.normal(0, 0.02, (counts[index], ENCODING_SIZE))
+        gallery.add(f"S{index:06d}", templates)
+    return gallery
+
+def bench_gallery(args, rng: np.random.Generator) -> Dict[str, dict]:
+    results = {}
+    for students in args.gallery_sizes:
+        gallery = synthetic_gallery(students, rng)
+        started = time.perf_counter()
+        gallery._rebuild()
+        build_ms = (time.perf_counter() - started) * 1000
+        # Half the probes are known students seen again, half are strangers
+        known = rng.integers(0, students, args.queries // 2)
+        probes = [gallery._centroids[index] + rng.normal(0, 0.03, ENCODING_SIZE) for index in known]
+        probes += list(rng.normal(0, 0.09, (args.queries - len(probes), ENCODING_SIZE)))
+        
+        def match():
+            for probe in probes:
+                gallery.match(probe, 0.6)
+        def brute_force():
+            for probe in probes:
+                gallery.distances(probe).min()
+        matched = measure(match, args.repeat, students=students, templates=gallery.template_count,
+                          queries=len(probes), build_ms=build_ms)
+        matched['per_query_ms'] = matched['median_ms'] / len(probes)
+        results[f"gallery.match.students={students}"] = matched
+        brute = measure(brute_force, args.repeat, students=students, queries=len(probes))
+        brute['per_query_ms'] = brute['median_ms'] / len(probes)
+        results[f"gallery.brute_force.students={students}"] = brute
+        del gallery
+    return results
+
+def bench_quantized(args, rng: np.random.Generator) -> Dict[str, dict]:
+    """Memory, throughput and agreement with exact face_distance for each match index precision."""
+    try:
+        from face_recognition import face_distance
+    except ImportError:
+        def face_distance(face_encodings, face_to_compare):
+            return np.linalg.norm(face_encodings - face_to_compare, axis=1)  # Same formula as face_recognition
+    results = {}
+    for students in args.gallery_sizes:
+        source = synthetic_gallery(students, rng)
+        student_ids = list(source.templates)
+        known = rng.integers(0, students, args.queries // 2)
+        probes = [source.templates[student_ids[index]][0] + rng.normal(0, 0.03, ENCODING_SIZE) for index in known]
+        probes = np.array(probes + list(rng.normal(0, 0.09, (args.queries - len(probes), ENCODING_SIZE))))
+        # Reference decisions: face_distance against every template, closest student under the tolerance
+        matrix = np.vstack([source.templates[sid] for sid in student_ids])
+        owners = np.repeat(np.arange(students), [len(source.templates[sid]) for sid in student_ids])
+        reference = []
+        for probe in probes:
+            distances = face_distance(matrix, probe)
+            best = int(np.argmin(distances))
+            reference.append(student_ids[owners[best]] if distances[best] <= 0.6 else None)
+        for precision in PRECISIONS:
+            gallery = FaceGallery(precision=precision, shortlist=args.shortlist)
+            for student_id in student_ids:
+                gallery.add(student_id, source.templates[student_id])
+            gallery._rebuild()
+            footprint = gallery.memory_footprint()
+            decisions = [student_id for student_id, _ in gallery.match_many(probes, 0.6)]
+            agreement = float(np.mean([got == want for got, want in zip(decisions, reference)]))
+            
+            def match_each():
+                for probe in probes:
+                    gallery.match(probe, 0.6)
+            def match_batch():
+                gallery.match_many(probes, 0.6)
+            result = measure(match_each, args.repeat, students=students, templates=gallery.template_count,
+                             queries=len(probes), agreement=agreement,
+                             scan_bytes=footprint['scan_bytes'], rerank_bytes=footprint['rerank_bytes'],
+                             scan_bytes_per_template=footprint['scan_bytes'] / gallery.template_count)
+            result['per_query_ms'] = result['median_ms'] / len(probes)
+            result['batch_per_query_ms'] = measure(match_batch, args.repeat)['median_ms'] / len(probes)
+            results[f"quantized.{precision}.students={students}"] = result
+            del gallery
+    return results
+
+def bench_cache(args, rng: np.random.Generator) -> Dict[str, dict]:
+    """Recent-match cache vs full gallery search on a stream where the same students recur."""
+    gallery = synthetic_gallery(args.cache_gallery, rng)
+    student_ids = list(gallery.templates)
+    present = rng.choice(len(student_ids), args.cache_present, replace=False)
+    # Repeated sightings of the students in the room, with the odd stranger
+    probes = []
+    for _ in range(args.queries * 5):
+        if rng.random() < 0.05:
+            probes.append(rng.normal(0, 0.09, ENCODING_SIZE))
+        else:
+            probes.append(gallery.templates[student_ids[rng.choice(present)]][0] + rng.normal(0, 0.03, ENCODING_SIZE))
+    reference = [gallery.match(probe, 0.6)[0] for probe in probes]
+    
+    def full_search():
+        for probe in probes:
+            gallery.match(probe, 0.6)
+    def cached():
+        cache = MatchCache(gallery, args.cache_capacity)
+        decisions = [cache.match(probe, 0.6)[0] for probe in probes]
+        state.update(cache.savings(), agreement=float(np.mean([a == b for a, b in zip(decisions, reference)])))
+    state = {}
+    results = {'cache.full_search': measure(full_search, args.repeat, students=len(gallery), queries=len(probes))}
+    result = measure(cached, args.repeat, students=len(gallery), queries=len(probes))
+    result.update(state)
+    result['speedup'] = results['cache.full_search']['median_ms'] / result['median_ms']
+    results['cache.cached'] = result
+    return results
+
+def bench_roster(args, rng: np.random.Generator) -> Dict[str, dict]:
+    """Roster-first matching vs full gallery search for an event with an expected roster."""
+    gallery = synthetic_gallery(args.roster_gallery, rng)
+    student_ids = list(gallery.templates)
+    roster = [student_ids[index] for index in rng.choice(len(student_ids), args.roster_size, replace=False)]
+    # Mostly the expected students, some enrolled walk-ins and a few strangers
+    probes = []
+    for _ in range(args.queries):
+        draw = rng.random()
+        if draw < 0.05:
+            probes.append(rng.normal(0, 0.09, ENCODING_SIZE))
+        else:
+            pool = student_ids if draw < 0.15 else roster
+            probes.append(gallery.templates[pool[rng.integers(len(pool))]][0] + rng.normal(0, 0.03, ENCODING_SIZE))
+    reference = [gallery.match(probe, 0.6)[0] for probe in probes]
+    
+    def full_search():
+        for probe in probes:
+            gallery.match(probe, 0.6)
+    def roster_first():
+        gallery.set_roster(roster)
+        gallery.roster_hits = gallery.roster_misses = 0
+        decisions = [gallery.match(probe, 0.6)[0] for probe in probes]
+        state.update(roster_hit_rate=gallery.roster_hit_rate,
+                     agreement=float(np.mean([a == b for a, b in zip(decisions, reference)])))
+        gallery.set_roster(None)
+    state = {}
+    results = {'roster.full_search': measure(full_search, args.repeat, students=len(gallery), queries=len(probes))}
+    result = measure(roster_first, args.repeat, students=len(gallery), roster=len(roster), queries=len(probes))
+    result.update(state)
+    result['speedup'] = results['roster.full_search']['median_ms'] / result['median_ms']
+    results['roster.roster_first'] = result
+    return results
+
+def synthetic_attendance(rows: int, rng: np.random.Generator, days: int = 1) -> pd.DataFrame:
+    start = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+    check_in = [start - timedelta(days=int(day)) + timedelta(minutes=int(minute))
+                for day, minute in zip(rng.integers(0, days, rows), rng.integers(0, 60, rows))]
+    return pd.DataFrame({
+        'student_id': [str(2023000000 + index % max(1, rows // days)) for index in range(rows)],
+        'name': [f"Student {index}" for index in range(rows)],
+        'check_in_time': check_in,
+        'last_seen_time': [t + timedelta(minutes=int(m)) for t, m in zip(check_in, rng.integers(0, 480, rows))],
+        'status': rng.choice(['PRESENT', 'LATE', 'LEFT_EARLY', 'ABSENT'], rows),
+        'total_time_present': ['2:00:00'] * rows
+    })
+
+def bench_persistence(args, rng: np.random.Generator) -> Dict[str, dict]:
+    df = synthetic_attendance(args.persistence_rows, rng)
+    formats = {
+        'xlsx': (lambda frame, path: frame.to_excel(path, index=False), pd.read_excel),
+        'csv': (lambda frame, path: frame.to_csv(path, index=False), pd.read_csv),
+        'pickle': (lambda frame, path: frame.to_pickle(path), pd.read_pickle)
+    }
+    try:
+        import pyarrow  # noqa: F401
+        formats['parquet'] = (lambda frame, path: frame.to_parquet(path, index=False), pd.read_parquet)
+    except ImportError:
+        pass
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='bench_persist_')
+    try:
+        for name, (write, read) in formats.items():
+            path = os.path.join(workdir, f"attendance.{name}")
+            results[f"persistence.write.{name}"] = measure(lambda: write(df, path), args.repeat, rows=len(df))
+            results[f"persistence.read.{name}"] = measure(lambda: read(path), args.repeat, rows=len(df))
+            results[f"persistence.write.{name}"]['bytes'] = os.path.getsize(path)
+            # A single check-in: read the log, update one row, write it back
+            def update():
+                log = read(path)
+                log.loc[log.index[0], 'status'] = 'LATE'
+                write(log, path)
+            results[f"persistence.update.{name}"] = measure(update, args.repeat, rows=len(df))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def bench_report(args, rng: np.random.Generator) -> Dict[str, dict]:
+    results = {}
+    for rows in REPORT_ROWS:
+        df = synthetic_attendance(rows, rng, days=5)
+        today = datetime.now().strftime('%Y-%m-%d')
+        results[f"report.prepare.rows={rows}"] = measure(lambda: prepare_report(df, today, 'ALL'), args.repeat, rows=rows)
+        prepared, _ = prepare_report(df, today, 'ALL')
+        results[f"report.rows.rows={rows}"] = measure(lambda: report_rows(prepared), args.repeat,
+                                                      rows=rows, shown=len(prepared))
+    return results
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Names of benchmarks whose median is more than threshold slower than the baseline."""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name, {})
+        if 'median_ms' not in result or 'median_ms' not in reference:
+            continue
+        ratio = result['median_ms'] / reference['median_ms'] if reference['median_ms'] else 1.0
+        result['baseline_ms'] = reference['median_ms']
+        result['ratio'] = ratio
+        if ratio > 1.0 + threshold:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', default='detection,encoding,gallery,quantized,cache,roster,persistence,report',
+                        help='comma separated stages to run')
+    parser.add_argument('--frames', default=os.path.join(ROOT, 'faces', '*.jpg'),
+                        help='recorded frames: video file, image directory or glob')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=200, help='gallery probes per run')
+    parser.add_argument('--gallery-sizes', type=lambda s: [int(n) for n in s.split(',')], default=GALLERY_SIZES)
+    parser.add_argument('--shortlist', type=int, default=8, help='templates re-ranked exactly after a quantized scan')
+    parser.add_argument('--cache-gallery', type=int, default=10000, help='gallery size for the cache stage')
+    parser.add_argument('--cache-present', type=int, default=100, help='students in the room for the cache stage')
+    parser.add_argument('--cache-capacity', type=int, default=128)
+    parser.add_argument('--roster-gallery', type=int, default=20000, help='gallery size for the roster stage')
+    parser.add_argument('--roster-size', type=int, default=50, help='expected students for the roster stage')
+    parser.add_argument('--persistence-rows', type=int, default=PERSISTENCE_ROWS)
+    parser.add_argument('--cnn', action='store_true', help='include the (slow) CNN detector')
+    parser.add_argument('--encode-batch-sizes', type=lambda s: [int(n) for n in s.split(',')], default=ENCODE_BATCH_SIZES,
+                        help='batch sizes for the batched encoder')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--baseline', help='compare against results stored in this file')
+    parser.add_argument('--save-baseline', help='store these results as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown before flagging (0.2 = 20%%)')
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(args.seed)
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    frames = load_frames(args.frames) if {'detection', 'encoding'} & set(stages) else []
+    results: Dict[str, dict] = {}
+    for stage in stages:
+        print(f"Running {stage} benchmarks...")
+        if stage == 'detection':
+            results.update(bench_detection(args, frames) if frames else {'detection': {'skipped': 'no frames'}})
+        elif stage == 'encoding':
+            results.update(bench_encoding(args, frames) if frames else {'encoding': {'skipped': 'no frames'}})
+        elif stage == 'gallery':
+            results.update(bench_gallery(args, rng))
+        elif stage == 'quantized':
+            results.update(bench_quantized(args, rng))
+        elif stage == 'cache':
+            results.update(bench_cache(args, rng))
+        elif stage == 'roster':
+            results.update(bench_roster(args, rng))
+        elif stage == 'persistence':
+            results.update(bench_persistence(args, rng))
+        elif stage == 'report':
+            results.update(bench_report(args, rng))
+        else:
+            parser.error(f"unknown stage {stage}")
+    
+    regressions: List[str] = []
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+    
+    for name, result in results.items():
+        if 'skipped' in result:
+            print(f"{name:45s} skipped: {result['skipped']}")
+            continue
+        line = f"{name:45s} {result['median_ms']:10.2f} ms"
+        if 'scan_bytes' in result:
+            line += f"  {result['scan_bytes'] / 1e6:7.2f} MB scanned, {result['agreement'] * 100:.1f}% agree"
+        if 'hit_rate' in result:
+            line += (f"  {result['hit_rate'] * 100:.1f}% hits, {result['speedup']:.1f}x, "
+                     f"{result['agreement'] * 100:.1f}% agree")
+        if 'roster_hit_rate' in result:
+            line += (f"  {result['roster_hit_rate'] * 100:.1f}% answered by roster, {result['speedup']:.1f}x, "
+                     f"{result['agreement'] * 100:.1f}% agree")
+        if 'embeddings_per_sec' in result:
+            line += f"  {result['embeddings_per_sec']:8.1f} embeddings/s"
+        if 'ratio' in result:
+            line += f"  ({result['ratio']:.2f}x baseline{', REGRESSION' if name in regressions else ''})"
+        print(line)
+    
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'frames': len(frames)
+        },
+        'results': results,
+        'regressions': regressions
+    }
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
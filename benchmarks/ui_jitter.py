@@ -0,0 +1,178 @@
+"""Measure UI main-loop jitter with recognition in a thread vs in the engine process.
+
+Examples:
+    python benchmarks/ui_jitter.py
+    python benchmarks/ui_jitter.py --modes thread,process --duration 60 --json jitter.json
+
+A stand-in for the Tk main loop ticks every 16ms (one 60Hz frame) and
+records how late each tick ran. The same load runs alongside it in each
+mode: recognition on recorded frames at face_detection_interval plus a
+periodic rewrite of an attendance.xlsx of --rows rows.
+
+    idle     no load, the floor for this machine
+    thread   load in a worker thread of the UI process (the old GUI layout)
+    process  load in a RecognitionEngine child; the UI only copies frames
+             into shared memory and queues the xlsx writes
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import RecognitionEngine
+from run import load_frames, synthetic_attendance
+
+TICK = 0.016
+
+def tick_loop(duration: float, on_tick=None) -> List[float]:
+    """Run a 60Hz loop for duration seconds and return each tick's lateness in seconds."""
+    lateness = []
+    deadline = time.perf_counter() + duration
+    next_tick = time.perf_counter() + TICK
+    while next_tick < deadline:
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        now = time.perf_counter()
+        lateness.append(max(0.0, now - next_tick))
+        if on_tick is not None:
+            on_tick()
+        next_tick = now + TICK
+    return lateness
+
+def summarise(lateness: List[float]) -> Dict[str, float]:
+    values = np.array(lateness) * 1000
+    return {
+        'ticks': len(values),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(values.max()),
+        # Ticks that missed a whole frame are visible stutter
+        'missed_frames': int((values > TICK * 1000).sum())
+    }
+
+def thread_load(args, config: dict, frames: List[np.ndarray], df, path: str, stop: threading.Event):
+    """The recognition + logging work the GUI used to do in its own interpreter."""
+    import cv2
+    import face_recognition
+    from detection import DetectionRegion, detect_faces, detection_scale
+    from gallery import FaceGallery
+    processing = config.get('processing', {})
+    upsample = processing.get('upsample', 1)
+    region = DetectionRegion(config.get('check_in_camera', {}).get('roi'))
+    scale = detection_scale(processing.get('min_face_size', [80, 80]), upsample)
+    gallery = FaceGallery.from_config(config, args.faces)
+    next_save = time.monotonic() + args.save_interval
+    index = 0
+    while not stop.is_set():
+        frame = frames[index % len(frames)]
+        index += 1
+        locations, _ = detect_faces(frame, region, scale, upsample)
+        encodings = face_recognition.face_encodings(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), locations) \
+            if locations else []
+        for encoding in encodings:
+            gallery.match(encoding, tolerance=0.7)
+        if time.monotonic() >= next_save:
+            df.to_excel(path, index=False)
+            next_save = time.monotonic() + args.save_interval
+        stop.wait(args.interval)
+
+def run_mode(mode: str, args, config: dict, frames: List[np.ndarray], df, workdir: str) -> Dict[str, float]:
+    path = os.path.join(workdir, f"attendance-{mode}.xlsx")
+    if mode == 'idle':
+        return summarise(tick_loop(args.duration))
+    if mode == 'thread':
+        stop = threading.Event()
+        worker = threading.Thread(target=thread_load, args=(args, config, frames, df, path, stop),
+                                  name='jitter-load', daemon=True)
+        worker.start()
+        try:
+            return summarise(tick_loop(args.duration))
+        finally:
+            stop.set()
+            worker.join()
+    
+    config_path = os.path.join(workdir, 'camera_config.json')
+    with open(config_path, 'w') as f:
+        json.dump(config, f)
+    engine = RecognitionEngine(config_path, args.faces, frames[0].shape)
+    engine.start()
+    state = {'index': 0, 'next_save': time.monotonic() + args.save_interval, 'events': 0}
+    
+    def on_tick():
+        # Exactly what the GUI does per frame: hand it over, collect results, queue writes
+        engine.submit_frame(frames[state['index'] % len(frames)])
+        state['index'] += 1
+        state['events'] += len(engine.poll())
+        if time.monotonic() >= state['next_save']:
+            engine.save_attendance(df, path)
+            state['next_save'] = time.monotonic() + args.save_interval
+    
+    try:
+        time.sleep(args.engine_warmup)  # Let the child finish importing before measuring
+        result = summarise(tick_loop(args.duration, on_tick))
+        result['engine_events'] = state['events']
+        return result
+    finally:
+        engine.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='idle,thread,process', help='comma separated modes to run')
+    parser.add_argument('--config', default=os.path.join(ROOT, 'camera_config.json'))
+    parser.add_argument('--frames', default=os.path.join(ROOT, 'faces', '*.jpg'),
+                        help='recorded frames: video file, image directory or glob')
+    parser.add_argument('--faces', default=os.path.join(ROOT, 'faces'), help='gallery directory')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds per mode')
+    parser.add_argument('--interval', type=float, help='override face_detection_interval (seconds)')
+    parser.add_argument('--rows', type=int, default=2000, help='attendance rows rewritten each save')
+    parser.add_argument('--save-interval', type=float, default=5.0, help='seconds between attendance writes')
+    parser.add_argument('--engine-warmup', type=float, default=5.0, help='seconds to wait for the engine to start')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+    
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    if args.interval is not None:
+        config.setdefault('processing', {})['face_detection_interval'] = args.interval
+    args.interval = config.get('processing', {}).get('face_detection_interval', 0.5)
+    args.faces = os.path.abspath(args.faces)
+    frames = load_frames(args.frames, limit=50)
+    if not frames:
+        parser.error(f"no frames found at {args.frames}")
+    df = synthetic_attendance(args.rows, np.random.default_rng(0))
+    
+    # The engine saves its gallery on exit; give every mode a scratch copy
+    workdir = tempfile.mkdtemp(prefix='ui_jitter_')
+    shutil.copytree(args.faces, os.path.join(workdir, 'faces'))
+    args.faces = os.path.join(workdir, 'faces')
+    results = {}
+    try:
+        for mode in [mode.strip() for mode in args.modes.split(',') if mode.strip()]:
+            print(f"Running {mode} for {args.duration:.0f}s...")
+            results[mode] = run_mode(mode, args, config, frames, df, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    for mode, result in results.items():
+        print(f"{mode:8s} ticks {result['ticks']:5d}  lateness mean {result['mean_ms']:6.2f}ms  "
+              f"p50 {result['p50_ms']:6.2f}ms  p95 {result['p95_ms']:6.2f}ms  p99 {result['p99_ms']:6.2f}ms  "
+              f"max {result['max_ms']:7.2f}ms  missed frames {result['missed_frames']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import cv2
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+
+from detection import FaceDetector
+from encoder import DlibEmbedder, FaceEmbedder
+from startup import lazy_import
+
+face_recognition = lazy_import('face_recognition')
+
+DEFAULT_BURST_SIZE = 6
+DEFAULT_TOP_K = 3
+# Laplacian variance at which a face crop counts as "half sharp"
+SHARPNESS_HALF_POINT = 100.0
+# Face height (pixels) at which size stops improving the score
+FULL_SIZE_FACE_HEIGHT = 160
+
+class Shot:
+    """A candidate frame with its best face and quality score."""
+    __slots__ = ('frame', 'location', 'score', 'sharpness', 'size', 'pose')
+    
+    def __init__(self, frame: np.ndarray, location: Tuple[int, int, int, int],
+                 sharpness: float, size: float, pose: float):
+        self.frame = frame
+        self.location = location
+        self.sharpness = sharpness
+        self.size = size
+        self.pose = pose
+        self.score = sharpness * size * pose
+
+def sharpness_score(gray_face: np.ndarray) -> float:
+    """Blur score in [0, 1) from the variance of the Laplacian."""
+    variance = cv2.Laplacian(gray_face, cv2.CV_64F).var()
+    return variance / (variance + SHARPNESS_HALF_POINT)
+
+def pose_score(landmarks: dict) -> float:
+    """Frontal-pose score in [0, 1] from the 5-point landmarks (eyes and nose tip)."""
+    try:
+        left_eye = np.mean(landmarks['left_eye'], axis=0)
+        right_eye = np.mean(landmarks['right_eye'], axis=0)
+        nose = np.mean(landmarks['nose_tip'], axis=0)
+    except (KeyError, ValueError):
+        return 0.5
+    eye_vector = right_eye - left_eye
+    eye_distance = np.linalg.norm(eye_vector)
+    if eye_distance < 1:
+        return 0.0
+    # Yaw: how far the nose sits from the eye midpoint, relative to eye distance
+    yaw = abs(nose[0] - (left_eye[0] + right_eye[0]) / 2) / eye_distance
+    # Roll: tilt of the eye line
+    roll = abs(np.arctan2(eye_vector[1], eye_vector[0]))
+    return float(max(0.0, 1.0 - 2.0 * yaw) * max(0.0, 1.0 - roll / (np.pi / 4)))
+
+def score_shot(frame: np.ndarray, location: Tuple[int, int, int, int],
+               rgb_frame: Optional[np.ndarray] = None) -> Shot:
+    """Score one face in a BGR frame on sharpness, size and pose."""
+    top, right, bottom, left = location
+    face = frame[max(top, 0):bottom, max(left, 0):right]
+    sharpness = sharpness_score(cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)) if face.size else 0.0
+    size = min(1.0, (bottom - top) / FULL_SIZE_FACE_HEIGHT)
+    if rgb_frame is None:
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    landmarks = face_recognition.face_landmarks(rgb_frame, [location], model='small')
+    pose = pose_score(landmarks[0]) if landmarks else 0.5
+    return Shot(frame, location, sharpness, size, pose)
+
+def select_best_shots(frames: Sequence[np.ndarray], top_k: int = DEFAULT_TOP_K,
+                      detection_scale: float = 0.5, detector: Optional[FaceDetector] = None) -> List[Shot]:
+    """Detect the largest face in each frame (dlib HOG unless detector is given) and return the top_k shots by score."""
+    shots = []
+    for frame in frames:
+        if frame is None:
+            continue
+        small_frame = cv2.resize(frame, (0, 0), fx=detection_scale, fy=detection_scale) if detection_scale != 1.0 else frame
+        if detector is not None:
+            face_locations = detector.detect(small_frame)
+        else:
+            face_locations = face_recognition.face_locations(cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB))
+        if not face_locations:
+            continue
+        top, right, bottom, left = max(face_locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]))
+        location = tuple(int(round(v / detection_scale)) for v in (top, right, bottom, left))
+        shots.append(score_shot(frame, location))
+    shots.sort(key=lambda shot: shot.score, reverse=True)
+    return shots[:top_k]
+
+def encode_shots(shots: Sequence[Shot], mode: str = 'multi', embedder: Optional[FaceEmbedder] = None) -> np.ndarray:
+    """Encode only the selected shots, all in one batch (with dlib unless embedder is given).
+    
+    mode 'multi' returns one template per shot (n, 128); 'average' returns
+    a single L2-renormalised mean template (1, 128).
+    """
+    embedder = embedder if embedder is not None else DlibEmbedder()
+    chips = []
+    for shot in shots:
+        chips.extend(embedder.align(cv2.cvtColor(shot.frame, cv2.COLOR_BGR2RGB), [shot.location]))
+    if not chips:
+        return np.empty((0, embedder.size))
+    encodings = embedder.embed(chips)
+    if mode == 'average' and len(encodings) > 1:
+        mean = encodings.mean(axis=0)
+        # dlib encodings are roughly unit length; keep the average on that scale
+        mean *= np.linalg.norm(encodings, axis=1).mean() / max(np.linalg.norm(mean), 1e-12)
+        encodings = mean[np.newaxis, :]
+    return encodings
@@ -0,0 +1,140 @@
+import cv2
+import glob
+import os
+import time
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+class ReplaySource:
+    """Base for recorded sources; mimics the parts of cv2.VideoCapture we use.
+    
+    replay='realtime' paces frames at the recording fps, replay='max'
+    hands them out as fast as they are read. With loop=True the
+    recording restarts at the end instead of reporting end-of-stream.
+    """
+    live = False
+    
+    def __init__(self, fps: float, replay: str = 'realtime', loop: bool = False):
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.replay = replay
+        self.loop = loop
+        self.frames_read = 0
+        self._start: Optional[float] = None
+    
+    def _next_frame(self) -> Optional[np.ndarray]:
+        raise NotImplementedError
+    
+    def _rewind(self):
+        raise NotImplementedError
+    
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        frame = self._next_frame()
+        if frame is None and self.loop and self.frames_read:
+            self._rewind()
+            frame = self._next_frame()
+        if frame is None:
+            return False, None
+        if self.replay == 'realtime':
+            if self._start is None:
+                self._start = time.monotonic()
+            delay = self._start + self.frames_read / self.fps - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self.frames_read += 1
+        return True, frame
+    
+    def set(self, prop, value) -> bool:
+        # Capture properties (resolution, fps) are fixed by the recording
+        return False
+    
+    def get(self, prop) -> float:
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        return 0.0
+
+class VideoFileSource(ReplaySource):
+    """Replay a recorded video file."""
+    def __init__(self, path: str, replay: str = 'realtime', loop: bool = False,
+                 fps: Optional[float] = None):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        super().__init__(fps or self.cap.get(cv2.CAP_PROP_FPS), replay, loop)
+    
+    def _next_frame(self) -> Optional[np.ndarray]:
+        ret, frame = self.cap.read()
+        return frame if ret else None
+    
+    def _rewind(self):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+    
+    def release(self):
+        self.cap.release()
+
+class ImageSequenceSource(ReplaySource):
+    """Replay a directory or glob of still images in sorted order."""
+    def __init__(self, pattern: str, replay: str = 'realtime', loop: bool = False,
+                 fps: Optional[float] = None):
+        if os.path.isdir(pattern):
+            files = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            files = glob.glob(pattern)
+        self.files: List[str] = sorted(f for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+        self._index = 0
+        super().__init__(fps or 30.0, replay, loop)
+    
+    def _next_frame(self) -> Optional[np.ndarray]:
+        while self._index < len(self.files):
+            frame = cv2.imread(self.files[self._index])
+            self._index += 1
+            if frame is not None:
+                return frame
+        return None
+    
+    def _rewind(self):
+        self._index = 0
+    
+    def isOpened(self) -> bool:
+        return bool(self.files)
+    
+    def release(self):
+        self._index = len(self.files)
+
+def open_capture(source: Union[int, str, dict], resolution: Optional[Tuple[int, int]] = None,
+                 fps: Optional[float] = None, replay: Optional[str] = None):
+    """Open a camera index, video file, image directory/glob or source dict.
+    
+    A dict source looks like {"path": "recordings/room1.mp4", "replay": "max",
+    "loop": false, "fps": 15}. `replay` overrides the source's own setting.
+    Live cameras get the requested resolution and fps applied.
+    """
+    options = {}
+    if isinstance(source, dict):
+        options = source
+        source = options['path']
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    if isinstance(source, int):
+        cap = cv2.VideoCapture(source)
+        if resolution:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, resolution[0])
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, resolution[1])
+        if fps:
+            cap.set(cv2.CAP_PROP_FPS, fps)
+        return cap
+    replay = replay or options.get('replay', 'realtime')
+    loop = options.get('loop', False)
+    source_fps = options.get('fps')
+    if (os.path.isdir(source) or any(ch in source for ch in '*?[')
+            or source.lower().endswith(IMAGE_EXTENSIONS)):
+        return ImageSequenceSource(source, replay, loop, source_fps or fps)
+    return VideoFileSource(source, replay, loop, source_fps)
+
+def is_live(capture) -> bool:
+    """True for physical cameras, False for recorded replay sources."""
+    return getattr(capture, 'live', True)
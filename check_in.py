@@ -1,42 +1,118 @@
 import cv2
-import face_recognition
 import json
 import os
 import pandas as pd
 import serial
+import threading
+import time
+from collections import deque
 from datetime import datetime
-from typing import Tuple, Optional
+from queue import Queue, Empty, Full
+from typing import Dict, List, Tuple, Optional
 import numpy as np
 
+from best_shot import Shot, select_best_shots, encode_shots, DEFAULT_BURST_SIZE, DEFAULT_TOP_K
+from camera_sources import open_capture
+from detection import camera_detector, warm_up
+from events import DEFAULT_LEAD_TIME, EVENTS_FILE, active_events, load_events
+from encoder import make_embedder
+from gallery import check_embedding, save_encodings
+from metrics import REGISTRY
+from sessions import check_in_sessions, read_session_log, write_session_log
+from startup import Warmup
+
+class CheckInJob:
+    """A single check-in travelling through the pipeline stages."""
+    def __init__(self, student_id: str, name: str):
+        self.student_id = student_id
+        self.name = name
+        self.frame: Optional[np.ndarray] = None
+        self.frames: List[np.ndarray] = []
+        self.shots: List[Shot] = []
+        self.face_encoding: Optional[np.ndarray] = None
+        self.check_in_time: Optional[datetime] = None
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.success = False
+        self.message = ""
+    
+    def finish(self, success: bool, message: str):
+        self.success = success
+        self.message = message
+        self.done.set()
+
 class CheckInSystem:
-    def __init__(self, config_path: str = 'camera_config.json', 
+    def __init__(self, config_path: str = 'camera_config.json',
                  students_path: str = 'students.csv',
                  faces_dir: str = 'faces'):
         # Load configuration
         with open(config_path, 'r') as f:
             self.config = json.load(f)
+        processing = self.config.get('processing', {})
+        self.detection_scale = processing.get('check_in_detection_scale', 0.5)
+        queue_size = processing.get('check_in_queue_size', 4)
+        best_shot = processing.get('best_shot', {})
+        self.burst_size = best_shot.get('burst_size', DEFAULT_BURST_SIZE)
+        self.top_k = best_shot.get('top_k', DEFAULT_TOP_K)
+        self.template_mode = best_shot.get('template_mode', 'multi')
+        # Check-ins this long before an event already belong to its session
+        self.lead_time = self.config.get('events', {}).get('lead_time', DEFAULT_LEAD_TIME)
+        
+        # Load dlib's models in the background while the camera and RFID reader open
+        self.detector = camera_detector(self.config.get('check_in_camera', {}), processing)
+        self.embedder = make_embedder(self.config)
+        self.warmup = Warmup([('models', lambda: warm_up(detector=self.detector, embedder=self.embedder))]).start()
         
         # Initialize camera
         self.camera = self._setup_camera()
         
-        # Load student database
+        # Load student database and index it by ID for constant-time lookups
         self.students_df = pd.read_csv(students_path)
+        self.student_names: Dict[str, str] = dict(zip(
+            self.students_df['student_id'].astype(str), self.students_df['name']))
         
         # Create faces directory if it doesn't exist
         self.faces_dir = faces_dir
         os.makedirs(self.faces_dir, exist_ok=True)
+        check_embedding(self.config, self.faces_dir)  # Warns if new encodings would not match the gallery
         
         # Initialize RFID reader
         self.rfid_reader = self._setup_rfid()
+        
+        # Pipeline stages: capture -> detect -> encode -> persist
+        self.detect_queue: Queue = Queue(maxsize=queue_size)
+        self.encode_queue: Queue = Queue(maxsize=queue_size)
+        self.persist_queue: Queue = Queue(maxsize=queue_size * 4)
+        self.stage_latency = {
+            stage: REGISTRY.histogram('check_in_stage_seconds', 'Time per check-in pipeline stage', stage=stage)
+            for stage in ('capture', 'detect', 'encode', 'persist', 'result')
+        }
+        self.flush_latency = REGISTRY.histogram('attendance_flush_seconds', 'Time to write the attendance log',
+                                                component='check_in')
+        for stage, queue in (('detect', self.detect_queue), ('encode', self.encode_queue),
+                             ('persist', self.persist_queue)):
+            REGISTRY.gauge('check_in_queue_depth', 'Jobs waiting for a check-in stage',
+                           func=queue.qsize, stage=stage)
+        # (monotonic capture time, frame) pairs, so a stalled camera's last frames are not reused
+        self._recent_frames: deque = deque(maxlen=max(1, self.burst_size))
+        self._frame_lock = threading.Lock()
+        self._frame_ready = threading.Condition(self._frame_lock)
+        self.stopped = False
+        # Persist keeps draining after the other stages stop, until close() has joined them
+        self._persist_stopped = False
+        self._workers = [
+            threading.Thread(target=self._capture_loop, name='check-in-capture', daemon=True),
+            threading.Thread(target=self._detect_loop, name='check-in-detect', daemon=True),
+            threading.Thread(target=self._encode_loop, name='check-in-encode', daemon=True),
+            threading.Thread(target=self._persist_loop, name='check-in-persist', daemon=True)
+        ]
+        for worker in self._workers:
+            worker.start()
     
     def _setup_camera(self):
         """Initialize the check-in camera."""
         cam_config = self.config['check_in_camera']
-        cap = cv2.VideoCapture(cam_config['source'])
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, cam_config['resolution'][0])
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, cam_config['resolution'][1])
-        cap.set(cv2.CAP_PROP_FPS, cam_config['fps'])
-        return cap
+        return open_capture(cam_config['source'], cam_config['resolution'], cam_config['fps'])
     
     def _setup_rfid(self):
         """Initialize RFID reader - modify port as needed."""
@@ -57,69 +133,215 @@ class CheckInSystem:
             return rfid_data
         return None
     
-    def capture_face(self) -> Optional[np.ndarray]:
-        """Capture and return a frame from the camera."""
-        ret, frame = self.camera.read()
-        if not ret:
-            return None
-        return frame
-    
-    def process_check_in(self, student_id: str) -> Tuple[bool, str]:
-        """Process student check-in with RFID and face capture."""
-        # Verify student ID exists
-        student = self.students_df[self.students_df['student_id'] == student_id]
-        if student.empty:
-            return False, "Student ID not found"
-        
-        # Capture face
-        frame = self.capture_face()
-        if frame is None:
-            return False, "Failed to capture image"
-        
-        # Detect face in frame
-        face_locations = face_recognition.face_locations(frame)
-        if not face_locations:
-            return False, "No face detected"
-        
-        # Save face image
-        face_path = os.path.join(self.faces_dir, f"{student_id}.jpg")
-        cv2.imwrite(face_path, frame)
+    def capture_face(self, timeout: float = 1.0) -> Optional[np.ndarray]:
+        """Return the most recent frame grabbed by the capture stage."""
+        burst = self.capture_burst(timeout)
+        return burst[-1] if burst else None
+    
+    def capture_burst(self, timeout: float = 1.0) -> List[np.ndarray]:
+        """Return the last burst_size frames grabbed by the capture stage, leaving out any older than timeout."""
+        with self._frame_ready:
+            self._frame_ready.wait_for(lambda: self._fresh_frames(timeout), timeout=timeout)
+            return self._fresh_frames(timeout)
+    
+    def _fresh_frames(self, max_age: float) -> List[np.ndarray]:
+        """Frames captured within max_age seconds (call with _frame_lock held)."""
+        oldest = time.monotonic() - max_age
+        return [frame for captured, frame in self._recent_frames if captured >= oldest]
+    
+    def _capture_loop(self):
+        """Capture stage: keep the newest camera frame ready for check-ins."""
+        while not self.stopped:
+            if self.camera is None or not self.camera.isOpened():
+                time.sleep(0.5)
+                continue
+            ret, frame = self.camera.read()
+            if not ret:
+                time.sleep(0.05)
+                continue
+            with self._frame_ready:
+                self._recent_frames.append((time.monotonic(), frame))
+                self._frame_ready.notify_all()
+    
+    def submit_check_in(self, student_id: str) -> CheckInJob:
+        """Queue a check-in and return its job without waiting for the result."""
+        student_id = str(student_id)
+        job = CheckInJob(student_id, self.student_names.get(student_id, ''))
+        if student_id not in self.student_names:
+            job.finish(False, "Student ID not found")
+            return job
         
-        # Get face encoding
-        face_encoding = face_recognition.face_encodings(frame, face_locations)[0]
-        encoding_path = os.path.join(self.faces_dir, f"{student_id}.npy")
-        np.save(encoding_path, face_encoding)
+        # Capture a short burst of faces
+        with self.stage_latency['capture'].time():
+            job.frames = self.capture_burst()
+        if not job.frames:
+            job.finish(False, "Failed to capture image")
+            return job
         
-        # Log check-in time
-        check_in_time = datetime.now()
-        self._update_attendance_log(student_id, student.iloc[0]['name'], check_in_time)
+        try:
+            self.detect_queue.put(job, timeout=0.1)
+        except Full:
+            job.finish(False, "Check-in busy, please scan again")
+        return job
+    
+    def process_check_in(self, student_id: str, timeout: float = 5.0) -> Tuple[bool, str]:
+        """Process student check-in with RFID and face capture.
         
-        return True, "Check-in successful"
+        Returns as soon as the face is encoded; image, encoding and attendance
+        log writes complete in the background persist stage.
+        """
+        job = self.submit_check_in(student_id)
+        if not job.done.wait(timeout=timeout):
+            return False, "Check-in timed out"
+        return job.success, job.message
+    
+    def _detect_loop(self):
+        """Detect stage: find and score faces in the burst on downscaled frames."""
+        while not self.stopped:
+            try:
+                job = self.detect_queue.get(timeout=0.5)
+            except Empty:
+                continue
+            try:
+                with self.stage_latency['detect'].time():
+                    job.shots = select_best_shots(job.frames, self.top_k, self.detection_scale, self.detector)
+            except Exception as e:
+                # One bad burst must not take the stage down for every later check-in
+                print(f"Error detecting faces for {job.student_id}: {e}")
+                job.finish(False, f"Face detection failed: {e}")
+                continue
+            if not job.shots:
+                job.finish(False, "No face detected")
+                continue
+            job.frame = job.shots[0].frame
+            job.frames = []
+            try:
+                self.encode_queue.put(job, timeout=0.1)
+            except Full:
+                job.finish(False, "Check-in busy, please scan again")
+    
+    def _encode_loop(self):
+        """Encode stage: encode only the best shots and report the result."""
+        while not self.stopped:
+            try:
+                job = self.encode_queue.get(timeout=0.5)
+            except Empty:
+                continue
+            try:
+                with self.stage_latency['encode'].time():
+                    encodings = encode_shots(job.shots, self.template_mode, self.embedder)
+            except Exception as e:
+                print(f"Error encoding faces for {job.student_id}: {e}")
+                job.finish(False, f"Face encoding failed: {e}")
+                continue
+            if len(encodings) == 0:
+                job.finish(False, "No face detected")
+                continue
+            job.face_encoding = encodings
+            job.check_in_time = datetime.now()
+            # Hand off before reporting success; a backed-up persist stage fails the check-in rather than stalling
+            try:
+                self.persist_queue.put(job, timeout=0.1)
+            except Full:
+                job.finish(False, "Check-in busy, please scan again")
+                continue
+            self.stage_latency['result'].observe(time.perf_counter() - job.submitted)
+            job.finish(True, "Check-in successful")
+    
+    def _persist_loop(self):
+        """Persist stage: write images, encodings and the attendance log in batches."""
+        while not self._persist_stopped or not self.persist_queue.empty():
+            try:
+                batch = [self.persist_queue.get(timeout=0.5)]
+            except Empty:
+                continue
+            # Coalesce everything already waiting into one Excel rewrite
+            while True:
+                try:
+                    batch.append(self.persist_queue.get_nowait())
+                except Empty:
+                    break
+            with self.stage_latency['persist'].time():
+                self._persist_batch(batch)
+    
+    def _persist_batch(self, batch: List[CheckInJob]):
+        rows = []
+        for job in batch:
+            try:
+                # Save the best face image
+                face_path = os.path.join(self.faces_dir, f"{job.student_id}.jpg")
+                cv2.imwrite(face_path, job.frame)
+                
+                # Save face encoding templates
+                encoding_path = os.path.join(self.faces_dir, f"{job.student_id}.npy")
+                save_encodings(encoding_path, job.face_encoding)
+            except Exception as e:
+                print(f"Error saving face data for {job.student_id}: {e}")
+            rows.append((job.student_id, job.name, job.check_in_time))
+        try:
+            with self.flush_latency.time():
+                self._update_attendance_log_batch(rows)
+        except Exception as e:
+            print(f"Error writing attendance log: {e}")
     
     def _update_attendance_log(self, student_id: str, name: str, check_in_time: datetime):
         """Update the attendance log Excel file."""
-        try:
-            df = pd.read_excel('attendance.xlsx')
-        except FileNotFoundError:
-            df = pd.DataFrame(columns=['student_id', 'name', 'check_in_time', 'last_seen_time'])
-        
-        # Update or append new check-in
-        new_row = {
-            'student_id': student_id,
-            'name': name,
-            'check_in_time': check_in_time,
-            'last_seen_time': check_in_time
-        }
-        
-        if student_id in df['student_id'].values:
-            df.loc[df['student_id'] == student_id] = new_row
-        else:
-            df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+        self._update_attendance_log_batch([(student_id, name, check_in_time)])
+    
+    def _update_attendance_log_batch(self, rows: List[Tuple[str, str, datetime]]):
+        """Apply several check-ins to the attendance logs with a single rewrite per session.
         
-        df.to_excel('attendance.xlsx', index=False)
+        A check-in goes to every running event whose roster lists the
+        student (or that has no roster), otherwise to the default log.
+        """
+        try:
+            events = active_events(load_events(EVENTS_FILE), lead=self.lead_time)
+        except Exception as e:
+            print(f"Error reading events: {e}")
+            events = []
+        sessions: Dict[str, List[Tuple[str, str, datetime]]] = {}
+        for row in rows:
+            for sid in check_in_sessions(events, row[0]):
+                sessions.setdefault(sid, []).append(row)
+        for sid, session_rows in sessions.items():
+            write_session_log(sid, self._apply_check_ins(read_session_log(sid), session_rows))
+    
+    def _apply_check_ins(self, df: pd.DataFrame, rows: List[Tuple[str, str, datetime]]) -> pd.DataFrame:
+        for student_id, name, check_in_time in rows:
+            # Update or append new check-in
+            new_row = {
+                'student_id': student_id,
+                'name': name,
+                'check_in_time': check_in_time,
+                'last_seen_time': check_in_time
+            }
+            
+            idx = df['student_id'].astype(str) == student_id
+            if idx.any():
+                df.loc[idx, list(new_row)] = list(new_row.values())
+            else:
+                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+        return df
+    
+    def latency_report(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage latency summaries in milliseconds."""
+        return {stage: hist.summary() for stage, hist in self.stage_latency.items()}
     
     def close(self):
         """Clean up resources."""
+        self.stopped = True
+        # Stop capture, detect and encode first so no reported success reaches persist after it exits
+        for worker in self._workers[:-1]:
+            worker.join(timeout=5.0)
+        for pending in (self.detect_queue, self.encode_queue):
+            while True:
+                try:
+                    pending.get_nowait().finish(False, "Check-in stopped, please scan again")
+                except Empty:
+                    break
+        # Then let the persist stage flush outstanding writes
+        self._persist_stopped = True
+        self._workers[-1].join(timeout=5.0)
         if self.camera is not None:
             self.camera.release()
         if self.rfid_reader is not None:
@@ -136,4 +358,6 @@ if __name__ == "__main__":
                 print(f"Check-in result: {message}")
     except KeyboardInterrupt:
         check_in_system.close()
+        for stage, stats in check_in_system.latency_report().items():
+            print(f"{stage}: n={stats['count']} p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms")
         print("\nCheck-in system closed") 
\ No newline at end of file
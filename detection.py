@@ -0,0 +1,292 @@
+import cv2
+import numpy as np
+import os
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from startup import lazy_import
+
+# dlib and its models load on the first detection (or warm_up) rather than at import
+face_recognition = lazy_import('face_recognition')
+
+# dlib's HOG detector scans an 80x80 window; each upsample halves the smallest face it finds
+HOG_MIN_FACE = 80
+# OpenCV DNN models are not bundled; download them into models/ (see README)
+MODELS_DIR = 'models'
+YUNET_MODEL = os.path.join(MODELS_DIR, 'face_detection_yunet_2023mar.onnx')
+SSD_PROTOTXT = os.path.join(MODELS_DIR, 'deploy.prototxt')
+SSD_MODEL = os.path.join(MODELS_DIR, 'res10_300x300_ssd_iter_140000.caffemodel')
+HAAR_CASCADE = 'haarcascade_frontalface_default.xml'
+
+Location = Tuple[int, int, int, int]
+
+def _location(x: float, y: float, w: float, h: float, width: int, height: int) -> Location:
+    """(top, right, bottom, left) of an OpenCV (x, y, w, h) box, clipped to the frame."""
+    left, top = max(0, int(x)), max(0, int(y))
+    right, bottom = min(width, int(x + w)), min(height, int(y + h))
+    return top, right, bottom, left
+
+class FaceDetector:
+    """A face detection backend; detect() takes a BGR frame and returns (top, right, bottom, left) boxes.
+    
+    min_face is the smallest face, in pixels, the backend finds in a frame
+    at full scale; detection_scale() shrinks frames down to it. None means
+    the backend resizes its input itself, so shrinking gains nothing.
+    """
+    name = 'base'
+    min_face: Optional[float] = None
+    
+    def detect(self, frame: np.ndarray) -> List[Location]:
+        raise NotImplementedError
+    
+    def __repr__(self) -> str:
+        return f"<{self.name} face detector>"
+
+class DlibDetector(FaceDetector):
+    """dlib's HOG (model='hog') or CNN (model='cnn') detector through face_recognition."""
+    def __init__(self, model: str = 'hog', upsample: int = 1):
+        self.name = model
+        self.model = model
+        self.upsample = upsample
+        self.min_face = HOG_MIN_FACE / (2 ** upsample)
+    
+    def detect(self, frame: np.ndarray) -> List[Location]:
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return face_recognition.face_locations(rgb_frame, number_of_times_to_upsample=self.upsample,
+                                               model=self.model)
+
+class YuNetDetector(FaceDetector):
+    """OpenCV's YuNet ONNX detector (cv2.FaceDetectorYN, OpenCV 4.5.4+); fast and good on small faces."""
+    name = 'yunet'
+    min_face = 20
+    
+    def __init__(self, model: str = YUNET_MODEL, score_threshold: float = 0.8,
+                 nms_threshold: float = 0.3, top_k: int = 5000):
+        if not os.path.exists(model):
+            raise FileNotFoundError(f"YuNet model not found: {model}")
+        self.net = cv2.FaceDetectorYN.create(model, '', (320, 320), score_threshold, nms_threshold, top_k)
+        self._size = None
+    
+    def detect(self, frame: np.ndarray) -> List[Location]:
+        height, width = frame.shape[:2]
+        if self._size != (width, height):
+            self.net.setInputSize((width, height))
+            self._size = (width, height)
+        _, faces = self.net.detect(frame)
+        if faces is None:
+            return []
+        return [_location(x, y, w, h, width, height) for x, y, w, h in faces[:, :4]]
+
+class SsdDetector(FaceDetector):
+    """OpenCV's ResNet-10 SSD Caffe detector through cv2.dnn; the frame is resized to input_size."""
+    name = 'ssd'
+    
+    def __init__(self, prototxt: str = SSD_PROTOTXT, model: str = SSD_MODEL,
+                 confidence: float = 0.5, input_size: int = 300):
+        for path in (prototxt, model):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"SSD model file not found: {path}")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, model)
+        self.confidence = confidence
+        self.input_size = input_size
+    
+    def detect(self, frame: np.ndarray) -> List[Location]:
+        height, width = frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(frame, 1.0, (self.input_size, self.input_size), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+        locations = []
+        for x0, y0, x1, y1 in detections[detections[:, 2] >= self.confidence][:, 3:7]:
+            x0, x1 = x0 * width, x1 * width
+            y0, y1 = y0 * height, y1 * height
+            if x1 > x0 and y1 > y0:
+                locations.append(_location(x0, y0, x1 - x0, y1 - y0, width, height))
+        return locations
+
+class HaarDetector(FaceDetector):
+    """OpenCV's Haar cascade: the cheapest backend, frontal faces only, more false positives."""
+    name = 'haar'
+    
+    def __init__(self, cascade: str = HAAR_CASCADE, scale_factor: float = 1.1,
+                 min_neighbors: int = 5, min_size: int = 30):
+        path = cascade if os.path.exists(cascade) else os.path.join(cv2.data.haarcascades, cascade)
+        self.cascade = cv2.CascadeClassifier(path)
+        if self.cascade.empty():
+            raise FileNotFoundError(f"Haar cascade not found: {path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_face = min_size
+    
+    def detect(self, frame: np.ndarray) -> List[Location]:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                              minSize=(int(self.min_face), int(self.min_face)))
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in faces]
+
+class GatedDetector(FaceDetector):
+    """Runs detector only on frames where a cheap gate (usually Haar) sees a face.
+    
+    An empty room costs one gate pass per frame instead of a full
+    detection. The gate must find a face for the detector to run, so its
+    misses (profile faces, for Haar) become misses of the pair.
+    """
+    def __init__(self, detector: FaceDetector, gate: FaceDetector):
+        self.detector = detector
+        self.gate = gate
+        self.name = f"{detector.name}+{gate.name}"
+        # Shrinking past the gate's smallest face would blind the gate
+        sizes = [size for size in (detector.min_face, gate.min_face) if size is not None]
+        self.min_face = max(sizes) if detector.min_face is not None and sizes else None
+        self.frames = 0
+        self.passed = 0
+    
+    def detect(self, frame: np.ndarray) -> List[Location]:
+        self.frames += 1
+        if not self.gate.detect(frame):
+            return []
+        self.passed += 1
+        return self.detector.detect(frame)
+
+DETECTORS = {
+    'yunet': YuNetDetector,
+    'ssd': SsdDetector,
+    'haar': HaarDetector
+}
+
+def make_detector(spec=None, upsample: int = 1, fallback: bool = True) -> Optional[FaceDetector]:
+    """Build the detector a `detector` setting in camera_config.json describes.
+    
+    spec is a backend name ('hog', 'cnn', 'yunet', 'ssd' or 'haar') or a
+    dict {"backend": ..., "gate": <spec>, <backend options>}. A backend
+    whose model file or OpenCV support is missing falls back to HOG, or
+    to None without fallback (a gate that cannot load is left out).
+    """
+    options = {'backend': spec} if isinstance(spec, str) else dict(spec or {})
+    backend = options.pop('backend', 'hog')
+    gate = options.pop('gate', None)
+    try:
+        if backend in ('hog', 'cnn'):
+            detector = DlibDetector(backend, options.pop('upsample', upsample))
+        elif backend in DETECTORS:
+            detector = DETECTORS[backend](**options)
+        else:
+            raise ValueError(f"unknown backend {backend!r}")
+    except (AttributeError, OSError, TypeError, ValueError, cv2.error) as e:
+        if not fallback:
+            print(f"Error loading {backend} face detector ({e}); running without it")
+            return None
+        print(f"Error loading {backend} face detector ({e}); using HOG")
+        detector = DlibDetector('hog', upsample)
+    if gate:
+        gate = make_detector(gate, upsample, fallback=False)
+        if gate is not None:
+            detector = GatedDetector(detector, gate)
+    return detector
+
+def camera_detector(cam_config: dict, processing: dict) -> FaceDetector:
+    """The detector for a camera: its own `detector`, else processing.detector, else HOG."""
+    return make_detector(cam_config.get('detector', processing.get('detector')), processing.get('upsample', 1))
+
+def detection_scale(min_face_size: Sequence[int], upsample: int = 1,
+                    max_scale: float = 1.0, detector: Optional[FaceDetector] = None) -> float:
+    """Smallest frame scale at which faces of min_face_size are still detectable."""
+    detector_min = HOG_MIN_FACE / (2 ** upsample) if detector is None else detector.min_face
+    if detector_min is None:
+        return max_scale
+    smallest = max(1, min(min_face_size))
+    return min(max_scale, detector_min / smallest)
+
+class DetectionRegion:
+    """Region of interest for a camera: a crop box plus an optional polygon mask.
+    
+    `rois` comes from `monitoring_cameras[].roi` in camera_config.json and is
+    a list of entries, each either {"rect": [x, y, w, h]} or
+    {"polygon": [[x, y], ...]} in capture-resolution pixels. With no ROIs
+    the whole frame is scanned.
+    """
+    def __init__(self, rois: Optional[List[dict]] = None):
+        self.rois = rois or []
+        self._shape = None
+        self._box = None
+        self._mask = None
+    
+    def _build(self, shape: Tuple[int, int]):
+        height, width = shape
+        polygons = []
+        for roi in self.rois:
+            if 'rect' in roi:
+                x, y, w, h = roi['rect']
+                polygons.append(np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], dtype=np.int32))
+            elif 'polygon' in roi:
+                polygons.append(np.array(roi['polygon'], dtype=np.int32))
+        if not polygons:
+            self._box = (0, 0, width, height)
+            self._mask = None
+        else:
+            points = np.vstack(polygons)
+            x0, y0 = np.clip(points.min(axis=0), 0, [width, height])
+            x1, y1 = np.clip(points.max(axis=0), 0, [width, height])
+            self._box = (int(x0), int(y0), int(x1), int(y1))
+            # Rectangles need no mask once cropped; polygons mask out the corners
+            if all('rect' in roi for roi in self.rois) and len(polygons) == 1:
+                self._mask = None
+            else:
+                mask = np.zeros((height, width), dtype=np.uint8)
+                cv2.fillPoly(mask, polygons, 255)
+                self._mask = mask[y0:y1, x0:x1]
+        self._shape = shape
+    
+    def crop(self, frame: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """Return the ROI view of frame and its (x, y) offset in the full frame."""
+        if self._shape != frame.shape[:2]:
+            self._build(frame.shape[:2])
+        x0, y0, x1, y1 = self._box
+        region = frame[y0:y1, x0:x1]
+        if self._mask is not None:
+            region = cv2.bitwise_and(region, region, mask=self._mask)
+        return region, (x0, y0)
+
+def detect_faces(frame: np.ndarray, region: Optional[DetectionRegion] = None,
+                 scale: float = 1.0, upsample: int = 1, model: str = 'hog',
+                 detector: Optional[FaceDetector] = None) -> Tuple[List[Location], int]:
+    """Detect faces in a BGR frame restricted to region and scaled by scale.
+    
+    detector defaults to dlib's model ('hog' or 'cnn') at upsample.
+    Returns face locations in full-frame (top, right, bottom, left) order and
+    the number of pixels the detector actually scanned.
+    """
+    if region is not None:
+        frame, (offset_x, offset_y) = region.crop(frame)
+    else:
+        offset_x, offset_y = 0, 0
+    if frame.size == 0:
+        return [], 0
+    if scale != 1.0:
+        frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+    if detector is None:
+        detector = DlibDetector(model, upsample)
+    locations = detector.detect(frame)
+    pixels = frame.shape[0] * frame.shape[1]
+    return [
+        (int(top / scale) + offset_y, int(right / scale) + offset_x,
+         int(bottom / scale) + offset_y, int(left / scale) + offset_x)
+        for top, right, bottom, left in locations
+    ], pixels
+
+def warm_up(shape: Tuple[int, int, int] = (480, 640, 3), upsample: int = 1,
+            detector: Optional[FaceDetector] = None, embedder=None) -> float:
+    """Run the detector and the encoder once on a blank frame so the first real frame is not slow.
+    
+    Returns the seconds it took.
+    """
+    started = time.perf_counter()
+    frame = np.zeros(shape, dtype=np.uint8)
+    if detector is not None:
+        detector.detect(frame)
+    else:
+        face_recognition.face_locations(frame, number_of_times_to_upsample=upsample)
+    if embedder is not None:
+        embedder.embed(embedder.align(frame, [(0, 150, 150, 0)]))
+    else:
+        face_recognition.face_encodings(frame, [(0, 150, 150, 0)])
+    return time.perf_counter() - started
@@ -0,0 +1,327 @@
+import json
+import socket
+import socketserver
+import struct
+import threading
+import time
+import zlib
+from queue import Queue, Empty, Full
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metrics import REGISTRY
+
+DEFAULT_EDGE_PORT = 9200
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_DELAY = 0.2
+DEFAULT_COMPRESSION_LEVEL = 1
+DEFAULT_QUEUE_SIZE = 1024
+# Message header: magic, flags, payload length
+HEADER = struct.Struct('!4sBI')
+MAGIC = b'AEB1'
+FLAG_ZLIB = 0x01
+# The central node acknowledges each message with the number of embeddings it queued
+ACK = struct.Struct('!I')
+# Payloads smaller than this are sent as-is; zlib framing would outweigh the saving
+MIN_COMPRESS_SIZE = 256
+MAX_PAYLOAD_SIZE = 16 * 1024 * 1024
+# Embeddings travel as little-endian float32: 512 bytes per face, plenty for 128-d dlib encodings
+WIRE_DTYPE = np.dtype('<f4')
+RECONNECT_DELAY = 0.5
+MAX_RECONNECT_DELAY = 10.0
+
+def pack_batch(node: str, items: Sequence[list], encodings: np.ndarray) -> bytes:
+    """Uncompressed payload for one batch.
+    
+    A length-prefixed JSON block of per-face metadata ([camera, frame,
+    timestamp, top, right, bottom, left] per face) followed by the
+    (n, 128) float32 embedding matrix.
+    """
+    meta = json.dumps({'node': node, 'sent': time.time(), 'items': list(items)},
+                      separators=(',', ':')).encode('utf-8')
+    return struct.pack('!I', len(meta)) + meta + np.asarray(encodings, dtype=WIRE_DTYPE).tobytes()
+
+def frame_payload(payload: bytes, compression_level: int = DEFAULT_COMPRESSION_LEVEL) -> bytes:
+    """Add the message header, zlib-compressing the payload when that makes it smaller."""
+    flags = 0
+    if compression_level > 0 and len(payload) >= MIN_COMPRESS_SIZE:
+        compressed = zlib.compress(payload, compression_level)
+        if len(compressed) < len(payload):
+            payload, flags = compressed, FLAG_ZLIB
+    return HEADER.pack(MAGIC, flags, len(payload)) + payload
+
+def decode_payload(flags: int, payload: bytes) -> Tuple[dict, np.ndarray]:
+    """Inverse of pack_batch for a payload whose header has already been read."""
+    if flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    (meta_size,) = struct.unpack_from('!I', payload)
+    meta = json.loads(payload[4:4 + meta_size].decode('utf-8'))
+    encodings = np.frombuffer(payload, dtype=WIRE_DTYPE, offset=4 + meta_size)
+    encodings = encodings.reshape(len(meta['items']), -1) if meta['items'] else encodings.reshape(0, 0)
+    return meta, encodings
+
+def read_message(stream) -> Optional[Tuple[dict, np.ndarray, int]]:
+    """Read one message from a binary stream; returns (meta, encodings, wire bytes) or None at EOF."""
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    magic, flags, size = HEADER.unpack(header)
+    if magic != MAGIC or size > MAX_PAYLOAD_SIZE:
+        raise ValueError(f"bad message header {header!r}")
+    payload = stream.read(size)
+    if len(payload) < size:
+        return None
+    meta, encodings = decode_payload(flags, payload)
+    return meta, encodings, HEADER.size + size
+
+class EdgeSender:
+    """Streams face embeddings from a camera node to the central matcher.
+    
+    submit() never blocks the recognition loop: embeddings go into a
+    bounded queue (the oldest is dropped when it is full) and a sender
+    thread ships them in batches of up to batch_size, or whatever has
+    arrived max_delay seconds after the first one. A batch counts as sent
+    once the central node acknowledges it; until then it is resent over a
+    fresh connection with exponential backoff while newer embeddings keep
+    queueing behind it.
+    """
+    def __init__(self, node: str, host: str = '127.0.0.1', port: int = DEFAULT_EDGE_PORT,
+                 batch_size: int = DEFAULT_BATCH_SIZE, max_delay: float = DEFAULT_MAX_DELAY,
+                 compression_level: int = DEFAULT_COMPRESSION_LEVEL, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.node = node
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.compression_level = compression_level
+        self.queue: Queue = Queue(maxsize=queue_size)
+        self.sock: Optional[socket.socket] = None
+        self.stopped = False
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.embeddings_sent = REGISTRY.counter('edge_embeddings_sent_total', 'Embeddings sent to the central node',
+                                                node=node)
+        self.embeddings_dropped = REGISTRY.counter('edge_embeddings_dropped_total',
+                                                   'Embeddings dropped because the send queue was full', node=node)
+        self.batches_sent = REGISTRY.counter('edge_batches_sent_total', 'Batches sent to the central node', node=node)
+        REGISTRY.counter('edge_bytes_sent_total', 'Bytes sent to the central node, after compression',
+                         func=lambda: self.wire_bytes, node=node)
+        REGISTRY.gauge('edge_send_queue', 'Embeddings waiting to be sent', func=self.queue.qsize, node=node)
+        self.thread = threading.Thread(target=self._run, name='edge-sender', daemon=True)
+    
+    @classmethod
+    def from_config(cls, config: dict) -> 'EdgeSender':
+        """Sender using the `edge` section of camera_config.json."""
+        options = config.get('edge', {})
+        return cls(options.get('node') or socket.gethostname(),
+                   options.get('host', '127.0.0.1'), options.get('port', DEFAULT_EDGE_PORT),
+                   options.get('batch_size', DEFAULT_BATCH_SIZE), options.get('max_delay', DEFAULT_MAX_DELAY),
+                   options.get('compression_level', DEFAULT_COMPRESSION_LEVEL),
+                   options.get('queue_size', DEFAULT_QUEUE_SIZE))
+    
+    def start(self):
+        self.thread.start()
+        return self
+    
+    def submit(self, camera: str, frame: int, timestamp: float, location: Sequence[int], encoding: np.ndarray):
+        """Queue one face for the central node (never blocks)."""
+        item = ([camera, frame, timestamp] + [int(v) for v in location], encoding)
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except Full:
+                try:
+                    self.queue.get_nowait()
+                    self.embeddings_dropped.inc()
+                except Empty:
+                    pass
+    
+    @property
+    def compression_ratio(self) -> float:
+        """Uncompressed over wire bytes for everything sent so far."""
+        return self.raw_bytes / self.wire_bytes if self.wire_bytes else 1.0
+    
+    def _next_batch(self) -> List[tuple]:
+        """Wait for the first item, then gather more until the batch is full or max_delay has passed."""
+        try:
+            batch = [self.queue.get(timeout=0.5)]
+        except Empty:
+            return []
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while not self.stopped or not self.queue.empty():
+            batch = self._next_batch()
+            if batch:
+                self._send_batch(batch)
+        self._close()
+    
+    def _send_batch(self, batch: List[tuple]):
+        items = [item for item, _ in batch]
+        encodings = np.stack([encoding for _, encoding in batch])
+        payload = pack_batch(self.node, items, encodings)
+        message = frame_payload(payload, self.compression_level)
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                if self.sock is None:
+                    self.sock = socket.create_connection((self.host, self.port), timeout=5)
+                    self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.sock.sendall(message)
+                if len(self._recv_exact(ACK.size)) < ACK.size:
+                    raise ConnectionResetError("central node closed the connection")
+                break
+            except OSError as e:
+                self._close()
+                if self.stopped:
+                    print(f"Dropping {len(batch)} embeddings for {self.host}:{self.port}: {e}")
+                    return
+                print(f"Error sending embeddings to {self.host}:{self.port}: {e}; retrying in {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+        self.raw_bytes += HEADER.size + len(payload)
+        self.wire_bytes += len(message)
+        self.embeddings_sent.inc(len(batch))
+        self.batches_sent.inc()
+    
+    def _recv_exact(self, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+    
+    def _close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+    
+    def stop(self, timeout: float = 5.0):
+        """Flush what is queued (up to timeout) and disconnect."""
+        self.stopped = True
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+class _EdgeHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        receiver: 'EdgeReceiver' = self.server.receiver
+        address = f"{self.client_address[0]}:{self.client_address[1]}"
+        node = None
+        try:
+            while not receiver.stopped:
+                message = read_message(self.rfile)
+                if message is None:
+                    break
+                meta, encodings, size = message
+                node = meta.get('node', address)
+                receiver._received(node, address, meta, encodings, size)
+                self.wfile.write(ACK.pack(len(meta['items'])))
+        except (OSError, ValueError, zlib.error) as e:
+            print(f"Error reading embeddings from {address}: {e}")
+        finally:
+            if node is not None:
+                receiver._disconnected(node)
+
+class _EdgeServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Dozens of nodes reconnect at once after a central restart
+    request_queue_size = 128
+
+class EdgeReceiver:
+    """TCP endpoint on the central node that collects embedding batches from edge nodes.
+    
+    Each connection gets its own reader thread; decoded batches go into
+    one bounded queue that the monitor thread drains, so the gallery and
+    attendance log are still only touched from a single thread. When the
+    matcher falls behind the oldest batches are dropped.
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_EDGE_PORT, queue_size: int = 256):
+        self.host = host
+        self.port = port
+        self.batches: Queue = Queue(maxsize=queue_size)
+        self.nodes: Dict[str, dict] = {}
+        self.stopped = False
+        self.server: Optional[_EdgeServer] = None
+        self._lock = threading.Lock()
+        self.batches_dropped = REGISTRY.counter('edge_batches_dropped_total',
+                                                'Batches dropped because the central matcher fell behind')
+        REGISTRY.gauge('edge_nodes_connected', 'Edge nodes with an open connection',
+                       func=lambda: sum(1 for stats in list(self.nodes.values()) if stats['connected']))
+        REGISTRY.gauge('edge_match_queue', 'Batches waiting for the central matcher', func=self.batches.qsize)
+    
+    @classmethod
+    def from_config(cls, config: dict) -> 'EdgeReceiver':
+        """Receiver using the `edge` section of camera_config.json."""
+        options = config.get('edge', {})
+        return cls(options.get('host', '127.0.0.1'), options.get('port', DEFAULT_EDGE_PORT),
+                   options.get('receive_queue_size', 256))
+    
+    def start(self):
+        self.server = _EdgeServer((self.host, self.port), _EdgeHandler)
+        self.server.receiver = self
+        self.port = self.server.server_address[1]  # Resolve port 0
+        threading.Thread(target=self.server.serve_forever, name='edge-receiver', daemon=True).start()
+        return self
+    
+    def _received(self, node: str, address: str, meta: dict, encodings: np.ndarray, size: int):
+        with self._lock:
+            stats = self.nodes.get(node)
+            if stats is None:
+                stats = self.nodes[node] = {'address': address, 'connected': True, 'batches': 0,
+                                            'embeddings': 0, 'bytes': 0, 'last_batch': None}
+                REGISTRY.counter('edge_embeddings_received_total', 'Embeddings received from edge nodes',
+                                 func=lambda stats=stats: stats['embeddings'], node=node)
+                REGISTRY.counter('edge_bytes_received_total', 'Bytes received from edge nodes',
+                                 func=lambda stats=stats: stats['bytes'], node=node)
+            stats.update(address=address, connected=True, last_batch=time.time())
+            stats['batches'] += 1
+            stats['embeddings'] += len(meta['items'])
+            stats['bytes'] += size
+        while True:
+            try:
+                self.batches.put_nowait((meta, encodings))
+                return
+            except Full:
+                try:
+                    self.batches.get_nowait()
+                    self.batches_dropped.inc()
+                except Empty:
+                    pass
+    
+    def _disconnected(self, node: str):
+        with self._lock:
+            if node in self.nodes:
+                self.nodes[node]['connected'] = False
+    
+    def drain(self, limit: int = 64) -> List[Tuple[dict, np.ndarray]]:
+        """Take up to limit queued batches without blocking."""
+        batches = []
+        while len(batches) < limit:
+            try:
+                batches.append(self.batches.get_nowait())
+            except Empty:
+                break
+        return batches
+    
+    def stop(self):
+        self.stopped = True
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
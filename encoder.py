@@ -0,0 +1,245 @@
+import cv2
+import os
+import threading
+import time
+import numpy as np
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from gallery import ENCODING_SIZE
+from metrics import COUNT_BUCKETS, REGISTRY
+from startup import lazy_import
+
+# face_recognition.api holds the loaded dlib models; both load on first use
+face_recognition_api = lazy_import('face_recognition.api')
+dlib = lazy_import('dlib')
+
+# 'large' aligns faces with the 68-point landmark model, 'small' with the faster 5-point one
+LANDMARK_MODELS = ('large', 'small')
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_MAX_LATENCY = 0.25
+# dlib's ResNet takes 150x150 chips cropped with 25% padding (as face_recognition.face_encodings does)
+CHIP_SIZE = 150
+CHIP_PADDING = 0.25
+EMBEDDERS = ('dlib', 'onnx')
+# Where ArcFace-style models expect the eyes, nose tip and mouth corners in a 112x112 input
+ARCFACE_TEMPLATE = np.array([[38.2946, 51.6963], [73.5318, 51.5014], [56.0252, 71.7366],
+                             [41.5493, 92.3655], [70.7299, 92.2041]], dtype=np.float32)
+ARCFACE_SIZE = 112
+
+Location = Tuple[int, int, int, int]
+
+def face_chips(rgb_frame: np.ndarray, locations: Sequence[Location], landmarks: str = 'large') -> List[np.ndarray]:
+    """Aligned CHIP_SIZE crops of each face in an RGB frame, ready for the encoder."""
+    if not len(locations):
+        return []
+    if landmarks == 'small':
+        predictor = face_recognition_api.pose_predictor_5_point
+    else:
+        predictor = face_recognition_api.pose_predictor_68_point
+    shapes = dlib.full_object_detections()
+    for top, right, bottom, left in locations:
+        shapes.append(predictor(rgb_frame, dlib.rectangle(int(left), int(top), int(right), int(bottom))))
+    return list(dlib.get_face_chips(rgb_frame, shapes, size=CHIP_SIZE, padding=CHIP_PADDING))
+
+def encode_chips(chips: Sequence[np.ndarray], num_jitters: int = 1) -> np.ndarray:
+    """128-d encodings of aligned chips in one forward pass of dlib's network, shape (n, 128)."""
+    if not len(chips):
+        return np.empty((0, ENCODING_SIZE))
+    return np.array(face_recognition_api.face_encoder.compute_face_descriptor(list(chips), num_jitters))
+
+class FaceEmbedder:
+    """An embedding backend: align() cuts a frame's faces into model inputs, embed() runs a batch of them.
+    
+    size is the length of the embeddings. Embeddings from different
+    backends (or models) cannot be compared, so a gallery only works with
+    the backend that built it (see gallery.check_embedding).
+    """
+    name = 'base'
+    size = ENCODING_SIZE
+    
+    def align(self, rgb_frame: np.ndarray, locations: Sequence[Location]) -> List[np.ndarray]:
+        raise NotImplementedError
+    
+    def embed(self, chips: Sequence[np.ndarray]) -> np.ndarray:
+        raise NotImplementedError
+    
+    def __repr__(self) -> str:
+        return f"<{self.name} face embedder>"
+
+class DlibEmbedder(FaceEmbedder):
+    """dlib's ResNet through face_recognition's models: 128-d, distances around 0.6 between people."""
+    name = 'dlib'
+    
+    def __init__(self, landmarks: str = 'large'):
+        if landmarks not in LANDMARK_MODELS:
+            raise ValueError(f"landmarks must be one of {LANDMARK_MODELS}")
+        self.landmarks = landmarks
+    
+    def align(self, rgb_frame: np.ndarray, locations: Sequence[Location]) -> List[np.ndarray]:
+        return face_chips(rgb_frame, locations, self.landmarks)
+    
+    def embed(self, chips: Sequence[np.ndarray]) -> np.ndarray:
+        return encode_chips(chips)
+
+class OnnxEmbedder(FaceEmbedder):
+    """An ArcFace-style ONNX model (112x112 RGB in, one embedding out) run by ONNX Runtime on the CPU.
+    
+    Faces are aligned on the eyes, nose tip and mouth corners from dlib's
+    68-point landmarks. threads sets ONNX Runtime's intra-op threads (0
+    lets it decide) and chips are run batch_size at a time, or one by one
+    if the model's batch dimension is fixed. Embeddings are L2-normalised,
+    so distances run from 0 to 2 and the recognition_threshold that suits
+    dlib (0.6) is far too strict.
+    """
+    name = 'onnx'
+    
+    def __init__(self, model: str, threads: int = 0, batch_size: int = 32,
+                 mean: float = 127.5, std: float = 127.5):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("processing.encoder.backend 'onnx' needs onnxruntime (pip install onnxruntime)")
+        if not os.path.exists(model):
+            raise FileNotFoundError(f"ONNX embedding model not found: {model}")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(model, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_size = model_input.shape[2] if isinstance(model_input.shape[2], int) else ARCFACE_SIZE
+        # A fixed (integer) batch dimension means the model takes one face per run
+        self.batch_size = 1 if isinstance(model_input.shape[0], int) else max(1, batch_size)
+        self.size = self.session.get_outputs()[0].shape[-1]
+        self.model = model
+        self.mean = mean
+        self.std = std
+        self._template = ARCFACE_TEMPLATE * (self.input_size / ARCFACE_SIZE)
+    
+    def align(self, rgb_frame: np.ndarray, locations: Sequence[Location]) -> List[np.ndarray]:
+        chips = []
+        for top, right, bottom, left in locations:
+            shape = face_recognition_api.pose_predictor_68_point(
+                rgb_frame, dlib.rectangle(int(left), int(top), int(right), int(bottom)))
+            points = np.array([(point.x, point.y) for point in shape.parts()], dtype=np.float32)
+            five = np.array([points[36:42].mean(axis=0), points[42:48].mean(axis=0),
+                             points[30], points[48], points[54]], dtype=np.float32)
+            matrix, _ = cv2.estimateAffinePartial2D(five, self._template)
+            if matrix is None:
+                # Degenerate landmarks: fall back to the plain box so every face keeps a chip
+                crop = rgb_frame[max(int(top), 0):int(bottom), max(int(left), 0):int(right)]
+                chips.append(cv2.resize(crop, (self.input_size, self.input_size)) if crop.size
+                             else np.zeros((self.input_size, self.input_size, 3), dtype=np.uint8))
+                continue
+            chips.append(cv2.warpAffine(rgb_frame, matrix, (self.input_size, self.input_size)))
+        return chips
+    
+    def embed(self, chips: Sequence[np.ndarray]) -> np.ndarray:
+        if not len(chips):
+            return np.empty((0, self.size), dtype=np.float32)
+        batch = (np.asarray(chips, dtype=np.float32) - self.mean) / self.std
+        batch = batch.transpose(0, 3, 1, 2)  # NHWC -> NCHW
+        outputs = [self.session.run(None, {self.input_name: batch[start:start + self.batch_size]})[0]
+                   for start in range(0, len(batch), self.batch_size)]
+        embeddings = np.vstack(outputs).astype(np.float32)
+        return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+def make_embedder(config: dict) -> FaceEmbedder:
+    """The embedder processing.encoder selects: backend 'dlib' (default) or 'onnx' with model and threads.
+    
+    Unlike detectors there is no fallback: a gallery built by one backend
+    cannot be matched by another.
+    """
+    options = config.get('processing', {}).get('encoder', {})
+    backend = options.get('backend', 'dlib')
+    if backend == 'onnx':
+        return OnnxEmbedder(options['model'], options.get('threads', 0), options.get('batch_size', 32))
+    if backend != 'dlib':
+        raise ValueError(f"processing.encoder.backend must be one of {EMBEDDERS}, not {backend!r}")
+    return DlibEmbedder(options.get('landmarks', 'large'))
+
+def encode_faces(rgb_frame: np.ndarray, locations: Sequence[Location],
+                 embedder: Optional[FaceEmbedder] = None) -> np.ndarray:
+    """Drop-in for face_recognition.face_encodings that embeds every face in the frame as one batch."""
+    embedder = embedder if embedder is not None else DlibEmbedder()
+    return embedder.embed(embedder.align(rgb_frame, locations))
+
+class BatchEncoder:
+    """Encoder stage that embeds faces from many frames and cameras in one dlib call.
+    
+    submit() aligns a frame's faces straight away, so the frame itself is
+    not kept, and queues the chips with a callback. The owner calls
+    flush() as soon as submit() reports batch_size chips waiting, and at
+    least every max_latency seconds; each callback then receives its own
+    frame's encodings. With batch_size 1 every frame is encoded as soon
+    as it is submitted.
+    """
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, max_latency: float = DEFAULT_MAX_LATENCY,
+                 embedder: Optional[FaceEmbedder] = None):
+        self.batch_size = max(1, batch_size)
+        self.max_latency = max_latency
+        self.embedder = embedder if embedder is not None else DlibEmbedder()
+        self._lock = threading.Lock()
+        self._chips: List[np.ndarray] = []
+        self._pending: List[Tuple[int, Callable[[np.ndarray], None]]] = []
+        self.embedded = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self.last_seconds = 0.0
+        self.batch_sizes = REGISTRY.histogram('encode_batch_faces', 'Faces embedded per encoder batch',
+                                              COUNT_BUCKETS + (34, 55))
+        REGISTRY.counter('face_encodings_total', 'Faces embedded by the batch encoder', func=lambda: self.embedded)
+    
+    @classmethod
+    def from_config(cls, config: dict) -> 'BatchEncoder':
+        options = config.get('processing', {}).get('encoder', {})
+        return cls(options.get('batch_size', DEFAULT_BATCH_SIZE), options.get('max_latency', DEFAULT_MAX_LATENCY),
+                   make_embedder(config))
+    
+    def __len__(self) -> int:
+        return len(self._chips)
+    
+    def submit(self, rgb_frame: np.ndarray, locations: Sequence[Location],
+               callback: Callable[[np.ndarray], None]) -> bool:
+        """Queue a frame's faces for callback(encodings); True once a full batch is waiting to be flushed."""
+        chips = self.embedder.align(rgb_frame, locations)
+        with self._lock:
+            self._chips.extend(chips)
+            self._pending.append((len(chips), callback))
+            return len(self._chips) >= self.batch_size
+    
+    def flush(self) -> int:
+        """Embed everything queued and run the callbacks; returns the faces embedded."""
+        with self._lock:
+            chips, pending = self._chips, self._pending
+            self._chips, self._pending = [], []
+        if not pending:
+            return 0
+        started = time.perf_counter()
+        encodings = self.embedder.embed(chips)
+        self.last_seconds = time.perf_counter() - started
+        self.seconds += self.last_seconds
+        self.embedded += len(chips)
+        self.batches += 1
+        self.batch_sizes.observe(len(chips))
+        offset = 0
+        for count, callback in pending:
+            try:
+                callback(encodings[offset:offset + count])
+            except Exception as e:
+                print(f"Error handling encoded faces: {e}")
+            offset += count
+        return len(chips)
+    
+    @property
+    def embeddings_per_second(self) -> float:
+        """Faces embedded per second of encoder time (alignment excluded)."""
+        return self.embedded / self.seconds if self.seconds else 0.0
+    
+    def report(self) -> dict:
+        return {
+            'embedded': self.embedded,
+            'batches': self.batches,
+            'mean_batch': self.embedded / self.batches if self.batches else 0.0,
+            'embeddings_per_second': self.embeddings_per_second
+        }
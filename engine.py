@@ -0,0 +1,273 @@
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+from queue import Empty, Full
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_FRAME_SHAPE = (480, 640, 3)
+# Results the GUI has not collected yet; older detections are dropped first
+RESULT_QUEUE_SIZE = 32
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 30.0
+# An engine that stays up this long resets the restart backoff
+HEALTHY_UPTIME = 60.0
+
+class FrameChannel:
+    """Single-slot frame buffer in shared memory.
+    
+    The writer copies each new frame into the shared block and bumps a
+    sequence number; the reader copies it out only when the sequence has
+    changed. Frames never travel through a pipe, so handing a 640x480
+    frame to the engine costs one memcpy on each side.
+    """
+    def __init__(self, shape: Tuple[int, int, int] = DEFAULT_FRAME_SHAPE, name: Optional[str] = None,
+                 sequence=None, lock=None):
+        self.shape = tuple(shape)
+        size = int(np.prod(self.shape))
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.buffer = np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.sequence = sequence if sequence is not None else mp.Value('Q', 0, lock=False)
+        self.lock = lock if lock is not None else mp.Lock()
+    
+    @property
+    def name(self) -> str:
+        return self.shm.name
+    
+    def write(self, frame: np.ndarray):
+        if frame.shape != self.shape:
+            import cv2
+            frame = cv2.resize(frame, (self.shape[1], self.shape[0]))
+        with self.lock:
+            self.buffer[...] = frame
+            self.sequence.value += 1
+    
+    def read(self, last_sequence: int) -> Tuple[int, Optional[np.ndarray]]:
+        """Return (sequence, frame copy), or (last_sequence, None) if nothing new was written."""
+        if self.sequence.value == last_sequence:
+            return last_sequence, None
+        with self.lock:
+            return self.sequence.value, self.buffer.copy()
+    
+    def close(self):
+        self.buffer = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def _engine_main(shm_name, shape, sequence, lock, commands, results, config_path, faces_dir):
+    """Child process: recognise faces in shared-memory frames and report detection events."""
+    import json
+    import cv2
+    from datetime import datetime
+    from detection import DetectionRegion, camera_detector, detect_faces, detection_scale, warm_up
+    from encoder import encode_faces, make_embedder
+    from gallery import FaceGallery, MatchCache
+    from voting import IdentityVoter
+    
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    processing = config.get('processing', {})
+    cam_config = config.get('check_in_camera', {})
+    interval = processing.get('face_detection_interval', 0.5)
+    upsample = processing.get('upsample', 1)
+    embedder = make_embedder(config)
+    tolerance = processing.get('recognition_threshold', 0.6)
+    voter = IdentityVoter.from_config(config)
+    region = DetectionRegion(cam_config.get('roi'))
+    detector = camera_detector(cam_config, processing)
+    scale = detection_scale(cam_config.get('min_face_size', processing.get('min_face_size', [80, 80])), upsample,
+                            detector=detector)
+    gallery = FaceGallery.from_config(config, faces_dir, component='engine')
+    cache = MatchCache.from_config(gallery, config, component='engine')
+    roster = None
+    channel = FrameChannel(shape, shm_name, sequence, lock)
+    last_sequence = sequence.value
+    next_detection = 0.0
+    next_save = time.monotonic() + config.get('logging', {}).get('update_interval', 30)
+    try:
+        while True:
+            try:
+                command = commands.get_nowait()
+            except Empty:
+                command = None
+            if command is not None:
+                if command[0] == 'stop':
+                    break
+                if command[0] == 'reload':
+                    gallery.save_dirty(faces_dir)
+                    gallery = FaceGallery.from_config(config, faces_dir, component='engine')
+                    gallery.set_roster(roster)
+                    cache = MatchCache.from_config(gallery, config, component='engine')
+                elif command[0] == 'roster':
+                    roster = command[1]
+                    gallery.set_roster(roster)
+                elif command[0] == 'warm':
+                    print(f"Recognition engine warm: {gallery.warm()} students indexed, "
+                          f"models ready in {warm_up(tuple(shape), upsample, detector, embedder):.2f}s")
+                elif command[0] == 'save_attendance':
+                    _, path, df = command
+                    try:
+                        df.to_excel(path, index=False)
+                    except Exception as e:
+                        print(f"Error saving attendance data: {e}")
+                continue
+            
+            now = time.monotonic()
+            if now >= next_save:
+                gallery.save_dirty(faces_dir)
+                next_save = now + config.get('logging', {}).get('update_interval', 30)
+            if now < next_detection:
+                time.sleep(min(0.01, next_detection - now))
+                continue
+            last_sequence, frame = channel.read(last_sequence)
+            if frame is None:
+                time.sleep(0.01)
+                continue
+            next_detection = now + interval
+            
+            started = time.perf_counter()
+            locations, pixels = detect_faces(frame, region, scale, detector=detector)
+            encodings = encode_faces(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), locations, embedder) if locations else []
+            matches = [cache.match(encoding, tolerance=tolerance) for encoding in encodings]
+            identities, tracks, confirmed, released = voter.update(
+                'engine', locations, [student_id for student_id, _ in matches], time.time())
+            faces = []
+            for location, encoding, (student_id, distance), identity, track in zip(
+                    locations, encodings, matches, identities, tracks):
+                if student_id is not None and student_id == identity:
+                    gallery.add_sighting(student_id, encoding, distance)
+                faces.append({'student_id': identity, 'name': None, 'distance': float(distance),
+                              'location': list(location), 'track': track})
+            event = {
+                'type': 'detection',
+                'camera': 'engine',
+                'timestamp': datetime.now().isoformat(timespec='milliseconds'),
+                'sequence': last_sequence,
+                'pixels': pixels,
+                'seconds': time.perf_counter() - started,
+                'faces': faces,
+                'confirmed': confirmed,
+                'released': released
+            }
+            try:
+                results.put_nowait(event)
+            except Full:
+                try:
+                    # Drop the stalest result rather than block recognition, but keep its identity changes
+                    stale = results.get_nowait()
+                    event['confirmed'] = stale['confirmed'] + event['confirmed']
+                    event['released'] = stale['released'] + event['released']
+                except Empty:
+                    pass
+                results.put_nowait(event)
+    finally:
+        gallery.save_dirty(faces_dir)
+        channel.buffer = None
+        channel.shm.close()
+
+class RecognitionEngine:
+    """Parent-side handle for the recognition child process, with crash supervision.
+    
+    Frames go in through a FrameChannel, detection events come back on a
+    bounded queue and commands (reload, roster, warm, save_attendance, stop) go out on
+    another. A supervisor thread restarts the child if it dies, backing
+    off exponentially while it keeps crashing.
+    """
+    def __init__(self, config_path: str = 'camera_config.json', faces_dir: str = 'faces',
+                 shape: Tuple[int, int, int] = DEFAULT_FRAME_SHAPE):
+        self.config_path = config_path
+        self.faces_dir = faces_dir
+        # spawn, not fork: the parent runs Tk and several threads
+        self._context = mp.get_context('spawn')
+        self.channel = FrameChannel(shape, sequence=self._context.Value('Q', 0, lock=False),
+                                    lock=self._context.Lock())
+        self.commands = self._context.Queue()
+        self.results = self._context.Queue(maxsize=RESULT_QUEUE_SIZE)
+        self.process: Optional[mp.Process] = None
+        self.restarts = 0
+        self.roster: Optional[List[str]] = None
+        self._started_at = 0.0
+        self._restart_delay = RESTART_DELAY
+        self._stopping = threading.Event()
+        self._supervisor: Optional[threading.Thread] = None
+    
+    def _spawn(self):
+        self.process = self._context.Process(
+            target=_engine_main, name='recognition-engine', daemon=True,
+            args=(self.channel.name, self.channel.shape, self.channel.sequence, self.channel.lock,
+                  self.commands, self.results, self.config_path, self.faces_dir))
+        self.process.start()
+        self._started_at = time.monotonic()
+        if self.roster is not None:
+            self.commands.put(('roster', self.roster))  # A restarted child starts without one
+    
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._spawn()
+        self._supervisor = threading.Thread(target=self._supervise, name='engine-supervisor', daemon=True)
+        self._supervisor.start()
+    
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+    
+    def _supervise(self):
+        while not self._stopping.wait(0.5):
+            if self.process.is_alive():
+                if time.monotonic() - self._started_at > HEALTHY_UPTIME:
+                    self._restart_delay = RESTART_DELAY
+                continue
+            print(f"Recognition engine exited with code {self.process.exitcode}; "
+                  f"restarting in {self._restart_delay:.1f}s")
+            if self._stopping.wait(self._restart_delay):
+                break
+            self._restart_delay = min(self._restart_delay * 2, MAX_RESTART_DELAY)
+            self.restarts += 1
+            self._spawn()
+    
+    def submit_frame(self, frame: np.ndarray):
+        self.channel.write(frame)
+    
+    def poll(self) -> List[dict]:
+        """Collect every detection event that has arrived, without blocking."""
+        events = []
+        while True:
+            try:
+                events.append(self.results.get_nowait())
+            except Empty:
+                return events
+    
+    def reload(self):
+        """Reload the gallery from disk (e.g. after a registration)."""
+        self.commands.put(('reload',))
+    
+    def set_roster(self, student_ids: Optional[List[str]]):
+        """Match these students before the full gallery (None clears the roster)."""
+        student_ids = None if student_ids is None else list(student_ids)
+        if student_ids == self.roster:
+            return
+        self.roster = student_ids
+        self.commands.put(('roster', student_ids))
+    
+    def warm(self):
+        """Have the child index the gallery and run the models once before frames arrive."""
+        self.commands.put(('warm',))
+    
+    def save_attendance(self, df, path: str = 'attendance.xlsx'):
+        """Write the attendance log from the engine process, off the UI interpreter."""
+        self.commands.put(('save_attendance', path, df))
+    
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self.process is not None and self.process.is_alive():
+            self.commands.put(('stop',))
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.channel.close()
@@ -0,0 +1,119 @@
+import os
+import re
+import pandas as pd
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+EVENT_COLUMNS = ['name', 'date', 'start', 'end', 'roster', 'cameras']
+EVENTS_FILE = 'events.csv'
+# Seconds before an event that monitoring starts (cameras opened, models and roster warmed)
+DEFAULT_LEAD_TIME = 120.0
+# Seconds after an event that monitoring keeps running for stragglers
+DEFAULT_WIND_DOWN = 60.0
+
+def parse_roster(text) -> List[str]:
+    """Student IDs from a roster cell or entry field (separated by ';', ',' or whitespace)."""
+    if text is None or (isinstance(text, float) and pd.isna(text)):
+        return []
+    seen = []
+    for student_id in re.split(r'[;,\s]+', str(text)):
+        if student_id and student_id not in seen:
+            seen.append(student_id)
+    return seen
+
+def format_roster(student_ids: Iterable[str]) -> str:
+    """Roster as stored in events.csv."""
+    return ';'.join(str(student_id) for student_id in student_ids)
+
+def load_events(path: str = EVENTS_FILE) -> pd.DataFrame:
+    """Read events.csv, adding the roster and cameras columns to files written before they existed."""
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+    df = pd.read_csv(path, dtype={'roster': str, 'cameras': str})
+    for column in ('roster', 'cameras'):
+        if column not in df.columns:
+            df[column] = ''
+        df[column] = df[column].fillna('')
+    return df
+
+def event_window(event) -> (datetime, datetime):
+    """Start and end datetimes of an events.csv row."""
+    start = datetime.strptime(f"{event['date']} {event['start']}", '%Y-%m-%d %H:%M')
+    end = datetime.strptime(f"{event['date']} {event['end']}", '%Y-%m-%d %H:%M')
+    return start, end
+
+def active_events(df: pd.DataFrame, now: Optional[datetime] = None, lead: float = 0.0) -> List[dict]:
+    """Every event running at now or starting within lead seconds, earliest start first."""
+    now = datetime.now() if now is None else now
+    running = []
+    for _, row in df.iterrows():
+        try:
+            start, end = event_window(row)
+        except (TypeError, ValueError):
+            continue  # Malformed date or time in a hand-edited file
+        if start - timedelta(seconds=lead) <= now <= end:
+            running.append(dict(row, window=(start, end)))
+    running.sort(key=lambda event: event['window'][0])
+    return running
+
+def active_event(df: pd.DataFrame, now: Optional[datetime] = None, lead: float = 0.0) -> Optional[dict]:
+    """The event running at now, or starting within lead seconds (the latest start wins), or None."""
+    running = active_events(df, now, lead)
+    return running[-1] if running else None
+
+def active_roster(path: str = EVENTS_FILE, now: Optional[datetime] = None,
+                  lead: float = 0.0) -> Optional[List[str]]:
+    """Roster of the event running now (or within lead seconds); None if there is none or it has no roster."""
+    try:
+        event = active_event(load_events(path), now, lead)
+    except Exception as e:
+        print(f"Error reading events: {e}")
+        return None
+    if event is None:
+        return None
+    return parse_roster(event['roster']) or None
+
+class EventCalendar:
+    """Sorted index of when monitoring should be up for the scheduled events.
+    
+    Each event is padded by lead seconds before and wind_down seconds
+    after, overlapping or back-to-back windows are merged into spans, and
+    plan() finds the span covering a moment with a binary search.
+    """
+    def __init__(self, df: pd.DataFrame, lead: float = DEFAULT_LEAD_TIME, wind_down: float = DEFAULT_WIND_DOWN):
+        self.lead = timedelta(seconds=lead)
+        self.wind_down = timedelta(seconds=wind_down)
+        windows = []
+        for _, row in df.iterrows():
+            try:
+                start, end = event_window(row)
+            except (TypeError, ValueError):
+                continue
+            windows.append((start - self.lead, end + self.wind_down, dict(row)))
+        windows.sort(key=lambda window: window[0])
+        self.spans: List[Tuple[datetime, datetime, List[dict]]] = []
+        for up, down, event in windows:
+            if self.spans and up <= self.spans[-1][1]:
+                last_up, last_down, events = self.spans[-1]
+                self.spans[-1] = (last_up, max(last_down, down), events + [event])
+            else:
+                self.spans.append((up, down, [event]))
+        self._ups = [span[0] for span in self.spans]
+    
+    @classmethod
+    def load(cls, path: str = EVENTS_FILE, **kwargs) -> 'EventCalendar':
+        return cls(load_events(path), **kwargs)
+    
+    def __len__(self) -> int:
+        return len(self.spans)
+    
+    def plan(self, now: Optional[datetime] = None) -> Tuple[Optional[List[dict]], Optional[datetime]]:
+        """(events of the span covering now or None, when that next changes or None if never)."""
+        now = datetime.now() if now is None else now
+        index = bisect_right(self._ups, now) - 1
+        if index >= 0 and now < self.spans[index][1]:
+            return self.spans[index][2], self.spans[index][1]
+        following = index + 1
+        return None, self.spans[following][0] if following < len(self.spans) else None
+
@@ -0,0 +1,584 @@
+import json
+import numpy as np
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from metrics import REGISTRY
+
+ENCODING_SIZE = 128
+DEFAULT_MAX_TEMPLATES = 5
+# Sightings closer than this to a student count as high-confidence
+DEFAULT_REFRESH_THRESHOLD = 0.4
+# A sighting must differ this much from every stored template to be worth keeping
+DEFAULT_MIN_NOVELTY = 0.1
+DEFAULT_REFRESH_COOLDOWN = 60.0
+# Match index precision: float64 is exact; float16/int8 scan a compact copy, then re-rank exactly
+PRECISIONS = ('float64', 'float16', 'int8')
+# Templates re-ranked exactly after a quantized scan
+DEFAULT_SHORTLIST = 8
+DEFAULT_CACHE_CAPACITY = 128
+DEFAULT_CACHE_TTL = 300.0
+# A cached student is accepted only this far under the tolerance, and this far ahead of the runner-up
+DEFAULT_CACHE_MARGIN = 0.15
+# Quantized rows are widened to float32 this many at a time, so the temporary stays in cache
+SCAN_CHUNK = 4096
+# Records which embedding model built a faces directory; directories without it hold dlib encodings
+EMBEDDING_FILE = 'embedding.json'
+
+def load_encodings(path: str) -> np.ndarray:
+    """Load a gallery entry as an (n_templates, 128) array.
+    
+    Older single-vector `.npy` files load as a single template.
+    """
+    return np.atleast_2d(np.load(path))
+
+def save_encodings(path: str, encodings) -> None:
+    """Save one or more templates; a single template keeps the legacy 1-D layout."""
+    encodings = np.atleast_2d(np.asarray(encodings, dtype=np.float64))
+    np.save(path, encodings[0] if len(encodings) == 1 else encodings)
+
+def configured_embedding(config: dict) -> dict:
+    """The embedding processing.encoder produces: {"backend": ..., "model": <model file name or None>}."""
+    options = config.get('processing', {}).get('encoder', {})
+    backend = options.get('backend', 'dlib')
+    model = options.get('model') if backend != 'dlib' else None
+    return {'backend': backend, 'model': os.path.basename(model) if model else None}
+
+def describe_embedding(embedding: dict) -> str:
+    return f"{embedding['backend']} ({embedding['model']})" if embedding.get('model') else embedding['backend']
+
+def read_embedding(faces_dir: str) -> Optional[dict]:
+    """The embedding faces_dir was built with, or None for a directory with no encodings and no record."""
+    path = os.path.join(faces_dir, EMBEDDING_FILE)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            info = json.load(f)
+        return {'backend': info.get('backend', 'dlib'), 'model': info.get('model')}
+    if os.path.isdir(faces_dir) and any(name.endswith('.npy') for name in os.listdir(faces_dir)):
+        return {'backend': 'dlib', 'model': None}
+    return None
+
+def write_embedding(faces_dir: str, embedding: dict):
+    with open(os.path.join(faces_dir, EMBEDDING_FILE), 'w') as f:
+        json.dump(embedding, f, indent=4)
+
+def check_embedding(config: dict, faces_dir: str = 'faces') -> bool:
+    """True if faces_dir was built by the embedder processing.encoder configures.
+    
+    An empty directory is claimed for the configured embedder, so the
+    students registered into it later are recorded against it.
+    """
+    expected = configured_embedding(config)
+    try:
+        stored = read_embedding(faces_dir)
+        if stored is None:
+            if os.path.isdir(faces_dir):
+                write_embedding(faces_dir, expected)
+            return True
+    except (OSError, ValueError) as e:
+        print(f"Error reading {EMBEDDING_FILE} in {faces_dir}: {e}")
+        return False
+    if stored != expected:
+        print(f"Face gallery {faces_dir} holds {describe_embedding(stored)} embeddings but processing.encoder "
+              f"produces {describe_embedding(expected)}; run migrate_gallery.py to re-encode it")
+        return False
+    return True
+
+class FaceGallery:
+    """Multi-template face gallery with a centroid first pass.
+    
+    Each student keeps up to max_templates templates. Matching first
+    measures the distance to every student's centroid; by the triangle
+    inequality no template can be closer than centroid distance minus
+    spread (the largest template-to-centroid distance), so only students
+    whose lower bound can still win under the tolerance are refined
+    against their individual templates.
+    
+    With precision float16 or int8 (per-dimension scale) matching instead
+    scans a quantized copy of every template, shortlists the closest
+    `shortlist` templates and re-ranks those exactly in float32. The
+    `.npy` files and `templates` stay full precision.
+    
+    set_roster() restricts the first pass to the students expected at the
+    current event: they are matched in a small sub-gallery and the full
+    gallery is searched only when none of them is within tolerance. A
+    gallery given a component (gui, engine) reports its roster hits under
+    that label; galleries without one, such as roster sub-galleries,
+    report nothing.
+    """
+    def __init__(self, max_templates: int = DEFAULT_MAX_TEMPLATES,
+                 refresh_threshold: float = DEFAULT_REFRESH_THRESHOLD,
+                 min_novelty: float = DEFAULT_MIN_NOVELTY,
+                 refresh_cooldown: float = DEFAULT_REFRESH_COOLDOWN,
+                 precision: str = 'float64', shortlist: int = DEFAULT_SHORTLIST,
+                 component: Optional[str] = None):
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {PRECISIONS}, not {precision!r}")
+        self.max_templates = max_templates
+        self.refresh_threshold = refresh_threshold
+        self.min_novelty = min_novelty
+        self.refresh_cooldown = refresh_cooldown
+        self.precision = precision
+        self.shortlist = shortlist
+        self.templates: Dict[str, np.ndarray] = {}
+        self.student_ids: List[str] = []
+        self.dirty_students: Set[str] = set()
+        self._last_refresh: Dict[str, float] = {}
+        self._matrix = np.empty((0, ENCODING_SIZE))
+        self._starts = np.empty(0, dtype=np.intp)
+        self._counts = np.empty(0, dtype=np.intp)
+        self._centroids = np.empty((0, ENCODING_SIZE))
+        self._spreads = np.empty(0)
+        self._exact = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        self._coarse = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        self._coarse_norms = np.empty(0, dtype=np.float32)
+        self._scale: Optional[np.ndarray] = None
+        self._owners = np.empty(0, dtype=np.intp)
+        self._dirty = False
+        # Bumped on every template change so caches over this gallery know to refresh
+        self.version = 0
+        self.roster: Optional[List[str]] = None
+        self.roster_hits = 0
+        self.roster_misses = 0
+        self._roster_gallery: Optional['FaceGallery'] = None
+        self._roster_version = -1
+        if component is not None:
+            REGISTRY.counter('gallery_roster_hits_total', 'Matches answered by the event roster',
+                             func=lambda: self.roster_hits, component=component)
+            REGISTRY.counter('gallery_roster_misses_total', 'Roster misses that searched the full gallery',
+                             func=lambda: self.roster_misses, component=component)
+            REGISTRY.gauge('gallery_roster_students', 'Enrolled students on the current event roster',
+                           func=lambda: len(self._roster_gallery) if self._roster_gallery is not None else 0,
+                           component=component)
+    
+    @classmethod
+    def load_dir(cls, faces_dir: str, student_ids: Optional[Iterable[str]] = None,
+                 **options) -> 'FaceGallery':
+        """Load every `{student_id}.npy` in faces_dir, optionally restricted to student_ids."""
+        gallery = cls(**options)
+        wanted = None if student_ids is None else {str(sid) for sid in student_ids}
+        for filename in sorted(os.listdir(faces_dir)):
+            if not filename.endswith('.npy'):
+                continue
+            student_id = filename[:-4]  # Remove .npy extension
+            if wanted is not None and student_id not in wanted:
+                continue
+            try:
+                gallery.add(student_id, load_encodings(os.path.join(faces_dir, filename)))
+            except Exception as e:
+                print(f"Error loading face encoding {filename}: {e}")
+        return gallery
+    
+    @classmethod
+    def from_config(cls, config: dict, faces_dir: str = 'faces', component: Optional[str] = None,
+                    **kwargs) -> 'FaceGallery':
+        """Load a gallery using the `processing.gallery` section of camera_config.json.
+        
+        A gallery built by a different embedder than processing.encoder
+        configures is not loaded (its distances would be meaningless).
+        """
+        options = config.get('processing', {}).get('gallery', {})
+        options = dict(max_templates=options.get('max_templates', DEFAULT_MAX_TEMPLATES),
+                       refresh_threshold=options.get('refresh_threshold', DEFAULT_REFRESH_THRESHOLD),
+                       min_novelty=options.get('min_novelty', DEFAULT_MIN_NOVELTY),
+                       refresh_cooldown=options.get('refresh_cooldown', DEFAULT_REFRESH_COOLDOWN),
+                       precision=options.get('precision', 'float64'),
+                       shortlist=options.get('shortlist', DEFAULT_SHORTLIST),
+                       component=component)
+        if not check_embedding(config, faces_dir):
+            return cls(**options)
+        return cls.load_dir(faces_dir, **options, **kwargs)
+    
+    def add(self, student_id: str, encodings):
+        """Add or replace all templates for a student."""
+        self.templates[str(student_id)] = np.atleast_2d(np.asarray(encodings, dtype=np.float64))
+        self._dirty = True
+        self.version += 1
+    
+    def remove(self, student_id: str):
+        if self.templates.pop(str(student_id), None) is not None:
+            self._dirty = True
+            self.version += 1
+    
+    def __len__(self) -> int:
+        return len(self.templates)
+    
+    def __contains__(self, student_id: str) -> bool:
+        return str(student_id) in self.templates
+    
+    @property
+    def template_count(self) -> int:
+        return sum(len(block) for block in self.templates.values())
+    
+    def set_roster(self, student_ids: Optional[Iterable[str]]):
+        """Match these students first (e.g. an event's expected roster); None searches everyone equally."""
+        roster = None if student_ids is None else [str(sid) for sid in student_ids]
+        if roster == self.roster:
+            return
+        self.roster = roster or None
+        self._roster_gallery = None
+        self._roster_version = -1
+    
+    @property
+    def roster_hit_rate(self) -> float:
+        total = self.roster_hits + self.roster_misses
+        return self.roster_hits / total if total else 0.0
+    
+    def subset(self, student_ids: Iterable[str]) -> 'FaceGallery':
+        """Gallery of just these enrolled students, sharing (not copying) their templates.
+        
+        The subset does not follow later template changes; compare version
+        with the one it was taken at and take a new one.
+        """
+        view = FaceGallery(self.max_templates, self.refresh_threshold, self.min_novelty,
+                           self.refresh_cooldown, self.precision, self.shortlist)
+        for student_id in student_ids:
+            if student_id in self.templates:
+                view.templates[student_id] = self.templates[student_id]
+        view._dirty = True
+        return view
+    
+    def _roster_view(self) -> Optional['FaceGallery']:
+        """Sub-gallery of the roster's enrolled students, rebuilt when the templates change."""
+        if self.roster is None:
+            return None
+        if self._roster_gallery is None or self._roster_version != self.version:
+            self._roster_gallery = self.subset(self.roster)
+            self._roster_version = self.version
+        return self._roster_gallery if len(self._roster_gallery) else None
+    
+    def warm(self) -> int:
+        """Build the match index (and the roster's) now rather than on the first match; returns students indexed."""
+        if self._dirty:
+            self._rebuild()
+        roster = self._roster_view()
+        if roster is not None and roster._dirty:
+            roster._rebuild()
+        return len(roster) if roster is not None else len(self)
+    
+    def _rebuild(self):
+        """Stack all templates into one matrix and recompute centroids and spreads."""
+        self.student_ids = list(self.templates)
+        if self.student_ids:
+            blocks = [self.templates[sid] for sid in self.student_ids]
+            self._matrix = np.vstack(blocks)
+            self._counts = np.array([len(block) for block in blocks], dtype=np.intp)
+            self._starts = np.concatenate(([0], np.cumsum(self._counts)[:-1])).astype(np.intp)
+            self._centroids = np.add.reduceat(self._matrix, self._starts, axis=0) / self._counts[:, np.newaxis]
+            owners = np.repeat(np.arange(len(blocks)), self._counts)
+            spread = np.linalg.norm(self._matrix - self._centroids[owners], axis=1)
+            self._spreads = np.maximum.reduceat(spread, self._starts)
+        else:
+            self._matrix = np.empty((0, ENCODING_SIZE))
+            self._starts = np.empty(0, dtype=np.intp)
+            self._counts = np.empty(0, dtype=np.intp)
+            self._centroids = np.empty((0, ENCODING_SIZE))
+            self._spreads = np.empty(0)
+        self._owners = np.repeat(np.arange(len(self.student_ids)), self._counts)
+        if self.precision != 'float64':
+            self._quantize()
+        self._dirty = False
+    
+    def _quantize(self):
+        """Build the compact scan matrix and the float32 copy used for exact re-ranking."""
+        self._exact = self._matrix.astype(np.float32)
+        if self.precision == 'float16':
+            self._coarse = self._exact.astype(np.float16)
+            self._scale = None
+            approx = self._coarse.astype(np.float32)
+        else:
+            # Symmetric per-dimension scale: each column's largest magnitude maps to 127
+            scale = np.abs(self._exact).max(axis=0) / 127.0 if len(self._exact) else np.ones(ENCODING_SIZE)
+            scale[scale == 0] = 1.0
+            self._scale = scale.astype(np.float32)
+            self._coarse = np.clip(np.round(self._exact / self._scale), -127, 127).astype(np.int8)
+            approx = self._coarse.astype(np.float32) * self._scale
+        self._coarse_norms = np.einsum('ij,ij->i', approx, approx)
+        # The float64 matrix and centroid pass are only used in exact mode
+        self._matrix = np.empty((0, ENCODING_SIZE))
+        self._centroids = np.empty((0, ENCODING_SIZE))
+    
+    def memory_footprint(self) -> Dict[str, int]:
+        """Bytes held by the match index: the scanned matrix and (quantized modes) the re-rank copy."""
+        if self._dirty:
+            self._rebuild()
+        if self.precision == 'float64':
+            return {'scan_bytes': self._matrix.nbytes + self._centroids.nbytes, 'rerank_bytes': 0}
+        scan = self._coarse.nbytes + self._coarse_norms.nbytes + (self._scale.nbytes if self._scale is not None else 0)
+        return {'scan_bytes': scan, 'rerank_bytes': self._exact.nbytes}
+    
+    def _approx_distances(self, queries: np.ndarray) -> np.ndarray:
+        """Squared distances from each query row to every template in quantized space."""
+        # |x - q|^2 = |x|^2 - 2 x.q + |q|^2; the int8 scale folds into the query
+        scaled = queries if self._scale is None else queries * self._scale
+        out = np.empty((len(queries), len(self._coarse)), dtype=np.float32)
+        for start in range(0, len(self._coarse), SCAN_CHUNK):
+            block = self._coarse[start:start + SCAN_CHUNK].astype(np.float32)
+            out[:, start:start + len(block)] = self._coarse_norms[start:start + len(block)] - 2.0 * (scaled @ block.T)
+        out += np.einsum('ij,ij->i', queries, queries)[:, np.newaxis]
+        return out
+    
+    def match_many(self, encodings, tolerance: float = 0.6) -> List[Tuple[Optional[str], float]]:
+        """match() for several encodings at once; quantized modes scan the gallery once per batch."""
+        encodings = np.atleast_2d(np.asarray(encodings))
+        if self.precision == 'float64':
+            return [self.match(encoding, tolerance) for encoding in encodings]
+        roster = self._roster_view()
+        if roster is None:
+            return self._scan(encodings, tolerance)
+        results = roster._scan(encodings, tolerance)
+        missed = [index for index, (student_id, _) in enumerate(results) if student_id is None]
+        self.roster_hits += len(results) - len(missed)
+        self.roster_misses += len(missed)
+        if missed:
+            for index, result in zip(missed, self._scan(encodings[missed], tolerance)):
+                results[index] = result
+        return results
+    
+    def _scan(self, encodings: np.ndarray, tolerance: float) -> List[Tuple[Optional[str], float]]:
+        """Quantized scan, shortlist and exact re-rank over every student in this gallery."""
+        if self._dirty:
+            self._rebuild()
+        if not self.student_ids:
+            return [(None, float('inf'))] * len(encodings)
+        queries = encodings.astype(np.float32)
+        approx = self._approx_distances(queries)
+        k = min(self.shortlist, approx.shape[1])
+        if k < approx.shape[1]:
+            shortlist = np.argpartition(approx, k - 1, axis=1)[:, :k]
+        else:
+            shortlist = np.broadcast_to(np.arange(k), (len(queries), k))
+        results = []
+        for query, rows in zip(queries, shortlist):
+            # Exact re-rank of the shortlisted templates
+            exact = np.linalg.norm(self._exact[rows] - query, axis=1)
+            best = int(np.argmin(exact))
+            distance = float(exact[best])
+            if distance > tolerance:
+                results.append((None, distance))
+            else:
+                results.append((self.student_ids[self._owners[rows[best]]], distance))
+        return results
+    
+    def distances(self, encoding: np.ndarray) -> np.ndarray:
+        """Exact distance from encoding to each student's closest template, ordered as student_ids."""
+        if self._dirty:
+            self._rebuild()
+        if not self.student_ids:
+            return np.empty(0)
+        matrix = self._matrix if self.precision == 'float64' else self._exact
+        template_distances = np.linalg.norm(matrix - encoding, axis=1)
+        return np.minimum.reduceat(template_distances, self._starts)
+    
+    def match(self, encoding: np.ndarray, tolerance: float = 0.6) -> Tuple[Optional[str], float]:
+        """Return (student_id, distance) of the best match, or (None, distance) if above tolerance."""
+        if self.precision != 'float64':
+            return self.match_many(encoding, tolerance)[0]
+        roster = self._roster_view()
+        if roster is not None:
+            student_id, distance = roster._match_exact(encoding, tolerance)
+            if student_id is not None:
+                self.roster_hits += 1
+                return student_id, distance
+            self.roster_misses += 1
+        return self._match_exact(encoding, tolerance)
+    
+    def _match_exact(self, encoding: np.ndarray, tolerance: float) -> Tuple[Optional[str], float]:
+        """Centroid pass and template refinement over every student in this gallery."""
+        if self._dirty:
+            self._rebuild()
+        if not self.student_ids:
+            return None, float('inf')
+        # First pass: one centroid per student
+        centroid_distances = np.linalg.norm(self._centroids - encoding, axis=1)
+        lower = centroid_distances - self._spreads
+        upper = centroid_distances + self._spreads
+        bound = min(float(upper.min()), tolerance)
+        candidates = np.flatnonzero(lower <= bound)
+        # Refinement: exact template distances for the surviving candidates only
+        best, distance = self._nearest(encoding, candidates)
+        if distance > tolerance:
+            # A miss reports the true nearest template, so also refine the students the first pass ruled out
+            others = np.flatnonzero(lower > bound)
+            other, other_distance = self._nearest(encoding, others)
+            if other_distance < distance:
+                best, distance = other, other_distance
+            return None, distance
+        return self.student_ids[best], distance
+    
+    def _nearest(self, encoding: np.ndarray, students: np.ndarray) -> Tuple[int, float]:
+        """(student index, distance) of the closest template among these students' templates."""
+        if len(students) == 0:
+            return -1, float('inf')
+        counts = self._counts[students]
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+        rows = np.arange(int(counts.sum())) + np.repeat(self._starts[students] - offsets, counts)
+        distances = np.minimum.reduceat(np.linalg.norm(self._matrix[rows] - encoding, axis=1), offsets)
+        best = int(np.argmin(distances))
+        return int(students[best]), float(distances[best])
+    
+    def add_sighting(self, student_id: str, encoding: np.ndarray, distance: float,
+                     now: Optional[float] = None) -> bool:
+        """Refresh a student's templates from a high-confidence sighting.
+        
+        The sighting is stored only if it is confident, novel and the
+        student is outside the refresh cooldown. When the cap is reached
+        the most redundant template is evicted; the enrollment template
+        (index 0) is always kept. Returns True if the templates changed.
+        """
+        student_id = str(student_id)
+        if distance > self.refresh_threshold or student_id not in self.templates:
+            return False
+        now = time.time() if now is None else now
+        if now - self._last_refresh.get(student_id, float('-inf')) < self.refresh_cooldown:
+            return False
+        templates = self.templates[student_id]
+        if np.linalg.norm(templates - encoding, axis=1).min() < self.min_novelty:
+            return False
+        templates = np.vstack([templates, encoding])
+        if len(templates) > self.max_templates:
+            templates = np.delete(templates, self._most_redundant(templates), axis=0)
+        self.templates[student_id] = templates
+        self._last_refresh[student_id] = now
+        self.dirty_students.add(student_id)
+        self._dirty = True
+        self.version += 1
+        return True
+    
+    @staticmethod
+    def _most_redundant(templates: np.ndarray) -> int:
+        """Index of the non-enrollment template closest to any other template."""
+        pairwise = np.linalg.norm(templates[:, np.newaxis, :] - templates[np.newaxis, :, :], axis=2)
+        np.fill_diagonal(pairwise, np.inf)
+        return 1 + int(np.argmin(pairwise[1:].min(axis=1)))
+    
+    def save_dirty(self, faces_dir: str = 'faces') -> int:
+        """Write refreshed students back to `{faces_dir}/{id}.npy`; returns the count written."""
+        written = 0
+        for student_id in list(self.dirty_students):
+            try:
+                save_encodings(os.path.join(faces_dir, f"{student_id}.npy"), self.templates[student_id])
+                written += 1
+            except KeyError:
+                pass
+            except Exception as e:
+                print(f"Error saving face encoding for {student_id}: {e}")
+                continue
+            self.dirty_students.discard(student_id)
+        return written
+
+class MatchCache:
+    """Hot set of recently matched students, checked before the full gallery.
+    
+    In a room the same few dozen students are recognised over and over,
+    so each encoding is first compared with the templates of the last
+    `capacity` students matched. A cached student is accepted only when
+    the distance is under tolerance - margin and beats every other cached
+    student by margin; anything else (miss or ambiguous) falls back to
+    gallery.match and the winner enters the cache. Entries not hit for
+    ttl seconds expire, and the least recently hit is evicted when full.
+    capacity 0 disables the cache. Its metrics carry a component label
+    (monitor, gui, engine) so caches alive at the same time keep their
+    own series.
+    """
+    def __init__(self, gallery: FaceGallery, capacity: int = DEFAULT_CACHE_CAPACITY,
+                 ttl: float = DEFAULT_CACHE_TTL, margin: float = DEFAULT_CACHE_MARGIN, component: str = 'default'):
+        self.gallery = gallery
+        self.capacity = capacity
+        self.ttl = ttl
+        self.margin = margin
+        self.entries: 'OrderedDict[str, float]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.ambiguous = 0
+        self._ids: List[str] = []
+        self._matrix = np.empty((0, ENCODING_SIZE))
+        self._starts = np.empty(0, dtype=np.intp)
+        self._version = -1
+        self._stale = False
+        self.latency = {
+            result: REGISTRY.histogram('match_cache_seconds', 'Match time by cache outcome', result=result,
+                                       component=component)
+            for result in ('hit', 'miss')
+        }
+        REGISTRY.counter('match_cache_hits_total', 'Matches answered from the recent-match cache',
+                         func=lambda: self.hits, component=component)
+        REGISTRY.counter('match_cache_misses_total', 'Matches that searched the full gallery',
+                         func=lambda: self.misses, component=component)
+        REGISTRY.gauge('match_cache_students', 'Students in the recent-match cache', func=lambda: len(self.entries),
+                       component=component)
+    
+    @classmethod
+    def from_config(cls, gallery: FaceGallery, config: dict, component: str = 'default') -> 'MatchCache':
+        """Cache using the `processing.match_cache` section of camera_config.json."""
+        options = config.get('processing', {}).get('match_cache', {})
+        capacity = options.get('capacity', DEFAULT_CACHE_CAPACITY) if options.get('enabled', True) else 0
+        return cls(gallery, capacity, options.get('ttl', DEFAULT_CACHE_TTL),
+                   options.get('margin', DEFAULT_CACHE_MARGIN), component)
+    
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+    
+    def savings(self) -> Dict[str, float]:
+        """Hit rate and the match time saved versus searching the gallery every time."""
+        hit = self.latency['hit'].summary()
+        miss = self.latency['miss'].summary()
+        saved_ms = max(0.0, miss['mean_ms'] - hit['mean_ms']) * self.hits if miss['count'] else 0.0
+        return {'hit_rate': self.hit_rate, 'hits': self.hits, 'misses': self.misses, 'ambiguous': self.ambiguous,
+                'hit_mean_ms': hit['mean_ms'], 'miss_mean_ms': miss['mean_ms'], 'saved_ms': saved_ms}
+    
+    def _refresh(self, now: float):
+        """Expire stale entries and restack the cached templates if membership or the gallery changed."""
+        expired = [sid for sid, last_hit in self.entries.items()
+                   if now - last_hit > self.ttl or sid not in self.gallery]
+        for student_id in expired:
+            del self.entries[student_id]
+            self._stale = True
+        if not self._stale and self._version == self.gallery.version:
+            return
+        self._ids = list(self.entries)
+        self._version = self.gallery.version
+        self._stale = False
+        if self._ids:
+            blocks = [self.gallery.templates[sid] for sid in self._ids]
+            self._matrix = np.vstack(blocks)
+            self._starts = np.concatenate(([0], np.cumsum([len(block) for block in blocks])[:-1])).astype(np.intp)
+        else:
+            self._matrix = np.empty((0, ENCODING_SIZE))
+            self._starts = np.empty(0, dtype=np.intp)
+    
+    def match(self, encoding: np.ndarray, tolerance: float = 0.6) -> Tuple[Optional[str], float]:
+        """Same contract as FaceGallery.match, answered from the cache when that is unambiguous."""
+        if self.capacity <= 0:
+            return self.gallery.match(encoding, tolerance)
+        started = time.perf_counter()
+        now = time.time()
+        self._refresh(now)
+        if self._ids:
+            distances = np.minimum.reduceat(np.linalg.norm(self._matrix - encoding, axis=1), self._starts)
+            best = int(np.argmin(distances))
+            distance = float(distances[best])
+            if distance <= tolerance - self.margin:
+                runner_up = float(np.partition(distances, 1)[1]) if len(distances) > 1 else float('inf')
+                if runner_up - distance >= self.margin:
+                    student_id = self._ids[best]
+                    self.entries[student_id] = now
+                    self.entries.move_to_end(student_id)
+                    self.hits += 1
+                    self.latency['hit'].observe(time.perf_counter() - started)
+                    return student_id, distance
+                self.ambiguous += 1
+        student_id, distance = self.gallery.match(encoding, tolerance)
+        self.misses += 1
+        if student_id is not None:
+            self._stale = self._stale or student_id not in self.entries
+            self.entries[student_id] = now
+            self.entries.move_to_end(student_id)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        self.latency['miss'].observe(time.perf_counter() - started)
+        return student_id, distance
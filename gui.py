@@ -6,12 +6,31 @@ import time
 from datetime import datetime, timedelta
 import pandas as pd
 import os
-import face_recognition
-from PIL import Image, ImageTk
-import numpy as np
-import customtkinter
 import tkinter.filedialog as filedialog
 import hashlib
+import json
+from best_shot import select_best_shots, encode_shots, DEFAULT_BURST_SIZE, DEFAULT_TOP_K
+from engine import RecognitionEngine
+from events import (DEFAULT_LEAD_TIME, DEFAULT_WIND_DOWN, EVENTS_FILE, EventCalendar, active_roster,
+                    format_roster, load_events, parse_roster)
+from detection import DetectionRegion, camera_detector, detect_faces, detection_scale, warm_up
+from encoder import encode_faces, make_embedder
+from gallery import FaceGallery, MatchCache, check_embedding, load_encodings, save_encodings
+from metrics import COUNT_BUCKETS, REGISTRY, RateCounter, serve_from_config
+from presence import DEFAULT_ABSENT_AFTER, ExpiryQueue, PresenceTracker
+import profiler
+from service import ServiceClient
+from report import prepare_report, report_rows
+from sessions import DEFAULT_SESSION, list_sessions, read_session_log
+from startup import Warmup, lazy_import
+from status import STATUS_THRESHOLDS, StatusEngine
+from voting import IdentityVoter
+
+# Imported on first use so the login dialog appears without waiting for dlib's models or the widget toolkit
+face_recognition = lazy_import('face_recognition')
+customtkinter = lazy_import('customtkinter')
+Image = lazy_import('PIL.Image')
+ImageTk = lazy_import('PIL.ImageTk')
 
 class DarkTheme:
     BG = '#23272e'
@@ -270,7 +289,8 @@ class NotificationPopup:
         self.top.after(duration, self.top.destroy)
 
 class AttendanceGUI:
-    UPDATE_INTERVAL = 30  # 2 minutes in seconds
+    ENGINE_POLL_MS = 30  # How often the Tk loop collects results from the recognition process
+    UI_TICK_MS = 16  # Frame-time probe for measuring main-loop jitter
     
     def __init__(self, root):
         self.root = root
@@ -314,12 +334,8 @@ class AttendanceGUI:
                 'student_id', 'name', 'check_in_time', 'last_seen_time',
                 'status', 'total_time_present'
             ]).to_excel(self.attendance_file, index=False)
-        self.STATUS_THRESHOLDS = {
-            'PRESENT': 0,
-            'LATE': 15,
-            'LEFT_EARLY': 30,
-            'ABSENT': None
-        }
+        self.STATUS_THRESHOLDS = dict(STATUS_THRESHOLDS)
+        self.status_engine = None  # Compiled from the report tab's date and time fields on first use
         self.active_tab = 'Check-in'
         self.create_modern_gui(setup_admin_tab=False)
         # Start camera automatically on launch
@@ -327,6 +343,7 @@ class AttendanceGUI:
         # Now setup admin tab after login and after tab_frames is created
         if 'Admin' in self.tab_frames:
             self.setup_admin_tab(self.tab_frames['Admin'])
+        self.arm_event_automation()
     
     def ensure_default_admin(self):
         # Create users.csv with default admin if not exists
@@ -468,6 +485,9 @@ class AttendanceGUI:
         header = ttk.Frame(self.root, style='Header.TFrame', height=60)
         header.pack(side='top', fill='x')
         ttk.Label(header, text="Attendance Monitoring System", style='Header.TLabel').pack(side='left', padx=30, pady=10)
+        self.readiness_label = ttk.Label(header, text="⏳ Starting...", style='Header.TLabel',
+                                         font=(DarkTheme.FONT, 11))
+        self.readiness_label.pack(side='right', padx=30, pady=10)
         # Sidebar with tk.Frame
         sidebar = tk.Frame(self.root, bg=DarkTheme.SIDEBAR_BG, width=180)
         sidebar.pack(side='left', fill='y')
@@ -661,6 +681,11 @@ class AttendanceGUI:
                                          style='Card.TLabel')
         self.last_update_label.pack(side='left', padx=20)
         
+        self.pixel_rate_label = ttk.Label(status_frame,
+                                        text="Scanned: 0.00 MP/s",
+                                        style='Card.TLabel')
+        self.pixel_rate_label.pack(side='left', padx=20)
+        
         # Controls with tk.Frame
         controls_frame = ttk.Frame(status_card, style='Card.TFrame')
         controls_frame.grid(row=0, column=1, sticky='e', padx=10)
@@ -717,24 +742,183 @@ class AttendanceGUI:
                                           font=(DarkTheme.FONT, 12))
         self.current_detections.pack(side='left', padx=5)
         
+        # Pipeline stats card
+        stats_card = ttk.Frame(card, style='Card.TFrame')
+        stats_card.pack(fill='x', pady=10)
+        stats_header = ttk.Label(stats_card, text="Pipeline Stats:", style='Card.TLabel', font=(DarkTheme.FONT, 12, 'bold'))
+        stats_header.pack(side='left', padx=5)
+        self.stats_panel = ttk.Label(stats_card, text="No data yet", style='Card.TLabel', justify='left')
+        self.stats_panel.pack(side='left', padx=5)
+        
         # Initialize monitoring variables
         self.known_face_encodings = {}
         self.known_face_names = {}
-        self.last_update_time = None
-        self.load_known_faces()
+        self.face_gallery = FaceGallery(component='gui')
+        # Detection settings from camera_config.json (GUI uses the check-in camera)
+        config = self.load_camera_config()
+        processing = config.get('processing', {})
+        cam_config = config.get('check_in_camera', {})
+        self.detection_interval = processing.get('face_detection_interval', 0.5)
+        self.detection_upsample = processing.get('upsample', 1)
+        self.recognition_threshold = processing.get('recognition_threshold', 0.6)
+        # Created on the warm-up thread: an ONNX model takes a moment to load
+        self.embedder = None
+        self.embedder_lock = threading.Lock()
+        self.detection_region = DetectionRegion(cam_config.get('roi'))
+        self.detector = camera_detector(cam_config, processing)
+        self.detection_scale = detection_scale(
+            cam_config.get('min_face_size', processing.get('min_face_size', [80, 80])),
+            self.detection_upsample, detector=self.detector)
+        self.pixel_rate = RateCounter('gui_camera_pixels')
+        self.match_cache = MatchCache.from_config(self.face_gallery, config, component='gui')
+        # Faces are named once several frames of their track agree (in-process recognition only)
+        self.voter = IdentityVoter.from_config(config)
+        # Sightings merged into intervals, so time away is not counted as present
+        self.presence = PresenceTracker.from_config(config)
+        self.presence_dirty = set()  # Seen since the last periodic update
+        # LEFT_EARLY deadlines; a Tk timer fires when the earliest is due
+        self.absent_after = config.get('presence', {}).get('absent_after', DEFAULT_ABSENT_AFTER)
+        self.absence = ExpiryQueue()
+        self.absence_job = None
+        self.absence_job_due = None
+        self.service_url = config.get('service', {}).get('url')
+        self.service_client = None
+        # 'process' runs recognition in a separate interpreter so it never competes with Tk for the GIL
+        self.engine_mode = processing.get('engine', 'thread')
+        self.engine = None
+        self.engine_poll_job = None
+        # With events.auto_start monitoring follows events.csv: started lead_time before each event, stopped after wind_down
+        events = config.get('events', {})
+        self.auto_start = events.get('auto_start', False)
+        self.lead_time = events.get('lead_time', DEFAULT_LEAD_TIME)
+        self.wind_down = events.get('wind_down', DEFAULT_WIND_DOWN)
+        self.auto_started = False
+        self.event_job = None
+        # Instrumentation shared with the metrics endpoint and the stats panel
+        self.frames_captured = REGISTRY.counter('frames_captured_total', 'Frames read from the camera', camera='gui')
+        self.frames_dropped = REGISTRY.counter('frames_dropped_total', 'Stale frames replaced before being processed',
+                                               camera='gui')
+        self.frames_processed = REGISTRY.counter('frames_processed_total', 'Frames run through recognition')
+        self.stage_latency = {
+            stage: REGISTRY.histogram('recognition_stage_seconds', 'Time per recognition stage', stage=stage)
+            for stage in ('detect', 'encode', 'match')
+        }
+        self.faces_per_frame = REGISTRY.histogram('faces_per_frame', 'Faces detected per processed frame', COUNT_BUCKETS)
+        REGISTRY.gauge('gallery_students', 'Students in the face gallery', func=lambda: len(self.face_gallery),
+                       component='gui')
+        REGISTRY.gauge('gallery_templates', 'Face templates in the gallery',
+                       func=lambda: self.face_gallery.template_count, component='gui')
+        self.recognition_latency = REGISTRY.histogram(
+            'recognition_seconds', 'End-to-end recognition time per processed frame')
+        self.ui_tick_lateness = REGISTRY.histogram('ui_tick_lateness_seconds',
+                                                   'How late the Tk main loop ran a scheduled UI tick')
+        self.metrics_server = serve_from_config(config)
+        # Gallery and dlib models load in the background while the UI is already usable
+        self.warmup = Warmup([
+            ('gallery', self.load_known_faces),
+            ('models', lambda: warm_up(upsample=self.detection_upsample, detector=self.detector,
+                                       embedder=self.face_embedder()))
+        ]).start()
+        self.root.after(250, self.update_readiness)
+        self.root.after(1000, self.update_stats_panel)
+        self._next_ui_tick = time.perf_counter() + self.UI_TICK_MS / 1000.0
+        self.root.after(self.UI_TICK_MS, self.ui_tick)
+    
+    def ui_tick(self):
+        """Record how late the main loop serviced this tick; lateness is what the user sees as stutter."""
+        now = time.perf_counter()
+        self.ui_tick_lateness.observe(max(0.0, now - self._next_ui_tick))
+        self._next_ui_tick = now + self.UI_TICK_MS / 1000.0
+        self.root.after(self.UI_TICK_MS, self.ui_tick)
+    
+    def update_stats_panel(self):
+        """Refresh the pipeline stats panel from the metrics registry once a second."""
+        try:
+            stats = REGISTRY.snapshot()
+            captured = stats.get('frames_captured_total', {}).get((('camera', 'gui'),), 0)
+            dropped = stats.get('frames_dropped_total', {}).get((('camera', 'gui'),), 0)
+            processed = stats.get('frames_processed_total', {}).get((), 0)
+            stages = stats.get('recognition_stage_seconds', {})
+            latency = "  ".join(
+                f"{dict(labels)['stage']} p50 {summary['p50_ms']:.0f} / p95 {summary['p95_ms']:.0f} ms"
+                for labels, summary in sorted(stages.items()) if summary['count']
+            )
+            if not latency:
+                total = stats.get('recognition_seconds', {}).get((), {})
+                if total.get('count'):
+                    latency = f"recognition p50 {total['p50_ms']:.0f} / p95 {total['p95_ms']:.0f} ms"
+            faces = stats.get('faces_per_frame', {}).get((), {})
+            faces_avg = faces['sum'] / faces['count'] if faces.get('count') else 0.0
+            ui = self.ui_tick_lateness.summary()
+            cache = self.match_cache.savings()
+            roster = ""
+            if self.face_gallery.roster:
+                roster = f", roster of {len(self.face_gallery.roster)} matched first"
+            engine = ""
+            if self.engine is not None:
+                engine = f"  |  Engine: {'running' if self.engine.running else 'down'}, {self.engine.restarts} restarts"
+            self.stats_panel.configure(text=(
+                f"Frames: {captured} captured, {dropped} skipped, {processed} processed  |  "
+                f"Faces/frame: {faces_avg:.2f}  |  "
+                f"Gallery: {len(self.face_gallery)} students, {self.face_gallery.template_count} templates{roster}\n"
+                f"{latency or 'No recognition timings yet'}\n"
+                f"Match cache: {cache['hit_rate'] * 100:.0f}% hits, {cache['saved_ms']:.0f} ms saved  |  "
+                f"UI tick lateness p50 {ui['p50_ms']:.0f} / p99 {ui['p99_ms']:.0f} ms{engine}"
+            ))
+        except Exception as e:
+            print(f"Error updating stats panel: {e}")
+        self.root.after(1000, self.update_stats_panel)
+    
+    def load_camera_config(self):
+        """Load camera_config.json, falling back to defaults if it is missing"""
+        try:
+            with open('camera_config.json', 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading camera config: {e}")
+            return {}
+    
+    def update_readiness(self):
+        """Show the warm-up's progress in the header until recognition is ready"""
+        state = self.warmup.state
+        if state == 'ready':
+            self.readiness_label.configure(text=f"🟢 Recognition ready ({self.warmup.timings['total']:.1f}s)")
+            return
+        if state == 'failed':
+            self.readiness_label.configure(text="🔴 Face models failed to load")
+            self.show_notification(f"Face recognition unavailable: {self.warmup.error}", level='error')
+            return
+        text = {'gallery': f"⏳ Loading {len(self.face_gallery)} students...",
+                'models': "⏳ Loading face models..."}.get(state, "⏳ Starting...")
+        self.readiness_label.configure(text=text)
+        self.root.after(250, self.update_readiness)
+    
+    def face_embedder(self):
+        """The embedder processing.encoder configures, created on first use"""
+        with self.embedder_lock:
+            if self.embedder is None:
+                self.embedder = make_embedder(self.load_camera_config())
+            return self.embedder
     
     def load_known_faces(self):
-        """Load all registered face encodings"""
+        """Load all registered face encodings (runs on the warm-up thread)"""
+        if not check_embedding(self.load_camera_config(), 'faces'):
+            message = "Face gallery was built by a different embedder; run migrate_gallery.py"
+            self.root.after(0, lambda: self.show_notification(message, level='error'))
+            return
         try:
             students_df = pd.read_csv('students.csv') if os.path.exists('students.csv') else pd.DataFrame(columns=['student_id', 'name'])
             for _, row in students_df.iterrows():
                 student_id = str(row['student_id'])
                 encoding_path = os.path.join('faces', f"{student_id}.npy")
                 if os.path.exists(encoding_path):
-                    self.known_face_encodings[student_id] = np.load(encoding_path)
+                    self.known_face_encodings[student_id] = load_encodings(encoding_path)
                     self.known_face_names[student_id] = row['name']
+                    self.face_gallery.add(student_id, self.known_face_encodings[student_id])
+            self.face_gallery.warm()
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to load face encodings: {str(e)}")
+            message = f"Failed to load face encodings: {str(e)}"
+            self.root.after(0, lambda: self.show_notification(message, level='error'))
     
     def start_camera(self):
         """Start the camera feed with proper resource management"""
@@ -752,7 +936,7 @@ class AttendanceGUI:
                 self.camera.set(cv2.CAP_PROP_FPS, 30)
                 self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
             self.camera_active = True
-            self.camera_thread = threading.Thread(target=self.update_camera_feed)
+            self.camera_thread = threading.Thread(target=self.update_camera_feed, name='gui-camera')
             self.camera_thread.daemon = True
             self.camera_thread.start()
     
@@ -785,15 +969,19 @@ class AttendanceGUI:
                 ret, frame = self.camera.read()
                 if not ret:
                     break
+                self.frames_captured.inc()
                 
                 # Process every 2nd frame for better performance
                 frame_count += 1
                 if frame_count % 2 != 0:
+                    self.frames_dropped.inc()
                     continue
                 
                 # Store current frame for monitoring
                 self.current_frame = frame.copy()
                 self.frame_ready.set()
+                if self.monitoring_active and self.engine is not None:
+                    self.engine.submit_frame(frame)
                 
                 # Convert and resize for display
                 frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -817,22 +1005,39 @@ class AttendanceGUI:
         else:
             self.start_monitoring()
     
-    def start_monitoring(self):
-        """Start monitoring with proper button management"""
+    def start_monitoring(self, quiet=False):
+        """Start monitoring with proper button management; quiet shows a notification instead of a dialog"""
         if not self.monitoring_active:
             if not self.camera_active:
                 self.start_camera()  # Only start if not already running
             self.monitoring_active = True
             self.present_students_last_seen = {}  # Track last seen time for each detected student
-            self.monitoring_thread = threading.Thread(target=self.monitor_faces)
-            self.monitoring_thread.daemon = True
-            self.monitoring_thread.start()
+            self.absence = ExpiryQueue()
+            self.voter.reset()
+            try:
+                # Carry on from totals already in the log (earlier session or restart)
+                self.presence.resume_from_log(pd.read_excel(self.attendance_file), self.absence, self.absent_after)
+            except Exception as e:
+                print(f"Error reading attendance file: {e}")
+            self.arm_absence_timer()  # Resumed students who never return still expire
+            # With service.url set the GUI is just a client of a remote recognition service
+            if not self.service_url and self.engine_mode == 'process':
+                self.start_engine()
+            else:
+                target = self.monitor_remote if self.service_url else self.monitor_faces
+                self.monitoring_thread = threading.Thread(target=target, name='gui-monitor')
+                self.monitoring_thread.daemon = True
+                self.monitoring_thread.start()
+            self.apply_event_roster()
             # Update UI
             self.status_label.configure(text="🟢 Monitoring active",
                                       foreground=DarkTheme.SUCCESS)
             self.start_button.pack_forget()
             self.stop_button.pack(side='left', padx=5)
-            messagebox.showinfo("Monitoring", "Face detection monitoring started")
+            if quiet:
+                self.show_notification("Face detection monitoring started")
+            else:
+                messagebox.showinfo("Monitoring", "Face detection monitoring started")
             # Immediately show the current camera frame in the monitoring tab if available
             if self.current_frame is not None:
                 frame_rgb = cv2.cvtColor(self.current_frame, cv2.COLOR_BGR2RGB)
@@ -844,14 +1049,23 @@ class AttendanceGUI:
             # Start periodic monitoring update
             self.monitor_periodic_job = self.root.after(30000, self.periodic_monitor_update)
     
-    def stop_monitoring(self):
+    def stop_monitoring(self, quiet=False):
         """Stop monitoring without blocking the UI"""
         if self.monitoring_active:
             self.monitoring_active = False
+            self.auto_started = False
             # Cancel periodic update if running
             if hasattr(self, 'monitor_periodic_job') and self.monitor_periodic_job:
                 self.root.after_cancel(self.monitor_periodic_job)
                 self.monitor_periodic_job = None
+            if self.service_client is not None:
+                self.service_client.close()
+            if self.engine_poll_job:
+                self.root.after_cancel(self.engine_poll_job)
+                self.engine_poll_job = None
+            if self.absence_job:
+                self.root.after_cancel(self.absence_job)
+                self.absence_job = None
             # Schedule camera stop in a separate thread
             stop_thread = threading.Thread(target=self._stop_monitoring_thread)
             stop_thread.daemon = True
@@ -865,50 +1079,113 @@ class AttendanceGUI:
             # Clear the monitor display
             self.monitor_label.configure(image='')
             self.monitor_label.image = None
-            # Save the Excel file on stop
+            # Save the Excel file and refreshed face templates on stop
             self.save_attendance_data()
+            self.face_gallery.save_dirty('faces')
             # Show completion message
-            self.root.after(500, lambda: messagebox.showinfo("Monitoring", "Monitoring stopped"))
+            if quiet:
+                self.show_notification("Monitoring stopped")
+            else:
+                self.root.after(500, lambda: messagebox.showinfo("Monitoring", "Monitoring stopped"))
     
     def periodic_monitor_update(self):
         """Periodic update for monitoring tab (every 30 seconds)."""
         if self.monitoring_active:
             now = datetime.now()
-            # Load current attendance data
+            self.apply_event_roster()  # Events start and end while monitoring runs
             try:
-                df = pd.read_excel(self.attendance_file)
-            except Exception as e:
-                print(f"Error reading attendance file: {e}")
-                return
-            updated = False
-            # Update present students
-            to_remove = []
-            for sid, last_seen in self.present_students_last_seen.items():
-                if sid in df['student_id'].values:
-                    idx = df['student_id'] == sid
-                    check_in = pd.to_datetime(df.loc[idx, 'check_in_time'].iloc[0])
-                    # If not seen for 30 minutes, mark as LEFT_EARLY and schedule for removal
-                    if (now - last_seen).total_seconds() > 1800:
-                        if df.loc[idx, 'status'].iloc[0] != 'LEFT_EARLY':
-                            df.loc[idx, 'status'] = 'LEFT_EARLY'
-                            updated = True
-                        to_remove.append(sid)
-                    else:
+                df = self.get_attendance_df()
+                updated = False
+                # Only rows of students seen since the last update change
+                if self.presence_dirty:
+                    positions = {sid: pos for pos, sid in enumerate(df['student_id'])}
+                    for sid in self.presence_dirty:
+                        last_seen = self.present_students_last_seen.get(sid)
+                        if last_seen is None or sid not in positions:
+                            continue
+                        row = df.index[positions[sid]]
                         # Update last_seen_time and total_time_present
-                        df.loc[idx, 'last_seen_time'] = last_seen
-                        df.loc[idx, 'total_time_present'] = str(last_seen - check_in)
-                        df.loc[idx, 'status'] = self.calculate_attendance_status(check_in, last_seen)
+                        df.at[row, 'last_seen_time'] = last_seen
+                        df.at[row, 'total_time_present'] = self.presence.total_time(sid)
                         updated = True
-            # Remove students marked as LEFT_EARLY from present_students_last_seen
-            for sid in to_remove:
-                del self.present_students_last_seen[sid]
-            if updated:
-                df.to_excel(self.attendance_file, index=False)
+                    self.presence_dirty.clear()
+                # Statuses for the whole log as array operations; unchanged rows are skipped
+                updated = bool(self.get_status_engine().apply(df)) or updated
+                if updated:
+                    self.write_attendance(df)
+            except Exception as e:
+                print(f"Error updating attendance: {e}")
             self.refresh_report()
             self.last_update_label.configure(text=f"Last update: {now.strftime('%H:%M:%S')}")
             # Schedule next update
             self.monitor_periodic_job = self.root.after(30000, self.periodic_monitor_update)
     
+    def get_attendance_df(self):
+        """The in-memory attendance log, read from attendance_file on first use"""
+        if not hasattr(self, 'attendance_df'):
+            self.attendance_df = pd.read_excel(self.attendance_file)
+        return self.attendance_df
+    
+    def adopt_attendance_df(self, df):
+        """Take a log written elsewhere in the GUI (e.g. a check-in) as the in-memory copy"""
+        if hasattr(self, 'attendance_df'):
+            self.attendance_df = df
+    
+    def arm_absence_timer(self):
+        """Make sure a Tk timer is set for the earliest LEFT_EARLY deadline"""
+        deadline = self.absence.next_deadline()
+        if deadline is None or (self.absence_job is not None and self.absence_job_due <= deadline):
+            return
+        if self.absence_job is not None:
+            self.root.after_cancel(self.absence_job)
+        self.absence_job_due = deadline
+        self.absence_job = self.root.after(max(0, int((deadline - time.time()) * 1000)), self.expire_absences)
+    
+    def expire_absences(self):
+        """Mark students whose LEFT_EARLY deadline has passed, then re-arm for the next one"""
+        self.absence_job = None
+        if not self.monitoring_active:
+            return
+        now = datetime.now()
+        changed = []
+        for sid in self.absence.pop_due(now.timestamp()):
+            self.present_students_last_seen.pop(sid, None)
+            event = {'type': 'status', 'student_id': sid, 'status': 'LEFT_EARLY',
+                     'timestamp': now.isoformat(timespec='seconds')}
+            if self.apply_status_event(event, write=False):
+                changed.append(self.known_face_names.get(sid, sid))
+        if changed:
+            # One rewrite and one notification however many expire together
+            self.write_attendance(self.attendance_df)
+            self.refresh_report()
+            names = ', '.join(changed[:5]) + (f" and {len(changed) - 5} more" if len(changed) > 5 else '')
+            self.show_notification(f"LEFT_EARLY: {names}", level='warning')
+        self.arm_absence_timer()
+    
+    def apply_status_event(self, event, write=True):
+        """Apply an attendance status change event to the log; returns True if a row changed"""
+        if event.get('session', DEFAULT_SESSION) != DEFAULT_SESSION:
+            # The service keeps that event's log itself; this GUI's log is the default session
+            if write:
+                name = self.known_face_names.get(event['student_id'], event['student_id'])
+                self.show_notification(f"{name}: {event['status']} ({event['session']})", level='warning')
+            return False
+        try:
+            df = self.get_attendance_df()
+            idx = df['student_id'] == event['student_id']
+            if not idx.any() or (df.loc[idx, 'status'] == event['status']).all():
+                return False
+            df.loc[idx, 'status'] = event['status']
+        except Exception as e:
+            print(f"Error applying status change: {e}")
+            return False
+        if write:
+            name = self.known_face_names.get(event['student_id'], event['student_id'])
+            self.show_notification(f"{name}: {event['status']}", level='warning')
+            self.write_attendance(df)
+            self.refresh_report()
+        return True
+    
     def _stop_monitoring_thread(self):
         """Handle monitoring cleanup in a separate thread"""
         try:
@@ -926,10 +1203,17 @@ class AttendanceGUI:
         """Save current attendance data to Excel file"""
         try:
             if hasattr(self, 'attendance_df'):
-                self.attendance_df.to_excel(self.attendance_file, index=False)
+                self.write_attendance(self.attendance_df)
         except Exception as e:
             print(f"Error saving attendance data: {str(e)}")
     
+    def write_attendance(self, df):
+        """Write the attendance log, in the recognition process when it is running so Tk never blocks on openpyxl"""
+        if self.engine is not None and self.engine.running:
+            self.engine.save_attendance(df.copy(), self.attendance_file)
+        else:
+            df.to_excel(self.attendance_file, index=False)
+    
     def reset_logs(self):
         """Reset attendance logs"""
         if messagebox.askyesno("Reset Logs", 
@@ -941,6 +1225,9 @@ class AttendanceGUI:
                     'status', 'total_time_present'
                 ])
                 new_df.to_excel(self.attendance_file, index=False)
+                self.adopt_attendance_df(new_df)
+                self.presence.clear()
+                self.absence = ExpiryQueue()
                 
                 # Refresh the display
                 self.refresh_report()
@@ -952,13 +1239,8 @@ class AttendanceGUI:
         """Update attendance record with new timestamp and status"""
         try:
             now = datetime.now()
-            # Only update every UPDATE_INTERVAL seconds
-            if (hasattr(self, 'last_update_time') and self.last_update_time is not None and 
-                (now - self.last_update_time).total_seconds() < self.UPDATE_INTERVAL):
-                return
             # Load or use in-memory attendance data
-            if not hasattr(self, 'attendance_df'):
-                self.attendance_df = pd.read_excel(self.attendance_file)
+            self.get_attendance_df()
             # Get check-in and last seen
             if student_id in self.attendance_df['student_id'].values:
                 idx = self.attendance_df['student_id'] == student_id
@@ -969,10 +1251,7 @@ class AttendanceGUI:
             # Calculate status
             status = self.calculate_attendance_status(check_in, last_seen)
             # Calculate total time present
-            if student_id in self.attendance_df['student_id'].values:
-                total_time = str(last_seen - check_in)
-            else:
-                total_time = "0:00:00"
+            total_time = self.presence.total_time(student_id)
             new_row = {
                 'student_id': student_id,
                 'name': name,
@@ -991,7 +1270,6 @@ class AttendanceGUI:
                 self.attendance_df = pd.concat([self.attendance_df, pd.DataFrame([new_row])], 
                                            ignore_index=True)
             # Only update the label and report in the GUI
-            self.last_update_time = now
             self.last_update_label.configure(
                 text=f"Last update: {now.strftime('%H:%M:%S')}"
             )
@@ -1001,37 +1279,25 @@ class AttendanceGUI:
     
     def calculate_attendance_status(self, check_in_time, last_seen_time):
         """Calculate attendance status based on event start/end and thresholds"""
-        # Parse event start/end from GUI
-        try:
-            event_date = pd.to_datetime(self.date_var.get())
-            start_hour, start_minute = map(int, self.event_start_time.get().split(":"))
-            end_hour, end_minute = map(int, self.event_end_time.get().split(":"))
-            event_start = event_date.replace(hour=start_hour, minute=start_minute, second=0, microsecond=0)
-            event_end = event_date.replace(hour=end_hour, minute=end_minute, second=0, microsecond=0)
-        except Exception:
-            # Fallback to 9:00-17:00
-            event_start = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
-            event_end = datetime.now().replace(hour=17, minute=0, second=0, microsecond=0)
-        # Late threshold (minutes)
-        late_threshold = self.STATUS_THRESHOLDS['LATE']
-        # If never checked in
-        if pd.isnull(check_in_time):
-            return 'ABSENT'
-        # If checked in after late threshold
-        if (check_in_time - event_start).total_seconds() / 60 > late_threshold:
-            status = 'LATE'
-        else:
-            status = 'PRESENT'
-        # If left before end
-        if pd.notnull(last_seen_time) and last_seen_time < event_end:
-            # Only mark as left early if last seen is at least 10 minutes before end
-            if (event_end - last_seen_time).total_seconds() > 600:
-                status = 'LEFT_EARLY'
-        return status
+        return self.get_status_engine().status(check_in_time, last_seen_time)
+    
+    def get_status_engine(self):
+        """Status rules for the event in the report tab's date and time fields, compiled once per change"""
+        if self.status_engine is None:
+            self.status_engine = StatusEngine.from_strings(
+                self.date_var.get(), self.event_start_time.get(), self.event_end_time.get(),
+                thresholds=self.STATUS_THRESHOLDS, absent_after=self.absent_after)
+        return self.status_engine
+    
+    def invalidate_status_engine(self, *args):
+        self.status_engine = None
     
     def monitor_faces(self):
         """Real-time face detection and recognition with performance optimization"""
-        frame_count = 0
+        # Recognition needs the gallery and models the warm-up is loading
+        while self.monitoring_active and not self.warmup.done.wait(timeout=0.5):
+            pass
+        next_detection = 0.0
         while self.monitoring_active:
             # Wait for a new frame
             if not self.frame_ready.wait(timeout=1.0):
@@ -1041,81 +1307,219 @@ class AttendanceGUI:
                 if self.current_frame is None:
                     continue
                 frame = self.current_frame.copy()
-            # Process every 3rd frame for face detection
-            frame_count += 1
-            if frame_count % 3 != 0:
+            # Run detection once per face_detection_interval
+            if time.monotonic() < next_detection:
                 continue
-            # Convert to RGB for face_recognition
+            next_detection = time.monotonic() + self.detection_interval
+            event = self.recognise_frame(frame)
+            # Hand the results and annotated frame to the Tk thread
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            img = Image.fromarray(frame_rgb).resize((320, 240), Image.Resampling.LANCZOS)
+            self.root.after(0, self.apply_detection_event, event, img)
+            time.sleep(0.01)  # Small delay to prevent CPU overuse
+    
+    def recognise_frame(self, frame):
+        """Detect, encode and match faces in frame, drawing labels onto it.
+        
+        Returns a detection event in the same shape the recognition service
+        streams, so local and remote monitoring share apply_detection_event.
+        """
+        # Find faces in the region of interest at the configured scale
+        with self.stage_latency['detect'].time():
+            face_locations, pixels = detect_faces(frame, self.detection_region,
+                                                  self.detection_scale, detector=self.detector)
+        self.pixel_rate.add(pixels)
+        self.frames_processed.inc()
+        self.faces_per_frame.observe(len(face_locations))
+        with self.stage_latency['encode'].time():
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            # Reduce frame size for faster processing
-            small_frame = cv2.resize(rgb_frame, (0, 0), fx=0.5, fy=0.5)
-            # Find faces in frame
-            face_locations = face_recognition.face_locations(small_frame, model="hog")
-            face_encodings = face_recognition.face_encodings(small_frame, face_locations)
-            detected_people = []
-            detected_ids = set()
-            now = datetime.now()
-            # Scale back face locations to original size
-            face_locations = [(top * 2, right * 2, bottom * 2, left * 2) 
-                            for top, right, bottom, left in face_locations]
-            # Process detected faces
-            for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-                matches = []
-                name = "Unknown"
-                student_id = None
-                confidence = 0
-                # Check against known faces
-                for sid, known_encoding in self.known_face_encodings.items():
-                    # Calculate face distance (lower is better)
-                    face_distance = face_recognition.face_distance([known_encoding], face_encoding)[0]
-                    # Convert distance to confidence score (0-100%)
-                    confidence_score = (1 - face_distance) * 100
-                    if confidence_score > 30: # 30%confidence threshold
-                        if confidence_score > confidence:  # Keep best match
-                            confidence = confidence_score
-                            student_id = sid
-                            name = self.known_face_names[sid]
-                if student_id:
-                    badge_text, badge_color = self.get_status_badge('PRESENT')
-                    detected_people.append(f"{name} {badge_text}")
-                    detected_ids.add(student_id)
-                    # Update last seen time for this student
-                    self.present_students_last_seen[student_id] = now
-                    # Update attendance
-                    self.update_attendance(student_id, name)
-                # Draw rectangle with color based on confidence
-                if confidence > 80:
-                    color = (0, 255, 0)  # Green for high confidence
-                elif confidence > 60:
-                    color = (0, 255, 255)  # Yellow for medium confidence
-                else:
-                    color = (0, 0, 255)  # Red for unknown/low confidence
-                # Draw rectangle
-                cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-                # Draw name and confidence
-                label = f"{name} ({confidence:.1f}%)" if confidence > 0 else name
-                y = bottom - 15 if top > 20 else top + 15
-                cv2.rectangle(frame, (left, y-20), (right, y), color, cv2.FILLED)
-                font = cv2.FONT_HERSHEY_DUPLEX
-                cv2.putText(frame, label, (left + 6, y-6), font, 0.6, (0, 0, 0), 1)
-            # Track currently present students
-            self.currently_present_students = detected_ids
-            # Update UI with results
-            if detected_people:
-                self.current_detections.configure(
-                    text=f"Detected: {', '.join(detected_people)}"
-                )
+            face_encodings = encode_faces(rgb_frame, face_locations, self.face_embedder())
+        # Check against known faces (closest template per student, one vectorised pass)
+        with self.stage_latency['match'].time():
+            matches = [self.match_cache.match(face_encoding, tolerance=self.recognition_threshold)
+                       for face_encoding in face_encodings]
+        # A face is named once enough frames of its track agree
+        identities, tracks, confirmed, released = self.voter.update(
+            'gui', face_locations, [sid for sid, _ in matches], time.time())
+        faces = []
+        for location, face_encoding, (sid, face_distance), student_id, track in zip(
+                face_locations, face_encodings, matches, identities, tracks):
+            if sid is not None and sid == student_id:
+                # Refresh templates from high-confidence sightings the track agrees with
+                self.face_gallery.add_sighting(sid, face_encoding, face_distance)
+            faces.append({'student_id': student_id,
+                          'name': self.known_face_names.get(student_id) if student_id else None,
+                          'distance': float(face_distance), 'location': list(location), 'track': track})
+        self.annotate_frame(frame, faces)
+        return {'type': 'detection', 'camera': 'gui', 'timestamp': datetime.now().isoformat(timespec='milliseconds'),
+                'faces': faces, 'confirmed': confirmed, 'released': released}
+    
+    def annotate_frame(self, frame, faces):
+        """Draw a box and name/confidence label for each face of a detection event onto frame"""
+        for face in faces:
+            top, right, bottom, left = face['location']
+            student_id = face.get('student_id')
+            name = "Unknown"
+            confidence = 0
+            if student_id:
+                name = face.get('name') or self.known_face_names.get(student_id, student_id)
+                # Convert distance to confidence score (0-100%)
+                confidence = (1 - face['distance']) * 100
+            # Draw rectangle with color based on confidence
+            if confidence > 80:
+                color = (0, 255, 0)  # Green for high confidence
+            elif confidence > 60:
+                color = (0, 255, 255)  # Yellow for medium confidence
             else:
-                self.current_detections.configure(text="No faces detected")
-            # Display processed frame
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame_rgb)
-            img = img.resize((320, 240), Image.Resampling.LANCZOS)
+                color = (0, 0, 255)  # Red for unknown/low confidence
+            # Draw rectangle
+            cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+            # Draw name and confidence
+            label = f"{name} ({confidence:.1f}%)" if confidence > 0 else name
+            y = bottom - 15 if top > 20 else top + 15
+            cv2.rectangle(frame, (left, y-20), (right, y), color, cv2.FILLED)
+            font = cv2.FONT_HERSHEY_DUPLEX
+            cv2.putText(frame, label, (left + 6, y-6), font, 0.6, (0, 0, 0), 1)
+    
+    def apply_detection_event(self, event, img=None):
+        """Update presence, attendance and the monitoring widgets from a detection event (Tk thread)"""
+        if not self.monitoring_active:
+            return
+        detected_people = []
+        detected_ids = set()
+        now = datetime.now()
+        for face in event.get('faces', []):
+            student_id = face.get('student_id')
+            if not student_id:
+                continue
+            name = face.get('name') or self.known_face_names.get(student_id, student_id)
+            badge_text, badge_color = self.get_status_badge('PRESENT')
+            detected_people.append(f"{name} {badge_text}")
+            detected_ids.add(student_id)
+            # Update last seen time for this student
+            self.present_students_last_seen[student_id] = now
+            self.presence.see(student_id, now)
+            self.presence_dirty.add(student_id)
+            self.absence.touch(student_id, now.timestamp() + self.absent_after)
+        # Only newly confirmed students change the log now; the periodic update keeps the rest current
+        for student_id in event.get('confirmed', []):
+            self.update_attendance(student_id, self.known_face_names.get(student_id, student_id))
+        # Track currently present students
+        self.currently_present_students = detected_ids
+        if detected_ids:
+            self.arm_absence_timer()
+        # Update UI with results
+        if detected_people:
+            self.current_detections.configure(
+                text=f"Detected: {', '.join(detected_people)}"
+            )
+        else:
+            self.current_detections.configure(text="No faces detected")
+        self.pixel_rate_label.configure(text=f"Scanned: {self.pixel_rate.rate() / 1e6:.2f} MP/s")
+        # Display processed frame
+        if img is not None:
             img_tk = ImageTk.PhotoImage(img)
-            if self.monitoring_active:  # Check if still active before updating
-                self.monitor_label.configure(image=img_tk)
-                self.monitor_label.image = img_tk
-            time.sleep(0.01)  # Small delay to prevent CPU overuse
+            self.monitor_label.configure(image=img_tk)
+            self.monitor_label.image = img_tk
+    
+    def apply_event_roster(self):
+        """Match the running event's expected roster first; outside events every student is searched alike"""
+        roster = active_roster(EVENTS_FILE, lead=self.lead_time)
+        if roster != self.face_gallery.roster:
+            self.face_gallery.set_roster(roster)
+            print(f"Event roster: {len(roster)} students" if roster else "Event roster cleared")
+        if self.engine is not None:
+            self.engine.set_roster(roster)
+    
+    def arm_event_automation(self):
+        """With events.auto_start, start monitoring lead_time before each event and stop it after wind_down"""
+        if self.event_job:
+            self.root.after_cancel(self.event_job)
+            self.event_job = None
+        if not self.auto_start:
+            return
+        try:
+            calendar = EventCalendar.load(EVENTS_FILE, lead=self.lead_time, wind_down=self.wind_down)
+            events, until = calendar.plan()
+        except Exception as e:
+            print(f"Error reading events: {e}")
+            self.event_job = self.root.after(60000, self.arm_event_automation)
+            return
+        if events and not self.monitoring_active:
+            self.warm_for_event()
+            self.start_monitoring(quiet=True)
+            self.auto_started = True
+            if self.engine is not None:
+                self.engine.warm()
+        elif not events and self.monitoring_active and self.auto_started:
+            self.stop_monitoring(quiet=True)
+        if until is not None:
+            # Re-check at least hourly in case the system clock is changed
+            delay = min(max(0.0, (until - datetime.now()).total_seconds()) + 0.5, 3600.0)
+            self.event_job = self.root.after(int(delay * 1000), self.arm_event_automation)
+    
+    def warm_for_event(self):
+        """Pre-warm during the lead time: roster sub-gallery and match index now, detector models off the UI thread"""
+        self.apply_event_roster()
+        self.face_gallery.warm()
+        if not self.service_url and self.engine_mode == 'process':
+            return  # The engine process warms its own models
+        # face_embedder() loads the configured embedding model (e.g. an ONNX session) on this thread too
+        threading.Thread(target=lambda: warm_up(upsample=self.detection_upsample, detector=self.detector,
+                                                embedder=self.face_embedder()),
+                         name='model-warm-up', daemon=True).start()
+    
+    def start_engine(self):
+        """Start the recognition process (or have it reload the gallery) and begin polling its results"""
+        if self.engine is None:
+            self.engine = RecognitionEngine('camera_config.json', 'faces')
+            self.engine.start()
+        else:
+            self.engine.reload()  # Pick up students registered since the last session
+        self.engine_poll_job = self.root.after(self.ENGINE_POLL_MS, self.poll_engine)
+    
+    def poll_engine(self):
+        """Apply detection events from the recognition process (Tk thread, never blocks)"""
+        if not self.monitoring_active or self.engine is None:
+            return
+        events = self.engine.poll()
+        for event in events:
+            self.pixel_rate.add(event['pixels'])
+            self.frames_processed.inc()
+            self.faces_per_frame.observe(len(event['faces']))
+            self.recognition_latency.observe(event['seconds'])
+            for face in event['faces']:
+                if face['student_id'] is not None:
+                    face['name'] = self.known_face_names.get(face['student_id'])
+        if events:
+            for event in events[:-1]:
+                self.apply_detection_event(event)
+            # Only the newest result is drawn, over the newest camera frame
+            img = None
+            with self.camera_lock:
+                frame = self.current_frame.copy() if self.current_frame is not None else None
+            if frame is not None:
+                self.annotate_frame(frame, events[-1]['faces'])
+                img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).resize((320, 240), Image.Resampling.LANCZOS)
+            self.apply_detection_event(events[-1], img)
+        self.engine_poll_job = self.root.after(self.ENGINE_POLL_MS, self.poll_engine)
+    
+    def monitor_remote(self):
+        """Follow the recognition service's detection stream instead of recognising locally"""
+        while self.monitoring_active:
+            self.service_client = ServiceClient(self.service_url)
+            try:
+                for event in self.service_client.stream_detections():
+                    if not self.monitoring_active:
+                        break
+                    handler = self.apply_status_event if event.get('type') == 'status' else self.apply_detection_event
+                    self.root.after(0, handler, event)
+            except Exception as e:
+                print(f"Error streaming detections from {self.service_url}: {e}")
+            finally:
+                self.service_client.close()
+            if self.monitoring_active:
+                time.sleep(2)  # Reconnect after a short delay
     
     def setup_reports_tab(self, parent):
         # Main container with card style
@@ -1173,6 +1577,7 @@ class AttendanceGUI:
         
         # Add trace to date_var to auto-refresh report
         self.date_var.trace_add('write', lambda *args: self.refresh_report())
+        self.date_var.trace_add('write', self.invalidate_status_engine)
         
         # Time range filter
         time_frame = ttk.Frame(filters_frame, style='Card.TFrame')
@@ -1206,6 +1611,8 @@ class AttendanceGUI:
             border_color=DarkTheme.BUTTON_BG
         )
         end_entry.pack(side='left', padx=5)
+        self.event_start_time.trace_add('write', self.invalidate_status_engine)
+        self.event_end_time.trace_add('write', self.invalidate_status_engine)
         
         # Status filter
         status_frame = ttk.Frame(filters_frame, style='Card.TFrame')
@@ -1231,6 +1638,29 @@ class AttendanceGUI:
         # Add trace for status_var to auto-refresh report
         self.status_var.trace_add('write', lambda *args: self.refresh_report())
         
+        # Session filter: the default log or one event's own log (main.py keeps one per event)
+        session_frame = ttk.Frame(filters_frame, style='Card.TFrame')
+        session_frame.pack(side='left', padx=20)
+        ttk.Label(session_frame, text="Session:", style='Card.TLabel').pack(side='left', padx=(0, 10))
+        self.session_var = tk.StringVar(value=DEFAULT_SESSION)
+        self.session_menu = customtkinter.CTkOptionMenu(
+            session_frame,
+            values=[DEFAULT_SESSION] + list_sessions(self.date_var.get()),
+            variable=self.session_var,
+            width=160,
+            height=32,
+            fg_color=DarkTheme.BUTTON_BG,
+            bg_color=DarkTheme.CARD_BG,
+            button_color=DarkTheme.BUTTON_HOVER,
+            button_hover_color=DarkTheme.BUTTON_HOVER,
+            dropdown_fg_color=DarkTheme.CARD_BG,
+            text_color=DarkTheme.FG,
+            font=customtkinter.CTkFont(family=DarkTheme.FONT, size=11)
+        )
+        self.session_menu.pack(side='left')
+        self.session_var.trace_add('write', lambda *args: self.refresh_report())
+        self.date_var.trace_add('write', self.update_session_menu)
+        
         # Refresh button
         refresh_btn = customtkinter.CTkButton(
             filters_frame,
@@ -1367,7 +1797,7 @@ class AttendanceGUI:
         messagebox.showerror("Error", "This function is now handled in a background thread. Please use Register.")
     
     def register_student(self):
-        threading.Thread(target=self.capture_face_thread, daemon=True).start()
+        threading.Thread(target=self.capture_face_thread, name='gui-register', daemon=True).start()
         self.show_notification("Registering student...", level='info')
 
     def capture_face_thread(self):
@@ -1377,27 +1807,25 @@ class AttendanceGUI:
             self.root.after(0, lambda: self.show_notification("Please enter both Student ID and Name", level='error'))
             return
 
-        with self.camera_lock:
-            if self.camera is None or not self.camera.isOpened():
-                self.root.after(0, lambda: self.show_notification("Camera is not properly initialized", level='error'))
-                return
-            ret, frame = self.camera.read()
-            if not ret:
-                self.root.after(0, lambda: self.show_notification("Failed to capture image from camera", level='error'))
-                return
+        frames = self.capture_burst()
+        if frames is None:
+            self.root.after(0, lambda: self.show_notification("Camera is not properly initialized", level='error'))
+            return
+        if not frames:
+            self.root.after(0, lambda: self.show_notification("Failed to capture image from camera", level='error'))
+            return
 
-        # Detect face
-        face_locations = face_recognition.face_locations(frame)
-        if not face_locations:
+        # Detect and score faces across the burst
+        shots = select_best_shots(frames, DEFAULT_TOP_K)
+        if not shots:
             self.root.after(0, lambda: self.show_notification("No face detected", level='error'))
             return
 
-        # Save face image and encoding
+        # Save the sharpest face image and the top-k encodings
         face_path = os.path.join('faces', f"{student_id}.jpg")
-        cv2.imwrite(face_path, frame)
-        face_encoding = face_recognition.face_encodings(frame, face_locations)[0]
+        cv2.imwrite(face_path, shots[0].frame)
         encoding_path = os.path.join('faces', f"{student_id}.npy")
-        np.save(encoding_path, face_encoding)
+        save_encodings(encoding_path, encode_shots(shots, embedder=self.face_embedder()))
 
         # Update students.csv
         try:
@@ -1413,6 +1841,18 @@ class AttendanceGUI:
         except Exception as e:
             self.root.after(0, lambda: self.show_notification(f"Failed to update students database: {str(e)}", level='error'))
     
+    def capture_burst(self, burst_size=DEFAULT_BURST_SIZE):
+        """Grab a short burst of frames from the camera; None if the camera is unavailable"""
+        frames = []
+        with self.camera_lock:
+            if self.camera is None or not self.camera.isOpened():
+                return None
+            for _ in range(burst_size):
+                ret, frame = self.camera.read()
+                if ret:
+                    frames.append(frame)
+        return frames
+    
     def mock_rfid_scan(self):
         try:
             df = pd.read_csv('students.csv')
@@ -1423,7 +1863,7 @@ class AttendanceGUI:
     
     def process_check_in(self):
         """Process check-in with proper camera handling in a background thread"""
-        threading.Thread(target=self.process_check_in_thread, daemon=True).start()
+        threading.Thread(target=self.process_check_in_thread, name='gui-check-in', daemon=True).start()
 
     def process_check_in_thread(self):
         student_id = self.student_id_var.get()
@@ -1439,26 +1879,26 @@ class AttendanceGUI:
             if not self.camera_active:
                 self.root.after(0, lambda: self.show_notification("Please start the camera first", level='error'))
                 return
-            with self.camera_lock:
-                if self.camera is None or not self.camera.isOpened():
-                    self.root.after(0, lambda: self.show_notification("Camera is not properly initialized", level='error'))
-                    return
-                ret, frame = self.camera.read()
-                if not ret:
-                    self.root.after(0, lambda: self.show_notification("Could not capture image from camera", level='error'))
-                    return
+            frames = self.capture_burst()
+            if frames is None:
+                self.root.after(0, lambda: self.show_notification("Camera is not properly initialized", level='error'))
+                return
+            if not frames:
+                self.root.after(0, lambda: self.show_notification("Could not capture image from camera", level='error'))
+                return
             encoding_path = os.path.join('faces', f"{student_id}.npy")
             if not os.path.exists(encoding_path):
                 self.root.after(0, lambda: self.show_notification("No face data found for this student. Please register first.", level='error'))
                 return
-            face_locations = face_recognition.face_locations(frame)
-            if not face_locations:
+            shots = select_best_shots(frames, top_k=1)
+            if not shots:
                 self.root.after(0, lambda: self.show_notification("No face detected in camera", level='error'))
                 return
-            current_encoding = face_recognition.face_encodings(frame, face_locations)[0]
-            registered_encoding = np.load(encoding_path)
-            matches = face_recognition.compare_faces([registered_encoding], current_encoding, tolerance=0.6)
-            if not matches[0]:
+            current_encoding = encode_shots(shots, embedder=self.face_embedder())[0]
+            registered_encodings = load_encodings(encoding_path)
+            matches = face_recognition.compare_faces(registered_encodings, current_encoding,
+                                                     tolerance=self.recognition_threshold)
+            if not any(matches):
                 self.root.after(0, lambda: self.show_notification("Face does not match registered student", level='error'))
                 return
             now = datetime.now()
@@ -1475,6 +1915,7 @@ class AttendanceGUI:
                 attendance_df = pd.concat([attendance_df, pd.DataFrame([new_row])], 
                                        ignore_index=True)
             attendance_df.to_excel(self.attendance_file, index=False)
+            self.root.after(0, self.adopt_attendance_df, attendance_df)
             self.root.after(0, lambda: [
                 self.show_notification("Check-in successful!", level='success'),
                 self.refresh_report()
@@ -1507,80 +1948,25 @@ class AttendanceGUI:
             self.tree.delete(item)
         try:
             # Use in-memory DataFrame if available and monitoring is active
-            if hasattr(self, 'attendance_df') and self.monitoring_active:
+            session = self.session_var.get() if hasattr(self, 'session_var') else DEFAULT_SESSION
+            if session != DEFAULT_SESSION:
+                df = read_session_log(session)  # Only this event's partition is read
+            elif hasattr(self, 'attendance_df') and self.monitoring_active:
                 df = self.attendance_df.copy()
             else:
                 df = pd.read_excel(self.attendance_file)
             
-            # Add missing columns if needed
-            required_cols = ['student_id', 'name', 'check_in_time', 'last_seen_time', 'status', 'total_time_present']
-            for col in required_cols:
-                if col not in df.columns:
-                    if col == 'status':
-                        df[col] = 'ABSENT'
-                    elif col == 'total_time_present':
-                        df[col] = '0:00:00'
-                    else:
-                        df[col] = ''
-            
-            # Convert timestamps
-            df['check_in_time'] = pd.to_datetime(df['check_in_time'], errors='coerce')
-            df['last_seen_time'] = pd.to_datetime(df['last_seen_time'], errors='coerce')
-            
-            # Apply date filter
-            selected_date = self.date_var.get()
-            if selected_date:
-                df = df[df['check_in_time'].dt.strftime('%Y-%m-%d') == selected_date]
-            
-            # Apply status filter
-            selected_status = self.status_var.get()
-            if selected_status != "ALL":
-                df = df[df['status'] == selected_status]
-            
-            # Remove duplicates keeping the latest entry for each student
-            df = df.sort_values('check_in_time').drop_duplicates('student_id', keep='last')
-            
-            # Update statistics
-            status_counts = {'PRESENT': 0, 'LATE': 0, 'LEFT_EARLY': 0, 'ABSENT': 0}
-            for status in df['status'].fillna('ABSENT'):
-                if status in status_counts:
-                    status_counts[status] += 1
+            df, status_counts = prepare_report(df, self.date_var.get(), self.status_var.get())
             
             # Update status count labels
             for status, count in status_counts.items():
                 self.stats_labels[status].configure(text=str(count))
             
             # Update table with colored status
-            for _, row in df.iterrows():
-                status = row.get('status', 'ABSENT')
-                if pd.isnull(status) or status == '':
-                    status = 'ABSENT'
-                    
-                # Format timestamps
-                check_in = row.get('check_in_time', '')
-                last_seen = row.get('last_seen_time', '')
-                if pd.notnull(check_in):
-                    check_in = check_in.strftime('%Y-%m-%d %H:%M:%S')
-                if pd.notnull(last_seen):
-                    last_seen = last_seen.strftime('%Y-%m-%d %H:%M:%S')
-                
-                # Format total_time_present to remove days
-                total_time = str(row.get('total_time_present', '0:00:00'))
-                if 'day' in total_time:
-                    # Remove 'X days' prefix
-                    total_time = total_time.split(',')[-1].strip()
-                
+            for student_id, name, check_in, last_seen, status, total_time in report_rows(df):
                 # Get status display
                 status_text, status_color = self.get_status_display(status)
-                
-                values = (
-                    str(row.get('student_id', '')),
-                    str(row.get('name', '')),
-                    check_in,
-                    last_seen,
-                    status_text,
-                    total_time
-                )
+                values = (student_id, name, check_in, last_seen, status_text, total_time)
                 
                 # Insert with status-based tag
                 item = self.tree.insert('', 'end', values=values, tags=(status,))
@@ -1600,6 +1986,13 @@ class AttendanceGUI:
         except Exception as e:
             self.show_notification(f"Failed to refresh report: {str(e)}", level='error')
     
+    def update_session_menu(self, *args):
+        """List the sessions logged on the report date"""
+        sessions = [DEFAULT_SESSION] + list_sessions(self.date_var.get())
+        self.session_menu.configure(values=sessions)
+        if self.session_var.get() not in sessions:
+            self.session_var.set(DEFAULT_SESSION)
+    
     def quit_application(self):
         """Safely quit the application asynchronously"""
         if messagebox.askokcancel("Quit", "Do you want to quit the application?"):
@@ -1618,7 +2011,9 @@ class AttendanceGUI:
                 self.stop_camera()
                 # Final cleanup
                 if hasattr(self, 'attendance_df'):
-                    self.attendance_df.to_excel(self.attendance_file, index=False)
+                    self.write_attendance(self.attendance_df)
+                if self.engine is not None:
+                    self.engine.stop()  # Flushes queued writes and the gallery before exiting
                 if hasattr(self, 'camera') and self.camera is not None:
                     self.camera.release()
                 # Destroy the window in the main thread
@@ -1851,12 +2246,13 @@ class AttendanceGUI:
         event_card.pack(fill='x', pady=(10, 20))
         event_header = ttk.Label(event_card, text="Event Scheduling", style='Card.TLabel', font=(DarkTheme.FONT, 16, 'bold'))
         event_header.pack(anchor='w', pady=(0, 10))
-        self.event_tree = ttk.Treeview(event_card, columns=('Name', 'Date', 'Start', 'End'), show='headings', height=5, style='Dark.Treeview')
+        self.event_tree = ttk.Treeview(event_card, columns=('Name', 'Date', 'Start', 'End', 'Roster'), show='headings', height=5, style='Dark.Treeview')
         for col, heading, width in [
             ('Name', 'Event Name', 160),
             ('Date', 'Date', 100),
             ('Start', 'Start Time', 90),
-            ('End', 'End Time', 90)
+            ('End', 'End Time', 90),
+            ('Roster', 'Roster', 70)
         ]:
             self.event_tree.heading(col, text=heading)
             self.event_tree.column(col, width=width, anchor='center')
@@ -1897,7 +2293,39 @@ class AttendanceGUI:
         )
         delete_event_btn.pack(pady=(0, 6), anchor='w')
         self.load_events_to_tree()
+        # Diagnostics section
+        diagnostics_card = ttk.Frame(card, style='Card.TFrame')
+        diagnostics_card.pack(fill='x', pady=(10, 20))
+        diagnostics_header = ttk.Label(diagnostics_card, text="Diagnostics", style='Card.TLabel', font=(DarkTheme.FONT, 16, 'bold'))
+        diagnostics_header.pack(anchor='w', pady=(0, 10))
+        self.profiler = profiler.from_config(self.load_camera_config())
+        self.profile_btn = customtkinter.CTkButton(
+            diagnostics_card,
+            text=f"Profile {self.profiler.default_duration:.0f}s",
+            command=self.toggle_profiler,
+            fg_color=DarkTheme.ACCENT,
+            hover_color=DarkTheme.ACCENT_HOVER,
+            bg_color=DarkTheme.CARD_BG,
+            width=150,
+            **self.button_props
+        )
+        self.profile_btn.pack(side='left', padx=5)
+        self.profile_status = ttk.Label(diagnostics_card, text="Samples all threads and writes a flamegraph (collapsed stacks) to profiles/", style='Card.TLabel', justify='left')
+        self.profile_status.pack(side='left', padx=10)
 
+    def toggle_profiler(self):
+        """Start a sampling profile of all threads, or stop the running one early"""
+        if self.profiler.toggle(on_finish=lambda path, cpu: self.root.after(0, lambda: self._profile_finished(path))):
+            self.profile_btn.configure(text="⏹ Stop Profiling")
+            self.profile_status.configure(text=f"Profiling all threads for {self.profiler.default_duration:.0f}s...")
+        else:
+            self.profile_status.configure(text="Stopping profiler...")
+    
+    def _profile_finished(self, path):
+        self.profile_btn.configure(text=f"Profile {self.profiler.default_duration:.0f}s")
+        self.profile_status.configure(text=f"Written to {path}\n{self.profiler.format_cpu_report()}")
+        self.show_notification(f"Profile written to {path}", level='success')
+    
     def load_students_to_tree(self):
         # Load students from students.csv into the student_tree
         try:
@@ -2323,28 +2751,53 @@ class AttendanceGUI:
         tk.Label(add_win, text="End Time (HH:MM):").grid(row=3, column=0, padx=10, pady=5)
         end_var = tk.StringVar()
         tk.Entry(add_win, textvariable=end_var).grid(row=3, column=1, padx=10, pady=5)
+        roster_var = tk.StringVar()
+        self.roster_field(add_win, 4, roster_var)
+        cameras_var = tk.StringVar()
+        self.cameras_field(add_win, 5, cameras_var)
         def save_add():
             name = name_var.get().strip()
             date = date_var.get().strip()
             start = start_var.get().strip()
             end = end_var.get().strip()
+            roster = format_roster(parse_roster(roster_var.get()))
+            cameras = format_roster(parse_roster(cameras_var.get()))
             if not name or not date or not start or not end:
                 messagebox.showerror("Error", "All fields are required.")
                 return
             import pandas as pd
-            if os.path.exists('events.csv'):
-                df = pd.read_csv('events.csv')
-                if ((df['name'] == name) & (df['date'] == date)).any():
-                    messagebox.showerror("Error", "Event with this name and date already exists.")
-                    return
-            else:
-                df = pd.DataFrame(columns=['name', 'date', 'start', 'end'])
-            df = pd.concat([df, pd.DataFrame([{'name': name, 'date': date, 'start': start, 'end': end}])], ignore_index=True)
-            df.to_csv('events.csv', index=False)
+            df = load_events(EVENTS_FILE)
+            if ((df['name'] == name) & (df['date'] == date)).any():
+                messagebox.showerror("Error", "Event with this name and date already exists.")
+                return
+            df = pd.concat([df, pd.DataFrame([{'name': name, 'date': date, 'start': start, 'end': end,
+                                               'roster': roster, 'cameras': cameras}])], ignore_index=True)
+            df.to_csv(EVENTS_FILE, index=False)
             self.load_events_to_tree()
             add_win.destroy()
             self.show_notification("Event added.", level='success')
-        tk.Button(add_win, text="Save", command=save_add).grid(row=4, column=0, columnspan=2, pady=10)
+        tk.Button(add_win, text="Save", command=save_add).grid(row=6, column=0, columnspan=2, pady=10)
+
+    def roster_field(self, win, row, roster_var):
+        # Roster entry for the event dialogs; blank means every registered student
+        tk.Label(win, text="Roster (student IDs):").grid(row=row, column=0, padx=10, pady=5)
+        tk.Entry(win, textvariable=roster_var, width=40).grid(row=row, column=1, padx=10, pady=5)
+        def import_roster():
+            path = filedialog.askopenfilename(parent=win, filetypes=[("Roster", "*.csv *.xlsx"), ("All files", "*.*")])
+            if not path:
+                return
+            try:
+                df = pd.read_excel(path) if path.endswith('.xlsx') else pd.read_csv(path, dtype=str)
+                column = 'student_id' if 'student_id' in df.columns else df.columns[0]
+                roster_var.set(format_roster(parse_roster(';'.join(df[column].dropna().astype(str)))))
+            except Exception as e:
+                messagebox.showerror("Error", f"Could not read roster: {e}", parent=win)
+        tk.Button(win, text="From file...", command=import_roster).grid(row=row, column=2, padx=(0, 10), pady=5)
+
+    def cameras_field(self, win, row, cameras_var):
+        # Monitoring cameras (names from camera_config.json) that belong to this event; blank means all of them
+        tk.Label(win, text="Cameras:").grid(row=row, column=0, padx=10, pady=5)
+        tk.Entry(win, textvariable=cameras_var, width=40).grid(row=row, column=1, padx=10, pady=5)
 
     def edit_event(self):
         # Dialog to edit selected event
@@ -2353,7 +2806,9 @@ class AttendanceGUI:
             self.show_notification("Select an event to edit.", level='warning')
             return
         item = self.event_tree.item(selected[0])
-        old_name, old_date, old_start, old_end = item['values']
+        old_name, old_date, old_start, old_end, _ = item['values']
+        events = load_events(EVENTS_FILE)
+        old_event = events[(events['name'] == old_name) & (events['date'] == old_date)]
         edit_win = tk.Toplevel(self.root)
         edit_win.title("Edit Event")
         edit_win.grab_set()
@@ -2369,16 +2824,21 @@ class AttendanceGUI:
         tk.Label(edit_win, text="End Time (HH:MM):").grid(row=3, column=0, padx=10, pady=5)
         end_var = tk.StringVar(value=old_end)
         tk.Entry(edit_win, textvariable=end_var).grid(row=3, column=1, padx=10, pady=5)
+        roster_var = tk.StringVar(value=old_event['roster'].iloc[0] if len(old_event) else '')
+        self.roster_field(edit_win, 4, roster_var)
+        cameras_var = tk.StringVar(value=old_event['cameras'].iloc[0] if len(old_event) else '')
+        self.cameras_field(edit_win, 5, cameras_var)
         def save_edit():
             name = name_var.get().strip()
             date = date_var.get().strip()
             start = start_var.get().strip()
             end = end_var.get().strip()
+            roster = format_roster(parse_roster(roster_var.get()))
+            cameras = format_roster(parse_roster(cameras_var.get()))
             if not name or not date or not start or not end:
                 messagebox.showerror("Error", "All fields are required.")
                 return
-            import pandas as pd
-            df = pd.read_csv('events.csv')
+            df = load_events(EVENTS_FILE)
             # Prevent duplicate event name/date (except for this row)
             mask = ~((df['name'] == old_name) & (df['date'] == old_date))
             if ((df['name'] == name) & (df['date'] == date) & mask).any():
@@ -2389,11 +2849,13 @@ class AttendanceGUI:
             df.loc[idx, 'date'] = date
             df.loc[idx, 'start'] = start
             df.loc[idx, 'end'] = end
-            df.to_csv('events.csv', index=False)
+            df.loc[idx, 'roster'] = roster
+            df.loc[idx, 'cameras'] = cameras
+            df.to_csv(EVENTS_FILE, index=False)
             self.load_events_to_tree()
             edit_win.destroy()
             self.show_notification("Event updated.", level='success')
-        tk.Button(edit_win, text="Save", command=save_edit).grid(row=4, column=0, columnspan=2, pady=10)
+        tk.Button(edit_win, text="Save", command=save_edit).grid(row=6, column=0, columnspan=2, pady=10)
 
     def delete_event(self):
         # Delete selected event
@@ -2405,11 +2867,10 @@ class AttendanceGUI:
         name, date, *_ = item['values']
         if not messagebox.askyesno("Delete Event", f"Delete event '{name}' on {date}? This cannot be undone."):
             return
-        import pandas as pd
-        df = pd.read_csv('events.csv')
+        df = load_events(EVENTS_FILE)
         idx = (df['name'] == name) & (df['date'] == date)
         df = df[~idx]
-        df.to_csv('events.csv', index=False)
+        df.to_csv(EVENTS_FILE, index=False)
         self.load_events_to_tree()
         self.show_notification("Event deleted.", level='success')
 
@@ -2418,13 +2879,14 @@ class AttendanceGUI:
         try:
             for item in self.event_tree.get_children():
                 self.event_tree.delete(item)
-            if os.path.exists('events.csv'):
-                import pandas as pd
-                df = pd.read_csv('events.csv')
-                for _, row in df.iterrows():
-                    self.event_tree.insert('', 'end', values=(row['name'], row['date'], row['start'], row['end']))
+            df = load_events(EVENTS_FILE)
+            for _, row in df.iterrows():
+                roster = parse_roster(row['roster'])
+                self.event_tree.insert('', 'end', values=(row['name'], row['date'], row['start'], row['end'],
+                                                          len(roster) if roster else 'All'))
         except Exception as e:
             self.show_notification(f"Failed to load events: {str(e)}", level='error')
+        self.arm_event_automation()  # Added, edited or deleted events may move the next window
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -1,8 +1,11 @@
+import signal
 import threading
 import time
 from check_in import CheckInSystem
 from monitor import MonitoringSystem
 from sheets_sync import SheetsSync
+from metrics import serve_from_config
+import profiler
 import os
 import pandas as pd
 
@@ -19,15 +22,24 @@ class AttendanceSystem:
         self.check_in = CheckInSystem()
         self.monitor = MonitoringSystem()
         self.sheets_sync = None  # Optional component
+        self.metrics_server = None
+        self.profiler = profiler.from_config(self.monitor.config)
         
         # Initialize threads
-        self.check_in_thread = threading.Thread(target=self._check_in_loop)
+        self.check_in_thread = threading.Thread(target=self._check_in_loop, name='check-in-rfid')
         self.check_in_thread.daemon = True
     
     def start(self, enable_sheets_sync: bool = False, spreadsheet_name: str = None):
         """Start the attendance system."""
         print("Starting Attendance Monitoring System...")
         
+        # Expose metrics on the local HTTP endpoint if enabled
+        self.metrics_server = serve_from_config(self.monitor.config)
+        
+        # `kill -USR1 <pid>` starts (or stops early) a sampling profile
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, self.toggle_profiler)
+        
         # Start monitoring system
         print("Starting monitoring cameras...")
         self.monitor.start()
@@ -41,16 +53,31 @@ class AttendanceSystem:
             print("Starting Google Sheets sync...")
             self.sheets_sync = SheetsSync()
             if self.sheets_sync.connect(spreadsheet_name):
-                sheets_thread = threading.Thread(target=self.sheets_sync.start_auto_sync)
+                sheets_thread = threading.Thread(target=self.sheets_sync.start_auto_sync, name='sheets-sync')
                 sheets_thread.daemon = True
                 sheets_thread.start()
             else:
                 print("Failed to connect to Google Sheets. Continuing without sync...")
                 self.sheets_sync = None
         
+        if self.check_in.warmup.wait():
+            print(f"Face models loaded in {self.check_in.warmup.timings['total']:.1f}s")
+        
         print("\nSystem is ready!")
         print("Press Ctrl+C to stop the system")
     
+    def toggle_profiler(self, signum=None, frame=None):
+        """Start a sampling profile of all threads, or stop the running one early."""
+        if self.profiler.toggle(on_finish=self._profile_finished):
+            print(f"\nProfiling all threads for {self.profiler.default_duration:.0f}s "
+                  f"(send SIGUSR1 again to stop early)...")
+        else:
+            print("\nStopping profiler...")
+    
+    def _profile_finished(self, path: str, cpu_report):
+        print(f"\nProfile written to {path}")
+        print(self.profiler.format_cpu_report())
+    
     def _check_in_loop(self):
         """Main check-in loop."""
         while True:
@@ -84,12 +111,18 @@ class AttendanceSystem:
         # Stop check-in system
         print("Stopping check-in system...")
         self.check_in.close()
-        
+        for stage, stats in self.check_in.latency_report().items():
+            print(f"  check-in {stage}: n={stats['count']} "
+                  f"p50={stats['p50_ms']:.0f}ms p95={stats['p95_ms']:.0f}ms")
+
         # Stop sheets sync if enabled
         if self.sheets_sync:
             print("Stopping Google Sheets sync...")
             self.sheets_sync.stop()
         
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+        
         print("System stopped successfully!")
 
 if __name__ == "__main__":
@@ -0,0 +1,294 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+# Bucket upper bounds in seconds, tuned for per-frame recognition work
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                           0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Bucket upper bounds for small counts such as faces per frame
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21)
+DEFAULT_METRICS_PORT = 9108
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram, cheap enough for hot loops."""
+    def __init__(self, name: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        # One extra slot for observations above the last bucket (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+    
+    def observe(self, seconds: float):
+        """Record a single observation in seconds."""
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+    
+    @contextmanager
+    def time(self):
+        """Context manager that observes the elapsed wall time of its block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+    
+    def percentile(self, q: float) -> float:
+        """Approximate percentile (0-100) as the upper bound of its bucket."""
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+        if count == 0:
+            return 0.0
+        rank = q / 100.0 * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return float('inf')
+    
+    def summary(self) -> Dict[str, float]:
+        """Return count, mean and approximate p50/p95/p99 in milliseconds."""
+        mean = self.total / self.count if self.count else 0.0
+        return {
+            'count': self.count,
+            'mean_ms': mean * 1000,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'p99_ms': self.percentile(99) * 1000
+        }
+    
+    def snapshot(self) -> Tuple[list, int, float]:
+        """Consistent copy of (bucket counts, count, total)."""
+        with self._lock:
+            return list(self.counts), self.count, self.total
+    
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.total = 0.0
+
+class RateCounter:
+    """Events (or pixels, bytes, ...) per second over a sliding time window."""
+    def __init__(self, name: str, window: float = 10.0):
+        self.name = name
+        self.window = window
+        self.total = 0
+        self._samples = deque()
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def add(self, amount: float = 1):
+        now = time.monotonic()
+        with self._lock:
+            self.total += amount
+            self._samples.append((now, amount))
+            self._trim(now)
+    
+    def _trim(self, now: float):
+        cutoff = now - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+    
+    def rate(self) -> float:
+        """Average rate per second over the window (or since creation, if shorter)."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            elapsed = min(self.window, now - self._started)
+            return sum(amount for _, amount in self._samples) / elapsed if elapsed > 0 else 0.0
+
+class Counter:
+    """Monotonically increasing count, optionally read from a callback at scrape time."""
+    def __init__(self, name: str, func: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.func = func
+        self._value = 0
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+    
+    @property
+    def value(self) -> float:
+        return self.func() if self.func is not None else self._value
+
+class Gauge:
+    """Point-in-time value, either set directly or read from a callback at scrape time."""
+    def __init__(self, name: str, func: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.func = func
+        self._value = 0.0
+    
+    def set(self, value: float):
+        self._value = value
+    
+    @property
+    def value(self) -> float:
+        return self.func() if self.func is not None else self._value
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = '') -> str:
+    parts = ['{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+             for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """Named metric families with labels, rendered in Prometheus text format.
+    
+    Hot paths only touch the metric objects themselves; values that already
+    exist elsewhere (frame counters, gallery size) are registered as
+    callbacks and read only when scraped.
+    """
+    def __init__(self):
+        # name -> (type, help, {sorted label items: metric})
+        self._families: Dict[str, Tuple[str, str, Dict[Tuple, object]]] = {}
+        self._lock = threading.Lock()
+    
+    def _get_or_create(self, kind: str, name: str, help: str, labels: Dict[str, str],
+                       factory: Callable[[], object], replace: bool = False):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            family = self._families.setdefault(name, (kind, help, {}))
+            if family[0] != kind:
+                raise ValueError(f"Metric {name} already registered as a {family[0]}")
+            if replace or key not in family[2]:
+                family[2][key] = factory()
+            return family[2][key]
+    
+    def counter(self, name: str, help: str = '', func: Optional[Callable[[], float]] = None,
+                **labels) -> Counter:
+        """Get or create a counter; passing func (re)binds it to a callback.
+        
+        A callback series is keyed by name and labels, so a later registration
+        with the same labels takes it over (a reloaded object replacing its
+        predecessor). Objects alive side by side need a distinguishing label.
+        """
+        return self._get_or_create('counter', name, help, labels, lambda: Counter(name, func),
+                                   replace=func is not None)
+    
+    def gauge(self, name: str, help: str = '', func: Optional[Callable[[], float]] = None,
+              **labels) -> Gauge:
+        """Get or create a gauge; passing func (re)binds it to a callback.
+        
+        A callback series is keyed by name and labels, so a later registration
+        with the same labels takes it over (a reloaded object replacing its
+        predecessor). Objects alive side by side need a distinguishing label.
+        """
+        return self._get_or_create('gauge', name, help, labels, lambda: Gauge(name, func),
+                                   replace=func is not None)
+    
+    def histogram(self, name: str, help: str = '', buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+                  **labels) -> LatencyHistogram:
+        return self._get_or_create('histogram', name, help, labels, lambda: LatencyHistogram(name, buckets))
+    
+    def unregister(self, name: str, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            if name in self._families:
+                self._families[name][2].pop(key, None)
+    
+    def _collect(self):
+        with self._lock:
+            return [(name, kind, help, list(series.items()))
+                    for name, (kind, help, series) in sorted(self._families.items())]
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for name, kind, help, series in self._collect():
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in series:
+                if kind == 'histogram':
+                    counts, count, total = metric.snapshot()
+                    cumulative = 0
+                    for bound, bucket_count in zip(metric.buckets + (float('inf'),), counts):
+                        cumulative += bucket_count
+                        le = 'le="{}"'.format(_format_value(float(bound)))
+                        lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+                else:
+                    try:
+                        value = metric.value
+                    except Exception:
+                        continue  # Callback owner has gone away
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+    
+    def snapshot(self) -> Dict[str, Dict[Tuple, object]]:
+        """Current values for in-process display: numbers for counters/gauges, summaries for histograms."""
+        result = {}
+        for name, kind, _, series in self._collect():
+            values = {}
+            for labels, metric in series:
+                try:
+                    if kind == 'histogram':
+                        values[labels] = dict(metric.summary(), sum=metric.total)
+                    else:
+                        values[labels] = metric.value
+                except Exception:
+                    continue
+            result[name] = values
+        return result
+
+REGISTRY = MetricsRegistry()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+    
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the console
+
+def serve_metrics(port: int = DEFAULT_METRICS_PORT, host: str = '127.0.0.1',
+                  registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve registry at http://host:port/metrics from a daemon thread."""
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    return server
+
+def serve_from_config(config: dict) -> Optional[ThreadingHTTPServer]:
+    """Start the endpoint if `metrics.enabled` is set in camera_config.json."""
+    options = config.get('metrics', {})
+    if not options.get('enabled', False):
+        return None
+    try:
+        server = serve_metrics(options.get('port', DEFAULT_METRICS_PORT), options.get('host', '127.0.0.1'))
+        print(f"Metrics available at http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+        return server
+    except OSError as e:
+        print(f"Error starting metrics endpoint: {e}")
+        return None
@@ -0,0 +1,165 @@
+"""Re-encode the face gallery with another embedding backend.
+
+Embeddings from dlib and from an ONNX model (or two ONNX models) cannot
+be compared, so switching processing.encoder means re-encoding every
+student from the snapshot saved at registration (faces/<student_id>.jpg).
+
+Examples:
+    python migrate_gallery.py --backend onnx --model models/arcface.onnx           # writes faces_onnx/
+    python migrate_gallery.py --in-place                                           # use processing.encoder as configured
+    python migrate_gallery.py --backend dlib --in-place                            # back to dlib
+
+Without --in-place the new gallery goes to --out (default faces_<backend>)
+and faces/ is untouched. With --in-place the old encodings are first
+moved to faces_backup_<old backend>_<time>/, unless an enrolled student
+could not be re-encoded (no snapshot, or no face found in it): then
+nothing is changed and the students are listed, since replacing faces/
+would un-enroll them. --force replaces it anyway. Templates refreshed
+from sightings have no snapshot and cannot be carried over; the gallery
+relearns them. Afterwards set processing.encoder (and a
+recognition_threshold that suits the backend) in camera_config.json.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from detection import camera_detector
+from encoder import make_embedder
+from gallery import (EMBEDDING_FILE, configured_embedding, describe_embedding, read_embedding,
+                     save_encodings, write_embedding)
+
+SNAPSHOT_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+EMBED_BATCH = 32
+
+def snapshots(faces_dir: str) -> Dict[str, str]:
+    """Registration snapshot path for each student in faces_dir."""
+    found = {}
+    for filename in sorted(os.listdir(faces_dir)):
+        student_id, extension = os.path.splitext(filename)
+        if extension.lower() in SNAPSHOT_EXTENSIONS:
+            found.setdefault(student_id, os.path.join(faces_dir, filename))
+    return found
+
+def target_config(args) -> dict:
+    """camera_config.json with processing.encoder overridden from the command line."""
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    encoder = config.setdefault('processing', {}).setdefault('encoder', {})
+    if args.backend:
+        encoder['backend'] = args.backend
+    if args.model:
+        encoder['model'] = args.model
+    if args.threads is not None:
+        encoder['threads'] = args.threads
+    return config
+
+def backup(faces_dir: str, source: str) -> str:
+    """Move faces_dir's encodings and embedding record into a timestamped backup directory."""
+    backup_dir = f"{faces_dir.rstrip(os.sep)}_backup_{source}_{datetime.now():%Y%m%d_%H%M%S}"
+    os.makedirs(backup_dir)
+    for filename in os.listdir(faces_dir):
+        if filename.endswith('.npy') or filename == EMBEDDING_FILE:
+            shutil.move(os.path.join(faces_dir, filename), os.path.join(backup_dir, filename))
+    return backup_dir
+
+def migrate(args) -> dict:
+    config = target_config(args)
+    target = configured_embedding(config)
+    source = read_embedding(args.faces) or {'backend': 'dlib', 'model': None}
+    embedder = make_embedder(config)
+    processing = config.get('processing', {})
+    detector = camera_detector(config.get('check_in_camera', {}), processing)
+    print(f"Re-encoding {args.faces} from {describe_embedding(source)} to {describe_embedding(target)}")
+    
+    # Align every snapshot's largest face, then embed them in batches
+    aligned: List[Tuple[str, np.ndarray]] = []
+    no_face = []
+    images = snapshots(args.faces)
+    for student_id, path in images.items():
+        frame = cv2.imread(path)
+        if frame is None:
+            no_face.append(student_id)
+            continue
+        locations = detector.detect(frame)
+        if not locations:
+            no_face.append(student_id)
+            continue
+        largest = max(locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]))
+        chips = embedder.align(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), [largest])
+        aligned.extend((student_id, chip) for chip in chips)
+    encodings: Dict[str, np.ndarray] = {}
+    for start in range(0, len(aligned), EMBED_BATCH):
+        batch = aligned[start:start + EMBED_BATCH]
+        for (student_id, _), encoding in zip(batch, embedder.embed([chip for _, chip in batch])):
+            encodings[student_id] = encoding
+    
+    enrolled = {filename[:-4] for filename in os.listdir(args.faces) if filename.endswith('.npy')}
+    if args.in_place:
+        dropped = sorted(enrolled - set(encodings))
+        if dropped and not args.force:
+            raise SystemExit(f"Not replacing {args.faces}: {len(dropped)} enrolled students could not be "
+                             f"re-encoded and would be un-enrolled: {', '.join(dropped)}\n"
+                             f"Register them again, or pass --force to replace it anyway")
+        out_dir = args.faces
+        print(f"Old encodings moved to {backup(args.faces, source['backend'])}")
+    else:
+        out_dir = args.out or f"{args.faces.rstrip(os.sep)}_{target['backend']}"
+        os.makedirs(out_dir, exist_ok=True)
+        for path in images.values():
+            shutil.copy(path, out_dir)  # Keep snapshots beside the encodings for the next migration
+    for student_id, encoding in encodings.items():
+        save_encodings(os.path.join(out_dir, f"{student_id}.npy"), encoding)
+    write_embedding(out_dir, target)
+    
+    # The closest pair of different students bounds a safe recognition_threshold
+    closest = None
+    if len(encodings) > 1:
+        matrix = np.vstack(list(encodings.values()))
+        distances = np.linalg.norm(matrix[:, np.newaxis, :] - matrix[np.newaxis, :, :], axis=2)
+        np.fill_diagonal(distances, np.inf)
+        closest = float(distances.min())
+    return {
+        'out': out_dir,
+        'migrated': len(encodings),
+        'no_face': sorted(no_face),
+        'no_snapshot': sorted(enrolled - set(images)),
+        'size': embedder.size,
+        'closest_pair': closest
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='camera_config.json')
+    parser.add_argument('--faces', default='faces', help='gallery directory to migrate')
+    parser.add_argument('--backend', choices=('dlib', 'onnx'), help='override processing.encoder.backend')
+    parser.add_argument('--model', help='override processing.encoder.model (ONNX file)')
+    parser.add_argument('--threads', type=int, help='override processing.encoder.threads')
+    parser.add_argument('--out', help='directory for the new gallery (default <faces>_<backend>)')
+    parser.add_argument('--in-place', action='store_true', help='replace faces/ after backing it up')
+    parser.add_argument('--force', action='store_true',
+                        help='with --in-place, replace faces/ even if some students could not be re-encoded')
+    args = parser.parse_args()
+    
+    if not os.path.isdir(args.faces):
+        sys.exit(f"No gallery directory {args.faces}")
+    result = migrate(args)
+    print(f"Wrote {result['migrated']} students ({result['size']}-d) to {result['out']}")
+    if result['no_face']:
+        print(f"No face found in the snapshot of {len(result['no_face'])} students: "
+              f"{', '.join(result['no_face'])}")
+    if result['no_snapshot']:
+        print(f"No snapshot for {len(result['no_snapshot'])} enrolled students (register them again): "
+              f"{', '.join(result['no_snapshot'])}")
+    if result['closest_pair'] is not None:
+        print(f"Closest two different students are {result['closest_pair']:.3f} apart; "
+              f"keep recognition_threshold below that")
+
+if __name__ == "__main__":
+    main()
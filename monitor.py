@@ -1,27 +1,39 @@
 import cv2
-import face_recognition
 import json
 import numpy as np
 import os
-import pandas as pd
 import threading
 import time
 from datetime import datetime
-from queue import Queue
-from typing import Dict, List, Optional, Tuple
+from queue import Queue, Empty, Full
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from camera_sources import open_capture, is_live
+from detection import DetectionRegion, FaceDetector, camera_detector, detect_faces, detection_scale, warm_up
+from edge import EdgeReceiver, EdgeSender
+from encoder import BatchEncoder
+from events import DEFAULT_LEAD_TIME, DEFAULT_WIND_DOWN, EVENTS_FILE, EventCalendar
+from gallery import FaceGallery, MatchCache
+from metrics import COUNT_BUCKETS, REGISTRY, RateCounter, serve_from_config
+from sessions import Session, SessionTable
+from scheduler import DeadlineScheduler
+from voting import IdentityVoter
 
 class CameraStream:
-    def __init__(self, source: int, name: str, resolution: Tuple[int, int], fps: int):
+    def __init__(self, source: Union[int, str, dict], name: str, resolution: Tuple[int, int], fps: int,
+                 replay: Optional[str] = None):
         self.name = name
-        self.cap = cv2.VideoCapture(source)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, resolution[0])
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, resolution[1])
-        self.cap.set(cv2.CAP_PROP_FPS, fps)
+        self.cap = open_capture(source, resolution, fps, replay)
         self.frame_queue = Queue(maxsize=1)
+        # Max-speed replays hand over every frame; live cameras drop stale ones
+        self.lossless = not is_live(self.cap) and getattr(self.cap, 'replay', None) == 'max'
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.finished = False
         self.stopped = False
-        
+    
     def start(self):
-        thread = threading.Thread(target=self._update, args=())
+        thread = threading.Thread(target=self._update, args=(), name=f"camera-{self.name}")
         thread.daemon = True
         thread.start()
         return self
@@ -33,18 +45,33 @@ class CameraStream:
             
             ret, frame = self.cap.read()
             if not ret:
+                self.finished = True
                 self.stop()
                 return
+            self.frames_captured += 1
+            
+            if self.lossless:
+                while not self.stopped:
+                    try:
+                        self.frame_queue.put(frame, timeout=0.1)
+                        break
+                    except Full:
+                        continue
+                continue
             
             if not self.frame_queue.empty():
                 try:
                     self.frame_queue.get_nowait()
-                except Queue.Empty:
+                    self.frames_dropped += 1
+                except Empty:
                     pass
             self.frame_queue.put(frame)
     
     def read(self) -> Optional[np.ndarray]:
-        return self.frame_queue.get() if not self.frame_queue.empty() else None
+        try:
+            return self.frame_queue.get_nowait()
+        except Empty:
+            return None
     
     def stop(self):
         self.stopped = True
@@ -52,131 +79,570 @@ class CameraStream:
 
 class MonitoringSystem:
     def __init__(self, config_path: str = 'camera_config.json',
-                 faces_dir: str = 'faces'):
+                 faces_dir: str = 'faces', replay: Optional[str] = None):
         # Load configuration
         with open(config_path, 'r') as f:
             self.config = json.load(f)
         
         self.faces_dir = faces_dir
+        self.replay = replay
         self.cameras: Dict[str, CameraStream] = {}
+        self.regions: Dict[str, DetectionRegion] = {}
+        self.detectors: Dict[str, FaceDetector] = {}
+        self.detection_scales: Dict[str, float] = {}
+        self.pixel_rates: Dict[str, RateCounter] = {}
+        self.detection_periods: Dict[str, float] = {}
+        self.scheduler = DeadlineScheduler()
         self.known_face_encodings: Dict[str, np.ndarray] = {}
         self.known_face_ids: List[str] = []
-        self.frame_count = 0
+        self.gallery = FaceGallery()
+        self.last_seen: Dict[str, datetime] = {}
+        # With events.auto_start the cameras only run around scheduled events
+        events = self.config.get('events', {})
+        self.auto_start = events.get('auto_start', False)
+        self.lead_time = events.get('lead_time', DEFAULT_LEAD_TIME)
+        # Attendance per running event (or the default session), all sharing these cameras and gallery
+        self.sessions = SessionTable(self.config, self.gallery, lead=self.lead_time)
+        self.calendar: Optional[EventCalendar] = None
+        self._calendar_mtime: Optional[float] = None
+        self.cameras_running = False
+        self.listeners: List[Callable[[dict], None]] = []
+        self.frames_processed = 0
+        self.recognition_latency = REGISTRY.histogram(
+            'recognition_seconds', 'End-to-end recognition time per processed frame')
+        self.stage_latency = {
+            stage: REGISTRY.histogram('recognition_stage_seconds', 'Time per recognition stage', stage=stage)
+            for stage in ('detect', 'align', 'encode', 'match')
+        }
+        self.faces_per_frame = REGISTRY.histogram(
+            'faces_per_frame', 'Faces detected per processed frame', COUNT_BUCKETS)
+        self.flush_latency = {
+            target: REGISTRY.histogram('attendance_flush_seconds', 'Time to write the attendance log',
+                                       component=f"monitor_{target}")
+            for target in ('last_seen', 'status', 'log')
+        }
+        REGISTRY.counter('frames_processed_total', 'Frames run through recognition',
+                         func=lambda: self.frames_processed)
         self.stopped = False
+        # Faces from every camera are aligned per frame and embedded in shared batches
+        self.encoder = BatchEncoder.from_config(self.config)
+        # A face is named only after several frames of its track agree; attendance is written on changes
+        self.voter = IdentityVoter.from_config(self.config)
+        REGISTRY.counter('identity_confirmations_total', 'Students confirmed by a face track',
+                         func=lambda: self.voter.confirmations)
+        REGISTRY.counter('identity_releases_total', 'Students released by a face track',
+                         func=lambda: self.voter.releases)
+        
+        # standalone: match locally; edge: detect + encode only and stream embeddings
+        # to the central node; central: also match embeddings streamed from edge nodes
+        self.role = self.config.get('edge', {}).get('role', 'standalone')
+        self.edge_sender = EdgeSender.from_config(self.config) if self.role == 'edge' else None
+        self.edge_receiver = EdgeReceiver.from_config(self.config) if self.role == 'central' else None
+        self.edge_latency = REGISTRY.histogram(
+            'edge_match_delay_seconds', 'Time from encoding on an edge node to matching on the central node')
         
         # Initialize cameras
         self._setup_cameras()
         
-        # Load known face encodings
-        self._load_face_encodings()
+        # Load known face encodings (edge nodes never match, so they need no gallery)
+        if self.role != 'edge':
+            self._load_face_encodings()
         
         # Start monitoring thread
-        self.monitor_thread = threading.Thread(target=self._monitor_loop)
+        self.monitor_thread = threading.Thread(target=self._monitor_loop, name='monitor')
         self.monitor_thread.daemon = True
     
     def _setup_cameras(self):
         """Initialize all monitoring cameras."""
+        processing = self.config['processing']
+        self.upsample = processing.get('upsample', 1)
         for cam_config in self.config['monitoring_cameras']:
-            camera = CameraStream(
-                source=cam_config['source'],
-                name=cam_config['name'],
-                resolution=cam_config['resolution'],
-                fps=cam_config['fps']
-            )
-            self.cameras[cam_config['name']] = camera
+            self._open_camera(cam_config)
+    
+    def _open_camera(self, cam_config: dict) -> CameraStream:
+        """Open one monitoring camera and register its detection settings and metrics."""
+        processing = self.config['processing']
+        camera = CameraStream(
+            source=cam_config['source'],
+            name=cam_config['name'],
+            resolution=cam_config['resolution'],
+            fps=cam_config['fps'],
+            replay=self.replay
+        )
+        self.cameras[cam_config['name']] = camera
+        # Only scan the camera's region of interest with the camera's detector backend,
+        # at the smallest scale that still resolves min_face_size (per camera, else global)
+        min_face_size = cam_config.get('min_face_size', processing['min_face_size'])
+        self.regions[camera.name] = DetectionRegion(cam_config.get('roi'))
+        if camera.name not in self.detectors:
+            self.detectors[camera.name] = camera_detector(cam_config, processing)
+        detector = self.detectors[camera.name]
+        self.detection_scales[camera.name] = detection_scale(min_face_size, self.upsample, detector=detector)
+        self.pixel_rates[camera.name] = RateCounter(f"{camera.name}_pixels")
+        REGISTRY.counter('frames_captured_total', 'Frames read from the camera',
+                         func=lambda camera=camera: camera.frames_captured, camera=camera.name)
+        REGISTRY.counter('frames_dropped_total', 'Stale frames replaced before being processed',
+                         func=lambda camera=camera: camera.frames_dropped, camera=camera.name)
+        REGISTRY.counter('detection_pixels_total', 'Pixels scanned by the face detector',
+                         func=lambda counter=self.pixel_rates[camera.name]: counter.total,
+                         camera=camera.name)
+        # Target detection rate: per-camera detection_rate (Hz) or face_detection_interval
+        rate = cam_config.get('detection_rate')
+        self.detection_periods[camera.name] = 1.0 / rate if rate else processing['face_detection_interval']
+        return camera
     
     def _load_face_encodings(self):
         """Load pre-computed face encodings for checked-in students."""
-        for filename in os.listdir(self.faces_dir):
-            if filename.endswith('.npy'):
-                student_id = filename[:-4]  # Remove .npy extension
-                encoding_path = os.path.join(self.faces_dir, filename)
-                self.known_face_encodings[student_id] = np.load(encoding_path)
-                self.known_face_ids.append(student_id)
+        self.gallery = FaceGallery.from_config(self.config, self.faces_dir)
+        # Sessions match rosters against sub-galleries of this gallery, not the empty placeholder
+        self.sessions.gallery = self.gallery
+        self.match_cache = MatchCache.from_config(self.gallery, self.config, component='monitor')
+        self.known_face_encodings = dict(self.gallery.templates)
+        self.known_face_ids = list(self.gallery.templates)
+        REGISTRY.gauge('gallery_students', 'Students in the face gallery', func=lambda: len(self.gallery),
+                       component='monitor')
+        REGISTRY.gauge('gallery_templates', 'Face templates in the gallery',
+                       func=lambda: self.gallery.template_count, component='monitor')
     
     def start(self):
         """Start the monitoring system."""
-        # Start camera streams
-        for camera in self.cameras.values():
-            camera.start()
+        # Start camera streams and per-camera detection, now or around each scheduled event
+        if self.auto_start:
+            self.scheduler.add('event_window', self.config['events'].get('check_interval', 5.0),
+                               self._follow_calendar)
+        else:
+            self._start_cameras()
+        
+        # Schedule wall-clock periodic tasks
+        if self.edge_sender is not None:
+            self.edge_sender.start()
+        else:
+            # Edge nodes leave the gallery and attendance log to the central node
+            update_interval = self.config['logging']['update_interval']
+            self._sync_sessions()  # Resumes each session from its log
+            self.scheduler.add('attendance_log', update_interval, self._periodic_write,
+                               start_delay=update_interval)
+            events = self.config.get('events', {})
+            self.scheduler.add('event', events.get('roster_refresh', 60), self._sync_sessions)
+            self.scheduler.add('absence', self.config.get('presence', {}).get('absence_check', 1.0),
+                               self._expire_absences)
+        self.scheduler.add('encode', self.encoder.max_latency, self._flush_encoder)
+        if self.edge_receiver is not None:
+            self.edge_receiver.start()
+            self.scheduler.add('match_edge', self.config['edge'].get('match_interval', 0.05), self._match_edge)
         
         # Start monitoring thread
         self.monitor_thread.start()
     
+    def _start_cameras(self):
+        """Start capture and detection on every camera, reopening any stopped earlier."""
+        for cam_config in self.config['monitoring_cameras']:
+            camera = self.cameras.get(cam_config['name'])
+            if camera is None or camera.stopped:
+                camera = self._open_camera(cam_config)
+            camera.start()
+            self.scheduler.add(f"detect:{camera.name}", self.detection_periods[camera.name],
+                               lambda camera=camera: self._process_camera(camera))
+        self.cameras_running = True
+    
+    def _stop_cameras(self):
+        """Stop detection and release the cameras until the next event."""
+        for name, camera in self.cameras.items():
+            self.scheduler.remove(f"detect:{name}")
+            camera.stop()
+        self.cameras_running = False
+    
+    def _follow_calendar(self):
+        """Bring the cameras up lead_time before each event and down after its wind-down."""
+        try:
+            mtime = os.path.getmtime(EVENTS_FILE) if os.path.exists(EVENTS_FILE) else None
+            if self.calendar is None or mtime != self._calendar_mtime:
+                events = self.config.get('events', {})
+                self.calendar = EventCalendar.load(EVENTS_FILE, lead=self.lead_time,
+                                                   wind_down=events.get('wind_down', DEFAULT_WIND_DOWN))
+                self._calendar_mtime = mtime
+        except Exception as e:
+            print(f"Error reading events: {e}")
+            return
+        events, until = self.calendar.plan()
+        if events and not self.cameras_running:
+            names = ', '.join(str(event['name']) for event in events)
+            print(f"Starting monitoring for {names} (until {until:%H:%M})")
+            # Pre-warm during the lead time: roster sub-galleries, match index and models
+            if self.role != 'edge':
+                self._sync_sessions()
+                self.gallery.warm()
+                self.sessions.warm()
+            for detector in set(self.detectors.values()) or [None]:
+                warm_up(upsample=self.upsample, detector=detector, embedder=self.encoder.embedder)
+            self._start_cameras()
+        elif not events and self.cameras_running:
+            print("Event over; monitoring idle" + (f" until {until:%Y-%m-%d %H:%M}" if until else ""))
+            self._stop_cameras()
+    
     def _monitor_loop(self):
-        """Main monitoring loop."""
+        """Main monitoring loop: run due tasks, then sleep until the next deadline."""
         while not self.stopped:
-            self.frame_count += 1
-            
-            # Process every Nth frame as specified in config
-            if self.frame_count % self.config['processing']['skip_frames'] != 0:
+            try:
+                wait = self.scheduler.run_pending()
+            except Exception as e:
+                print(f"Error in monitoring loop: {e}")
+                wait = 0.5
+            time.sleep(min(wait, 0.5))
+    
+    def _process_camera(self, camera: CameraStream) -> bool:
+        """Detect faces in the camera's latest frame and queue them for encoding; False if none is ready."""
+        frame = camera.read()
+        if frame is None:
+            return False
+        started = time.perf_counter()
+        seen = datetime.now()
+        self.frames_processed += 1
+        try:
+            self._recognise(camera, frame, started, seen)
+        except Exception:
+            self.recognition_latency.observe(time.perf_counter() - started)
+            raise
+        return True
+    
+    def _flush_encoder(self):
+        """Embed the faces queued from every camera as one batch, then match each frame's faces."""
+        if self.encoder.flush():
+            self.stage_latency['encode'].observe(self.encoder.last_seconds)
+    
+    def add_listener(self, listener: Callable[[dict], None]):
+        """Call listener(event) from the monitor thread for every processed frame.
+        
+        Events look like {"type": "detection", "camera": ..., "timestamp": ...,
+        "faces": [{"student_id": ..., "distance": ..., "location": [top, right,
+        bottom, left]}, ...]}; student_id is None for unknown faces.
+        Listeners must return quickly.
+        """
+        self.listeners.append(listener)
+    
+    def remove_listener(self, listener: Callable[[dict], None]):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+    
+    def _emit(self, event: dict):
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Error in detection listener: {e}")
+    
+    def present_students(self, timeout: float = 60.0) -> Dict[str, datetime]:
+        """Students recognised on any camera within the last timeout seconds."""
+        now = datetime.now()
+        return {sid: seen for sid, seen in list(self.last_seen.items())
+                if (now - seen).total_seconds() <= timeout}
+    
+    def _recognise(self, camera: CameraStream, frame: np.ndarray, started: float, seen: datetime):
+        """Detect faces in the frame and hand them to the encoder; matching finishes in _recognised."""
+        # Find faces in the camera's region of interest
+        with self.stage_latency['detect'].time():
+            face_locations, pixels = detect_faces(
+                frame, self.regions[camera.name],
+                self.detection_scales[camera.name], detector=self.detectors[camera.name]
+            )
+        self.pixel_rates[camera.name].add(pixels)
+        self.faces_per_frame.observe(len(face_locations))
+        if not face_locations:
+            released = []
+            if self.edge_sender is None:
+                # Tracks of faces that have gone end after max_age
+                _, _, _, released = self.voter.update(camera.name, [], [], seen.timestamp())
+                self._write_changes(camera.name, released)
+            self._finish_frame(camera.name, seen, started, [], released=released)
+            return
+        
+        # Align the faces now; they are embedded with other frames' faces in the encoder's next batch
+        with self.stage_latency['align'].time():
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            frame_number = self.frames_processed
+            full = self.encoder.submit(rgb_frame, face_locations, lambda face_encodings: self._recognised(
+                camera.name, frame_number, seen, started, face_locations, face_encodings))
+        if full:
+            self._flush_encoder()
+    
+    def _recognised(self, camera: str, frame_number: int, seen: datetime, started: float,
+                    face_locations: List[Tuple[int, int, int, int]], face_encodings: np.ndarray):
+        """Match a frame's encoded faces, vote on their tracks and update attendance for confirmed students."""
+        if self.edge_sender is not None:
+            # Matching happens on the central node
+            timestamp = seen.timestamp()
+            for location, face_encoding in zip(face_locations, face_encodings):
+                self.edge_sender.submit(camera, frame_number, timestamp, location, face_encoding)
+            self._finish_frame(camera, seen, started, [
+                {'student_id': None, 'distance': None, 'location': list(location)} for location in face_locations])
+            return
+        
+        # Compare with known faces: rosters of this camera's sessions, then everyone
+        tolerance = self.config['processing']['recognition_threshold']
+        with self.stage_latency['match'].time():
+            matches = self.sessions.match(
+                camera, face_encodings, tolerance,
+                lambda encodings: [self.match_cache.match(encoding, tolerance) for encoding in encodings]
+            )
+        identities, tracks, confirmed, released = self.voter.update(
+            camera, face_locations, [student_id for student_id, _ in matches], seen.timestamp())
+        faces = []
+        for location, face_encoding, (student_id, distance), identity, track in zip(
+                face_locations, face_encodings, matches, identities, tracks):
+            if identity is not None:
+                self._see(camera, identity, seen)
+                if student_id == identity:
+                    # Keep templates fresh from confident sightings the track agrees with
+                    self.gallery.add_sighting(student_id, face_encoding, distance)
+            faces.append({
+                'student_id': identity,
+                'distance': round(distance, 4) if np.isfinite(distance) else None,
+                'location': list(location),
+                'track': track
+            })
+        self._write_changes(camera, confirmed + released)
+        self._finish_frame(camera, seen, started, faces, confirmed, released)
+    
+    def _see(self, camera: str, student_id: str, seen: datetime):
+        """Credit a confirmed sighting to the camera's sessions (in memory; the log is written on changes)."""
+        # A batch can finish an earlier frame after a later one from another camera
+        if seen > self.last_seen.get(student_id, datetime.min):
+            self.last_seen[student_id] = seen
+        self.sessions.see(camera, student_id, seen)
+    
+    def _write_changes(self, camera: str, student_ids: List[str]):
+        """Write the rows of students a track confirmed or released, one rewrite per session of the camera."""
+        if not student_ids:
+            return
+        for session in self.sessions.for_camera(camera):
+            changed = [student_id for student_id in student_ids if student_id in session.last_seen]
+            if changed:
+                self._update_last_seen_batch(session, changed)
+    
+    def _finish_frame(self, camera: str, seen: datetime, started: float, faces: List[dict],
+                      confirmed: List[str] = (), released: List[str] = ()):
+        """Record the frame's end-to-end latency (including any wait for a batch) and emit its detection event."""
+        self.recognition_latency.observe(time.perf_counter() - started)
+        if self.listeners:
+            self._emit({
+                'type': 'detection',
+                'camera': camera,
+                'timestamp': seen.isoformat(timespec='milliseconds'),
+                'faces': faces,
+                'confirmed': list(confirmed),
+                'released': list(released)
+            })
+    
+    def _match_edge(self) -> bool:
+        """Match embedding batches streamed from edge nodes; False if none are waiting."""
+        batches = self.edge_receiver.drain()
+        if not batches:
+            return False
+        tolerance = self.config['processing']['recognition_threshold']
+        changes: Dict[str, List[str]] = {}
+        for meta, encodings in batches:
+            if not meta['items']:
                 continue
-            
-            # Process each camera feed
-            for camera in self.cameras.values():
-                frame = camera.read()
-                if frame is None:
-                    continue
-                
-                # Find faces in frame
-                face_locations = face_recognition.face_locations(frame)
-                if not face_locations:
-                    continue
-                
-                # Get face encodings
-                face_encodings = face_recognition.face_encodings(frame, face_locations)
-                
-                # Compare with known faces
-                for face_encoding in face_encodings:
-                    matches = face_recognition.compare_faces(
-                        [self.known_face_encodings[id] for id in self.known_face_ids],
-                        face_encoding,
-                        tolerance=self.config['processing']['recognition_threshold']
-                    )
-                    
-                    if True in matches:
-                        student_id = self.known_face_ids[matches.index(True)]
-                        self._update_last_seen(student_id)
-            
-            # Update attendance log periodically
-            if self.frame_count % (self.config['processing']['skip_frames'] * 
-                                 self.config['logging']['update_interval']) == 0:
-                self._write_attendance_log()
+            node = meta.get('node', 'edge')
+            events: Dict[Tuple[str, int], dict] = {}
+            encodings = encodings.astype(np.float64)
+            # One pass over the gallery per camera in the batch (a single quantized scan when enabled)
+            cameras: Dict[str, List[int]] = {}
+            for index, item in enumerate(meta['items']):
+                cameras.setdefault(f"{node}/{item[0]}", []).append(index)
+            matches: List[Tuple[Optional[str], float]] = [None] * len(encodings)
+            with self.stage_latency['match'].time():
+                for label, rows in cameras.items():
+                    found = self.sessions.match(label, encodings[rows], tolerance,
+                                                lambda pending: self.gallery.match_many(pending, tolerance=tolerance))
+                    for index, result in zip(rows, found):
+                        matches[index] = result
+            # Each edge frame votes on its camera's tracks like a local one
+            frames: Dict[Tuple[str, int], List[int]] = {}
+            for index, item in enumerate(meta['items']):
+                frames.setdefault((item[0], item[1]), []).append(index)
+            identities: List[Optional[str]] = [None] * len(encodings)
+            tracks: List[int] = [0] * len(encodings)
+            for (camera, frame), rows in frames.items():
+                label = f"{node}/{camera}"
+                found, ids, confirmed, released = self.voter.update(
+                    label, [meta['items'][index][3:7] for index in rows], [matches[index][0] for index in rows],
+                    meta['items'][rows[0]][2])
+                for index, identity, track in zip(rows, found, ids):
+                    identities[index], tracks[index] = identity, track
+                changes.setdefault(label, []).extend(confirmed + released)
+                events[(camera, frame)] = {
+                    'type': 'detection',
+                    'camera': label,
+                    'timestamp': datetime.fromtimestamp(meta['items'][rows[0]][2]).isoformat(timespec='milliseconds'),
+                    'faces': [],
+                    'confirmed': confirmed,
+                    'released': released
+                }
+            for item, face_encoding, (student_id, distance), identity, track in zip(
+                    meta['items'], encodings, matches, identities, tracks):
+                camera, frame, timestamp, location = item[0], item[1], item[2], item[3:7]
+                self.edge_latency.observe(max(0.0, time.time() - timestamp))
+                if identity is not None:
+                    # Batches from different nodes can arrive out of order
+                    self._see(f"{node}/{camera}", identity, datetime.fromtimestamp(timestamp))
+                    if student_id == identity:
+                        self.gallery.add_sighting(student_id, face_encoding, distance)
+                events[(camera, frame)]['faces'].append({
+                    'student_id': identity,
+                    'distance': round(distance, 4) if np.isfinite(distance) else None,
+                    'location': list(location),
+                    'track': track
+                })
+            if self.listeners:
+                for event in events.values():
+                    self._emit(event)
+        # One attendance rewrite per session for the changes across all batches
+        for label, student_ids in changes.items():
+            self._write_changes(label, list(dict.fromkeys(student_ids)))
+        return True
+    
+    def _sync_sessions(self):
+        """Open a session for each event that is starting and close (write out) those that ended."""
+        opened, closed = self.sessions.sync()
+        for session in closed:
+            self._write_session_log(session)
+            print(f"Session {session.id} closed")
+        for session in opened:
+            rooms = ', '.join(sorted(session.cameras)) if session.cameras else 'all cameras'
+            roster = f"{len(session.roster)} students" if session.roster else 'everyone'
+            print(f"Session {session.id} opened ({rooms}; roster: {roster})")
+    
+    def _expire_absences(self):
+        """Mark students unseen for absent_after as LEFT_EARLY and emit a status event for each."""
+        now = datetime.now()
+        for session in self.sessions:
+            due = session.absence.pop_due(now.timestamp())  # Only heap tops are examined
+            if not due:
+                continue
+            try:
+                with self.flush_latency['status'].time():
+                    df = session.read_log()
+                    idx = df['student_id'].astype(str).isin(due) & (df['status'] != 'LEFT_EARLY')
+                    changed = df.loc[idx, 'student_id'].astype(str).tolist()
+                    if changed:
+                        df.loc[idx, 'status'] = 'LEFT_EARLY'
+                        session.write_log(df)
+            except Exception as e:
+                print(f"Error updating attendance status: {e}")
+                continue
+            for student_id in changed:
+                self._emit({'type': 'status', 'session': session.id, 'student_id': student_id,
+                            'status': 'LEFT_EARLY', 'timestamp': now.isoformat(timespec='seconds')})
+    
+    def _periodic_write(self):
+        """Update attendance log and refreshed templates on the logging interval."""
+        self._write_attendance_log()
+        self.gallery.save_dirty(self.faces_dir)
     
-    def _update_last_seen(self, student_id: str):
-        """Update last seen time for a student."""
+    def streams_finished(self) -> bool:
+        """True once every recorded (non-live) source has reached its end."""
+        return all(camera.finished for camera in self.cameras.values())
+    
+    def detection_rate_report(self) -> Dict[str, Dict[str, float]]:
+        """Achieved vs target detection rate per camera."""
+        stats = self.scheduler.stats()
+        return {name: stats[f"detect:{name}"] for name in self.cameras if f"detect:{name}" in stats}
+    
+    def pixel_rate_report(self) -> Dict[str, float]:
+        """Pixels handed to the face detector per second, per camera."""
+        return {name: counter.rate() for name, counter in self.pixel_rates.items()}
+    
+    def _update_last_seen_batch(self, session: Session, student_ids):
+        """Write the last seen times and presence totals of several students with a single rewrite of a session's log."""
         try:
-            df = pd.read_excel('attendance.xlsx')
-            if student_id in df['student_id'].values:
-                df.loc[df['student_id'] == student_id, 'last_seen_time'] = datetime.now()
-                df.to_excel('attendance.xlsx', index=False)
+            with self.flush_latency['last_seen'].time():
+                df = session.read_log()
+                if self._apply_last_seen(session, df, student_ids):
+                    session.write_log(df)
         except Exception as e:
             print(f"Error updating last seen time: {e}")
     
+    def _apply_last_seen(self, session: Session, df, student_ids) -> bool:
+        """Copy the session's last seen times and presence totals into df's rows; False if none matched."""
+        ids = df['student_id'].astype(str)
+        updated = False
+        for student_id in student_ids:
+            idx = ids == student_id
+            if idx.any():
+                df.loc[idx, 'last_seen_time'] = session.last_seen.get(student_id, datetime.now())
+                df.loc[idx, 'total_time_present'] = session.presence.total_time(student_id)
+                updated = True
+        return updated
+    
     def _write_attendance_log(self):
-        """Write current attendance state to Excel."""
+        """Write every open session's attendance log with statuses brought up to date."""
+        for session in self.sessions:
+            self._write_session_log(session)
+    
+    def _write_session_log(self, session: Session):
+        changed = []
         try:
-            df = pd.read_excel('attendance.xlsx')
-            df.to_excel('attendance.xlsx', index=False)
+            with self.flush_latency['log'].time():
+                df = session.read_log()
+                # Students still held by a track were last written when confirmed
+                self._apply_last_seen(session, df, [student_id for student_id in self.voter.confirmed()
+                                                    if student_id in session.last_seen])
+                changed = session.status_engine.apply(df)
+                session.write_log(df)
         except Exception as e:
             print(f"Error writing attendance log: {e}")
+            return
+        now = datetime.now().isoformat(timespec='seconds')
+        statuses = dict(zip(df['student_id'].astype(str), df['status'])) if changed else {}
+        for student_id in changed:
+            self._emit({'type': 'status', 'session': session.id, 'student_id': student_id,
+                        'status': statuses[student_id], 'timestamp': now})
     
     def stop(self):
         """Stop the monitoring system."""
         self.stopped = True
-        for camera in self.cameras.values():
-            camera.stop()
+        self._stop_cameras()
+        if self.monitor_thread.is_alive():
+            self.monitor_thread.join(timeout=2.0)
+        self._flush_encoder()  # Faces still waiting for a batch
+        if self.edge_receiver is not None:
+            self.edge_receiver.stop()
+        if self.edge_sender is not None:
+            self.edge_sender.stop()  # Flush queued embeddings to the central node
+            return
         
-        # Write final attendance log
+        # Write final attendance log and refreshed templates
         self._write_attendance_log()
+        self.gallery.save_dirty(self.faces_dir)
 
 if __name__ == "__main__":
     # Test the monitoring system
     monitor = MonitoringSystem()
     try:
+        serve_from_config(monitor.config)
         monitor.start()
         while True:
-            time.sleep(1)  # Keep main thread alive
+            time.sleep(10)  # Keep main thread alive
+            rates = monitor.detection_rate_report()
+            for name, rate in monitor.pixel_rate_report().items():
+                stats = rates.get(name, {})
+                print(f"{name}: {rate / 1e6:.2f} Mpixels/s scanned, "
+                      f"{stats.get('achieved_hz', 0):.1f}/{stats.get('target_hz', 0):.1f} detections/s, "
+                      f"{stats.get('skipped', 0)} skipped")
+            encoder = monitor.encoder.report()
+            print(f"Encoder: {encoder['embeddings_per_second']:.1f} embeddings/s, "
+                  f"{encoder['mean_batch']:.1f} faces per batch")
+            if monitor.role != 'edge':
+                print(f"Voting: {monitor.voter.confirmations} identities confirmed, "
+                      f"{monitor.voter.releases} released, {len(monitor.voter.confirmed())} held now")
+                cache = monitor.match_cache.savings()
+                print(f"Match cache: {cache['hit_rate'] * 100:.0f}% hits "
+                      f"({cache['hit_mean_ms']:.2f}ms vs {cache['miss_mean_ms']:.2f}ms), {cache['saved_ms']:.0f}ms saved")
+                for session in monitor.sessions:
+                    if session.roster:
+                        print(f"Session {session.id}: {session.roster_hit_rate * 100:.0f}% of matches "
+                              f"answered by {len(session.roster)} expected students")
     except KeyboardInterrupt:
         monitor.stop()
         print("\nMonitoring system closed") 
\ No newline at end of file
@@ -0,0 +1,221 @@
+import heapq
+import pandas as pd
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+# Sightings closer together than this (seconds) belong to one continuous stay
+DEFAULT_GAP_TOLERANCE = 300.0
+# Closed intervals kept per student; older ones are folded into the running total
+DEFAULT_MAX_INTERVALS = 64
+# Unseen this long (seconds) and a present student is marked LEFT_EARLY
+DEFAULT_ABSENT_AFTER = 1800.0
+
+Timestamp = Union[datetime, float]
+
+def _seconds(when: Timestamp) -> float:
+    return when.timestamp() if isinstance(when, datetime) else float(when)
+
+def format_duration(seconds: float) -> str:
+    """Duration in the attendance log's `H:MM:SS` format."""
+    return str(timedelta(seconds=int(seconds)))
+
+def parse_duration(text) -> float:
+    """Seconds from a total_time_present cell such as `1:02:03`; 0 if empty or unreadable."""
+    value = pd.to_timedelta(str(text), errors='coerce')
+    return 0.0 if pd.isna(value) else max(0.0, value.total_seconds())
+
+class PresenceTimeline:
+    """One student's sightings merged into presence intervals.
+    
+    A sighting within gap_tolerance of the previous one extends the open
+    interval; a longer gap closes it and opens a new one, so time spent
+    away is not credited. Closed intervals live in two flat float arrays
+    (epoch seconds) and the total is kept as a running sum. Only the last
+    max_intervals closed intervals are kept; older ones survive in the
+    total. Sightings older than the open interval (late edge batches) are
+    ignored.
+    """
+    __slots__ = ('gap_tolerance', 'max_intervals', 'starts', 'ends', 'closed_seconds',
+                 'open_start', 'last_seen', 'sightings')
+    
+    def __init__(self, gap_tolerance: float = DEFAULT_GAP_TOLERANCE, max_intervals: int = DEFAULT_MAX_INTERVALS):
+        self.gap_tolerance = gap_tolerance
+        self.max_intervals = max_intervals
+        self.starts = array('d')
+        self.ends = array('d')
+        self.closed_seconds = 0.0
+        self.open_start: Optional[float] = None
+        self.last_seen: Optional[float] = None
+        self.sightings = 0
+    
+    def add(self, when: Timestamp) -> bool:
+        """Record a sighting; returns True if it started a new interval."""
+        t = _seconds(when)
+        self.sightings += 1
+        if self.last_seen is None:
+            self.open_start = self.last_seen = t
+            return True
+        if t <= self.last_seen:
+            return False
+        if t - self.last_seen <= self.gap_tolerance:
+            self.last_seen = t
+            return False
+        self._close()
+        self.open_start = self.last_seen = t
+        return True
+    
+    def _close(self):
+        self.starts.append(self.open_start)
+        self.ends.append(self.last_seen)
+        self.closed_seconds += self.last_seen - self.open_start
+        if len(self.starts) >= 2 * self.max_intervals:
+            # Trim in halves so the amortized cost of an append stays O(1)
+            del self.starts[:self.max_intervals]
+            del self.ends[:self.max_intervals]
+    
+    def total_seconds(self) -> float:
+        """Time present: closed intervals plus the open one up to the last sighting."""
+        if self.open_start is None:
+            return self.closed_seconds
+        return self.closed_seconds + (self.last_seen - self.open_start)
+    
+    def intervals(self) -> Iterator[Tuple[datetime, datetime]]:
+        """Retained intervals, oldest first, including the open one."""
+        for start, end in zip(self.starts, self.ends):
+            yield datetime.fromtimestamp(start), datetime.fromtimestamp(end)
+        if self.open_start is not None:
+            yield datetime.fromtimestamp(self.open_start), datetime.fromtimestamp(self.last_seen)
+    
+    @property
+    def nbytes(self) -> int:
+        return self.starts.itemsize * (len(self.starts) + len(self.ends))
+
+class PresenceTracker:
+    """Presence timelines for every student seen during a monitoring session."""
+    def __init__(self, gap_tolerance: float = DEFAULT_GAP_TOLERANCE, max_intervals: int = DEFAULT_MAX_INTERVALS):
+        self.gap_tolerance = gap_tolerance
+        self.max_intervals = max_intervals
+        self.timelines: Dict[str, PresenceTimeline] = {}
+    
+    @classmethod
+    def from_config(cls, config: dict) -> 'PresenceTracker':
+        """Tracker using the `presence` section of camera_config.json."""
+        options = config.get('presence', {})
+        return cls(options.get('gap_tolerance', DEFAULT_GAP_TOLERANCE),
+                   options.get('max_intervals', DEFAULT_MAX_INTERVALS))
+    
+    def __len__(self) -> int:
+        return len(self.timelines)
+    
+    def __contains__(self, student_id: str) -> bool:
+        return student_id in self.timelines
+    
+    def resume(self, student_id: str, credited_seconds: float, last_seen: Timestamp) -> PresenceTimeline:
+        """Start a timeline from a log row written earlier (e.g. before a restart)."""
+        timeline = PresenceTimeline(self.gap_tolerance, self.max_intervals)
+        timeline.closed_seconds = credited_seconds
+        timeline.add(last_seen)
+        self.timelines[student_id] = timeline
+        return timeline
+    
+    def see(self, student_id: str, when: Timestamp) -> PresenceTimeline:
+        timeline = self.timelines.get(student_id)
+        if timeline is None:
+            timeline = self.timelines[student_id] = PresenceTimeline(self.gap_tolerance, self.max_intervals)
+        timeline.add(when)
+        return timeline
+    
+    def total_seconds(self, student_id: str) -> float:
+        timeline = self.timelines.get(student_id)
+        return timeline.total_seconds() if timeline is not None else 0.0
+    
+    def total_time(self, student_id: str) -> str:
+        """total_time_present for the attendance log."""
+        return format_duration(self.total_seconds(student_id))
+    
+    def intervals(self, student_id: str) -> List[Tuple[datetime, datetime]]:
+        timeline = self.timelines.get(student_id)
+        return list(timeline.intervals()) if timeline is not None else []
+    
+    def clear(self):
+        self.timelines.clear()
+    
+    @property
+    def nbytes(self) -> int:
+        """Bytes held in interval arrays, the part that grows over a session."""
+        return sum(timeline.nbytes for timeline in self.timelines.values())
+    
+    def resume_from_log(self, df, absence: Optional['ExpiryQueue'] = None,
+                        absent_after: float = DEFAULT_ABSENT_AFTER) -> int:
+        """Continue from an attendance log's totals and last sightings; returns the timelines started.
+        
+        With absence given, each resumed student is queued to expire
+        absent_after seconds after their last sighting, as if just seen.
+        """
+        if df is None or df.empty or 'student_id' not in df.columns:
+            return 0
+        credited = df['total_time_present'].map(parse_duration) if 'total_time_present' in df.columns \
+            else pd.Series(0.0, index=df.index)
+        since = pd.to_datetime(df['check_in_time'], errors='coerce')
+        if 'last_seen_time' in df.columns:
+            since = pd.to_datetime(df['last_seen_time'], errors='coerce').fillna(since)
+        resumed = 0
+        for student_id, seconds, seen in zip(df['student_id'].astype(str), credited, since):
+            if pd.isna(seen) or student_id in self.timelines:
+                continue
+            timeline = self.resume(student_id, seconds, seen.to_pydatetime())
+            if absence is not None:
+                absence.touch(student_id, timeline.last_seen + absent_after)
+            resumed += 1
+        return resumed
+
+class ExpiryQueue:
+    """Min-heap of per-student deadlines, e.g. when an unseen student counts as gone.
+    
+    touch() only records the new (later) deadline in a dict, which is
+    O(1); when the student's old heap entry reaches the top it is pushed
+    back at the recorded deadline in O(log n). The heap therefore holds
+    about one entry per tracked student however often they are seen, and
+    pop_due() returns each student exactly once, when their deadline passes.
+    """
+    def __init__(self):
+        self.deadlines: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+    
+    def __len__(self) -> int:
+        return len(self.deadlines)
+    
+    def __contains__(self, student_id: str) -> bool:
+        return student_id in self.deadlines
+    
+    def touch(self, student_id: str, deadline: float):
+        """Set (or push back) a student's deadline."""
+        current = self.deadlines.get(student_id)
+        self.deadlines[student_id] = deadline
+        if current is None or deadline < current:
+            heapq.heappush(self._heap, (deadline, student_id))
+    
+    def discard(self, student_id: str):
+        self.deadlines.pop(student_id, None)  # Its heap entry is skipped when it surfaces
+    
+    def next_deadline(self) -> Optional[float]:
+        """Earliest deadline in the heap (possibly one that will be pushed back), or None."""
+        while self._heap and self._heap[0][1] not in self.deadlines:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+    
+    def pop_due(self, now: float) -> List[str]:
+        """Students whose deadline is at or before now, removed from the queue."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, student_id = heapq.heappop(self._heap)
+            current = self.deadlines.get(student_id)
+            if current is None or current < deadline:
+                continue  # Discarded, or a duplicate left behind by an earlier deadline
+            if current > deadline:
+                heapq.heappush(self._heap, (current, student_id))  # Seen again since
+                continue
+            del self.deadlines[student_id]
+            due.append(student_id)
+        return due
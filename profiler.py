@@ -0,0 +1,171 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_INTERVAL = 0.01
+DEFAULT_DURATION = 30.0
+DEFAULT_OUTPUT_DIR = 'profiles'
+# Deep recursion is rare here; cap stack walks so one sample stays cheap
+MAX_STACK_DEPTH = 128
+
+def thread_cpu_time(thread: threading.Thread) -> Optional[float]:
+    """CPU seconds consumed by a thread, or None where per-thread clocks are unavailable."""
+    if thread.ident is None or not hasattr(time, 'pthread_getcpuclockid'):
+        return None
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+    except (OSError, ValueError):
+        return None  # Thread exited between enumerate() and the clock read
+
+class SamplingProfiler:
+    """Statistical profiler that samples every thread's stack at a fixed interval.
+    
+    A single sampler thread reads sys._current_frames() every interval
+    seconds and counts each thread's call stack, so the profiled code runs
+    unmodified and the cost is one stack walk per thread per sample.
+    Results are written in the collapsed-stack format read by
+    flamegraph.pl and speedscope, one "thread;outer;...;inner count" line
+    per distinct stack.
+    """
+    def __init__(self, interval: float = DEFAULT_INTERVAL, output_dir: str = DEFAULT_OUTPUT_DIR,
+                 default_duration: float = DEFAULT_DURATION):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.default_duration = default_duration
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.elapsed = 0.0
+        self.cpu_report: Dict[str, Dict[str, float]] = {}
+        self._cpu_start: Dict[int, Tuple[str, float]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._on_finish: Optional[Callable[[str, Dict[str, Dict[str, float]]], None]] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self, duration: Optional[float] = None,
+              on_finish: Optional[Callable[[str, Dict[str, Dict[str, float]]], None]] = None) -> bool:
+        """Start sampling for duration seconds (default_duration if None, 0 = until stop()).
+        
+        on_finish(path, cpu_report) is called from the sampler thread once
+        the profile has been written. Returns False if a profile is already
+        running.
+        """
+        with self._lock:
+            if self.running:
+                return False
+            self.stacks = Counter()
+            self.samples = 0
+            self.cpu_report = {}
+            self._cpu_start = {}
+            for thread in threading.enumerate():
+                cpu = thread_cpu_time(thread)
+                if cpu is not None:
+                    self._cpu_start[thread.ident] = (thread.name, cpu)
+            self._on_finish = on_finish
+            self._stop.clear()
+            self.started_at = time.monotonic()
+            if duration is None:
+                duration = self.default_duration
+            self._thread = threading.Thread(target=self._run, args=(duration,),
+                                            name='profiler-sampler', daemon=True)
+            self._thread.start()
+            return True
+    
+    def stop(self):
+        """Stop sampling early; the profile is still written."""
+        self._stop.set()
+    
+    def toggle(self, duration: Optional[float] = None, on_finish=None) -> bool:
+        """Start if idle, otherwise stop; returns True if this call started a profile."""
+        if self.running:
+            self.stop()
+            return False
+        return self.start(duration, on_finish)
+    
+    def _run(self, duration: float):
+        own_ident = threading.get_ident()
+        deadline = self.started_at + duration if duration > 0 else None
+        next_sample = time.monotonic()
+        while not self._stop.is_set():
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            self._sample(own_ident)
+            next_sample += self.interval
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_sample = time.monotonic()  # Fell behind; don't burst to catch up
+        self.elapsed = time.monotonic() - self.started_at
+        self.cpu_report = self._measure_cpu()
+        path = self.write()
+        if self._on_finish is not None:
+            try:
+                self._on_finish(path, self.cpu_report)
+            except Exception as e:
+                print(f"Error in profiler callback: {e}")
+    
+    def _sample(self, own_ident: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack: List[str] = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stack.reverse()
+            self.stacks[';'.join(stack)] += 1
+        self.samples += 1
+    
+    def _measure_cpu(self) -> Dict[str, Dict[str, float]]:
+        """CPU seconds and share of one core per thread over the profile window."""
+        report = {}
+        wall = self.elapsed or 1e-9
+        for thread in threading.enumerate():
+            cpu = thread_cpu_time(thread)
+            if cpu is None:
+                continue
+            _, start = self._cpu_start.get(thread.ident, (thread.name, 0.0))
+            used = cpu - start
+            report[thread.name] = {'cpu_seconds': used, 'cpu_percent': 100.0 * used / wall}
+        return report
+    
+    def collapsed(self) -> str:
+        """Collapsed stacks, one `frame;frame;... count` line per distinct stack."""
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+    
+    def write(self, path: Optional[str] = None) -> str:
+        """Write collapsed stacks (and a per-thread CPU summary alongside) and return the path."""
+        if path is None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded")
+        with open(path, 'w') as f:
+            f.write(self.collapsed())
+        with open(os.path.splitext(path)[0] + '-threads.txt', 'w') as f:
+            f.write(self.format_cpu_report())
+        return path
+    
+    def format_cpu_report(self) -> str:
+        lines = [f"{self.samples} samples over {self.elapsed:.1f}s at {self.interval * 1000:.0f}ms"]
+        for name, usage in sorted(self.cpu_report.items(), key=lambda item: -item[1]['cpu_seconds']):
+            lines.append(f"{name:30s} {usage['cpu_seconds']:8.2f}s cpu {usage['cpu_percent']:6.1f}%")
+        return '\n'.join(lines) + '\n'
+
+def from_config(config: dict) -> SamplingProfiler:
+    """Profiler using the `profiling` section of camera_config.json."""
+    options = config.get('profiling', {})
+    return SamplingProfiler(options.get('interval_ms', DEFAULT_INTERVAL * 1000) / 1000.0,
+                            options.get('output_dir', DEFAULT_OUTPUT_DIR),
+                            options.get('duration', DEFAULT_DURATION))
@@ -0,0 +1,70 @@
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+REPORT_COLUMNS = ['student_id', 'name', 'check_in_time', 'last_seen_time', 'status', 'total_time_present']
+STATUSES = ['PRESENT', 'LATE', 'LEFT_EARLY', 'ABSENT']
+
+def prepare_report(df: pd.DataFrame, selected_date: Optional[str] = None,
+                   selected_status: str = 'ALL') -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """Filter the attendance log for the report view and count statuses.
+    
+    Returns the latest entry per student for selected_date (YYYY-MM-DD) and
+    selected_status, plus the count of each status among those rows.
+    """
+    df = df.copy()
+    # Add missing columns if needed
+    for col in REPORT_COLUMNS:
+        if col not in df.columns:
+            if col == 'status':
+                df[col] = 'ABSENT'
+            elif col == 'total_time_present':
+                df[col] = '0:00:00'
+            else:
+                df[col] = ''
+    
+    # Convert timestamps
+    df['check_in_time'] = pd.to_datetime(df['check_in_time'], errors='coerce')
+    df['last_seen_time'] = pd.to_datetime(df['last_seen_time'], errors='coerce')
+    
+    # Apply date filter
+    if selected_date:
+        df = df[df['check_in_time'].dt.strftime('%Y-%m-%d') == selected_date]
+    
+    # Apply status filter
+    if selected_status != "ALL":
+        df = df[df['status'] == selected_status]
+    
+    # Remove duplicates keeping the latest entry for each student
+    df = df.sort_values('check_in_time').drop_duplicates('student_id', keep='last')
+    
+    status_counts = {status: 0 for status in STATUSES}
+    for status in df['status'].fillna('ABSENT'):
+        if status in status_counts:
+            status_counts[status] += 1
+    return df, status_counts
+
+def report_rows(df: pd.DataFrame) -> List[Tuple[str, str, str, str, str, str]]:
+    """Format prepared report rows as (id, name, check-in, last seen, status, total time) strings."""
+    rows = []
+    for _, row in df.iterrows():
+        status = row.get('status', 'ABSENT')
+        if pd.isnull(status) or status == '':
+            status = 'ABSENT'
+        
+        # Format timestamps
+        check_in = row.get('check_in_time', '')
+        last_seen = row.get('last_seen_time', '')
+        if pd.notnull(check_in):
+            check_in = check_in.strftime('%Y-%m-%d %H:%M:%S')
+        if pd.notnull(last_seen):
+            last_seen = last_seen.strftime('%Y-%m-%d %H:%M:%S')
+        
+        # Format total_time_present to remove days
+        total_time = str(row.get('total_time_present', '0:00:00'))
+        if 'day' in total_time:
+            # Remove 'X days' prefix
+            total_time = total_time.split(',')[-1].strip()
+        
+        rows.append((str(row.get('student_id', '')), str(row.get('name', '')),
+                     check_in, last_seen, status, total_time))
+    return rows
@@ -0,0 +1,99 @@
+import heapq
+import itertools
+import time
+from typing import Callable, Dict, List, Optional
+
+from metrics import RateCounter
+
+class ScheduledTask:
+    """A job that runs on wall-clock deadlines at a fixed target period."""
+    def __init__(self, name: str, period: float, func: Callable[[], Optional[bool]]):
+        self.name = name
+        self.period = period
+        self.func = func
+        self.deadline = 0.0
+        self.runs = RateCounter(f"{name}_runs")
+        self.skipped = 0
+        self.last_duration = 0.0
+    
+    @property
+    def target_rate(self) -> float:
+        return 1.0 / self.period if self.period > 0 else 0.0
+
+class DeadlineScheduler:
+    """Min-heap of task deadlines run from a single worker thread.
+    
+    A task that falls behind is not allowed to catch up: missed slots are
+    counted as skipped and its next deadline moves to one period after it
+    actually ran, so overload sheds work instead of queueing it. A task
+    returning False (e.g. no frame ready yet) is retried after retry_delay
+    without counting as a run. Period 0 runs a task as often as the loop
+    allows (once per run_pending call).
+    """
+    def __init__(self, retry_delay: float = 0.01):
+        self.retry_delay = retry_delay
+        self.tasks: Dict[str, ScheduledTask] = {}
+        self._heap: List = []
+        self._sequence = itertools.count()
+    
+    def add(self, name: str, period: float, func: Callable[[], Optional[bool]],
+            start_delay: float = 0.0) -> ScheduledTask:
+        """Schedule func every period seconds, first run after start_delay."""
+        task = ScheduledTask(name, period, func)
+        task.deadline = time.monotonic() + start_delay
+        self.tasks[name] = task
+        heapq.heappush(self._heap, (task.deadline, next(self._sequence), task))
+        return task
+    
+    def run_pending(self) -> float:
+        """Run every due task at most once and return seconds until the next deadline."""
+        ran = set()
+        while self._heap:
+            deadline, _, task = self._heap[0]
+            now = time.monotonic()
+            if deadline > now:
+                return deadline - now
+            if task.name in ran:
+                return 0.0  # Everything due has had its turn; let the caller check for stop
+            heapq.heappop(self._heap)
+            if self.tasks.get(task.name) is not task:
+                continue  # Removed or replaced
+            started = time.monotonic()
+            try:
+                result = task.func()
+            except Exception as e:
+                print(f"Error in scheduled task {task.name}: {e}")
+                result = None
+            finished = time.monotonic()
+            ran.add(task.name)
+            task.last_duration = finished - started
+            if result is False:
+                task.deadline = finished + self.retry_delay
+            else:
+                task.runs.add()
+                # Skip missed slots rather than running them back to back
+                late = started - deadline
+                if task.period <= 0:
+                    task.deadline = started
+                elif late > task.period:
+                    task.skipped += int(late // task.period)
+                    task.deadline = started + task.period
+                else:
+                    task.deadline = deadline + task.period
+            heapq.heappush(self._heap, (task.deadline, next(self._sequence), task))
+        return float('inf')
+    
+    def remove(self, name: str):
+        self.tasks.pop(name, None)
+    
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Target vs achieved rate (Hz), skipped slots and last run time per task."""
+        return {
+            name: {
+                'target_hz': task.target_rate,
+                'achieved_hz': task.runs.rate(),
+                'skipped': task.skipped,
+                'last_ms': task.last_duration * 1000
+            }
+            for name, task in self.tasks.items()
+        }
@@ -0,0 +1,381 @@
+"""Headless recognition service with a local HTTP and WebSocket API.
+
+Run with `python service.py`. Endpoints (JSON unless noted):
+    GET  /health                  cameras, gallery size and stream clients
+    GET  /presence                students recognised within presence_timeout
+    GET  /presence/<student_id>   one student's presence
+    POST /check-in                {"student_id": "..."} -> {"success": ..., "message": ...}
+    GET  /metrics                 Prometheus text format
+    GET  /ws/detections           WebSocket stream of detection and status events
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import socket
+import struct
+import urllib.error
+import urllib.request
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import pandas as pd
+
+from metrics import REGISTRY
+from monitor import MonitoringSystem
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_PRESENCE_TIMEOUT = 60.0
+# Events buffered per WebSocket client; a slow client loses the oldest ones
+DEFAULT_CLIENT_QUEUE = 64
+MAX_BODY = 64 * 1024
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+WS_TEXT, WS_CLOSE, WS_PING, WS_PONG = 0x1, 0x8, 0x9, 0xA
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                409: 'Conflict', 413: 'Payload Too Large', 503: 'Service Unavailable'}
+
+def _ws_accept(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+
+def _ws_frame(payload: bytes, opcode: int = WS_TEXT, mask: bool = False) -> bytes:
+    """Encode a single unfragmented WebSocket frame (clients must mask, servers must not)."""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 1 << 16:
+        header.append(mask_bit | 126)
+        header += struct.pack('!H', length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack('!Q', length)
+    if not mask:
+        return bytes(header) + payload
+    key = os.urandom(4)
+    return bytes(header) + key + bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+
+def _ws_unmask(payload: bytes, key: bytes) -> bytes:
+    return bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+
+async def _ws_read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    first, second = await reader.readexactly(2)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    if length > MAX_BODY:
+        raise ValueError("WebSocket frame too large")
+    key = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    return opcode, _ws_unmask(payload, key) if key else payload
+
+class RecognitionService:
+    """Runs MonitoringSystem (and CheckInSystem) headless behind an asyncio HTTP/WebSocket server.
+    
+    Recognition stays on the monitor's own threads; the event loop only
+    serves requests and fans detection events out to WebSocket clients,
+    each through a bounded queue so one slow viewer cannot stall the rest.
+    """
+    def __init__(self, config_path: str = 'camera_config.json', faces_dir: str = 'faces',
+                 students_path: str = 'students.csv', enable_check_in: bool = True):
+        with open(config_path, 'r') as f:
+            self.config = json.load(f)
+        options = self.config.get('service', {})
+        self.host = options.get('host', DEFAULT_HOST)
+        self.port = options.get('port', DEFAULT_PORT)
+        self.presence_timeout = options.get('presence_timeout', DEFAULT_PRESENCE_TIMEOUT)
+        self.client_queue_size = options.get('client_queue_size', DEFAULT_CLIENT_QUEUE)
+        
+        self.student_names: Dict[str, str] = {}
+        if os.path.exists(students_path):
+            students = pd.read_csv(students_path)
+            self.student_names = dict(zip(students['student_id'].astype(str), students['name']))
+        
+        self.monitor = MonitoringSystem(config_path, faces_dir)
+        self.monitor.add_listener(self._on_detection)
+        self.check_in = None
+        if enable_check_in:
+            try:
+                from check_in import CheckInSystem
+                self.check_in = CheckInSystem(config_path, students_path, faces_dir)
+            except Exception as e:
+                print(f"Check-in unavailable: {e}")
+        
+        self._clients: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.base_events.Server] = None
+        self.events_dropped = REGISTRY.counter('service_events_dropped_total',
+                                               'Detection events dropped for slow stream clients')
+        REGISTRY.gauge('service_stream_clients', 'Connected detection stream clients',
+                       func=lambda: len(self._clients))
+    
+    def _on_detection(self, event: dict):
+        """Monitor-thread listener: add names and hand the event to the event loop."""
+        if event.get('type') == 'status':
+            event['name'] = self.student_names.get(event['student_id'])
+        for face in event.get('faces', []):
+            face['name'] = self.student_names.get(face['student_id']) if face['student_id'] else None
+        if self._loop is not None and self._clients:
+            self._loop.call_soon_threadsafe(self._broadcast, event)
+    
+    def _broadcast(self, event: dict):
+        message = json.dumps(event)
+        for queue in list(self._clients):
+            if queue.full():
+                queue.get_nowait()
+                self.events_dropped.inc()
+            queue.put_nowait(message)
+    
+    def presence(self) -> list:
+        return [
+            {'student_id': sid, 'name': self.student_names.get(sid), 'last_seen': seen.isoformat(timespec='seconds')}
+            for sid, seen in sorted(self.monitor.present_students(self.presence_timeout).items())
+        ]
+    
+    def student_presence(self, student_id: str) -> dict:
+        seen = self.monitor.last_seen.get(student_id)
+        present = seen is not None and (datetime.now() - seen).total_seconds() <= self.presence_timeout
+        return {
+            'student_id': student_id,
+            'name': self.student_names.get(student_id),
+            'present': present,
+            'last_seen': seen.isoformat(timespec='seconds') if seen else None
+        }
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').strip()
+            if not request_line:
+                return
+            method, target, _ = request_line.split(' ', 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            path = urlparse(target).path.rstrip('/') or '/'
+            
+            if path == '/ws/detections' and headers.get('upgrade', '').lower() == 'websocket':
+                await self._stream(reader, writer, headers)
+                return
+            
+            length = int(headers.get('content-length', 0))
+            if length > MAX_BODY:
+                await self._respond(writer, 413, {'error': 'request body too large'})
+                return
+            body = await reader.readexactly(length) if length else b''
+            status, payload = await self._route(method, path, body)
+            await self._respond(writer, status, payload)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"Error handling request: {e}")
+            try:
+                await self._respond(writer, 400, {'error': str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+    
+    async def _route(self, method: str, path: str, body: bytes):
+        if path == '/health' and method == 'GET':
+            return 200, {
+                'status': 'ok',
+                'cameras': list(self.monitor.cameras),
+                'gallery_size': len(self.monitor.gallery),
+                'check_in': self.check_in is not None,
+                'stream_clients': len(self._clients)
+            }
+        if path == '/presence' and method == 'GET':
+            return 200, {'present': self.presence(), 'timeout': self.presence_timeout}
+        if path.startswith('/presence/') and method == 'GET':
+            return 200, self.student_presence(path[len('/presence/'):])
+        if path == '/metrics' and method == 'GET':
+            return 200, REGISTRY.render()
+        if path == '/check-in':
+            if method != 'POST':
+                return 405, {'error': 'use POST'}
+            if self.check_in is None:
+                return 503, {'error': 'check-in is not available on this service'}
+            student_id = str(json.loads(body or b'{}').get('student_id', '')).strip()
+            if not student_id:
+                return 400, {'error': 'student_id is required'}
+            loop = asyncio.get_running_loop()
+            success, message = await loop.run_in_executor(None, self.check_in.process_check_in, student_id)
+            return (200 if success else 409), {'success': success, 'message': message}
+        return 404, {'error': f"no route for {method} {path}"}
+    
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload):
+        if isinstance(payload, str):
+            body, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            body, content_type = json.dumps(payload).encode('utf-8'), 'application/json'
+        writer.write(
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+    
+    async def _stream(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, headers: dict):
+        """Upgrade to a WebSocket and push detection events until the client goes away."""
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {_ws_accept(headers.get('sec-websocket-key', ''))}\r\n\r\n".encode('latin-1')
+        )
+        await writer.drain()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.client_queue_size)
+        self._clients.add(queue)
+        
+        async def send_events():
+            while True:
+                writer.write(_ws_frame((await queue.get()).encode('utf-8')))
+                await writer.drain()
+        
+        async def read_control():
+            while True:
+                opcode, payload = await _ws_read_frame(reader)
+                if opcode == WS_CLOSE:
+                    writer.write(_ws_frame(payload[:2], WS_CLOSE))
+                    await writer.drain()
+                    return
+                if opcode == WS_PING:
+                    writer.write(_ws_frame(payload, WS_PONG))
+                    await writer.drain()
+        
+        tasks = [asyncio.ensure_future(send_events()), asyncio.ensure_future(read_control())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._clients.discard(queue)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def serve(self):
+        """Start recognition and serve the API until cancelled."""
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.monitor.start()
+        print(f"Recognition service listening on http://{self.host}:{self.port}")
+        async with self._server:
+            await self._server.serve_forever()
+    
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+    
+    def stop(self):
+        self.monitor.stop()
+        if self.check_in is not None:
+            self.check_in.close()
+
+class ServiceClient:
+    """Blocking client for a RecognitionService, usable from worker threads."""
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self._socket: Optional[socket.socket] = None
+    
+    def _request(self, path: str, payload: Optional[dict] = None) -> dict:
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = urllib.request.Request(self.url + path, data=data,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return json.loads(e.read() or b'{}')
+    
+    def health(self) -> dict:
+        return self._request('/health')
+    
+    def presence(self) -> list:
+        return self._request('/presence')['present']
+    
+    def check_in(self, student_id: str) -> Tuple[bool, str]:
+        result = self._request('/check-in', {'student_id': student_id})
+        return result.get('success', False), result.get('message', result.get('error', ''))
+    
+    def stream_detections(self) -> Iterator[dict]:
+        """Yield detection events until the connection closes or close() is called."""
+        parsed = urlparse(self.url)
+        sock = socket.create_connection((parsed.hostname, parsed.port or 80), timeout=self.timeout)
+        self._socket = sock
+        key = base64.b64encode(os.urandom(16)).decode()
+        sock.sendall(
+            f"GET /ws/detections HTTP/1.1\r\nHost: {parsed.netloc}\r\n"
+            "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode('latin-1')
+        )
+        stream = sock.makefile('rb')
+        status = stream.readline().decode('latin-1')
+        if ' 101 ' not in status:
+            raise ConnectionError(f"WebSocket upgrade refused: {status.strip()}")
+        while stream.readline().strip():
+            pass  # Skip response headers
+        sock.settimeout(None)
+        try:
+            while True:
+                header = stream.read(2)
+                if len(header) < 2:
+                    return
+                opcode, length = header[0] & 0x0F, header[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack('!H', stream.read(2))[0]
+                elif length == 127:
+                    length = struct.unpack('!Q', stream.read(8))[0]
+                payload = stream.read(length)
+                if opcode == WS_CLOSE:
+                    return
+                if opcode == WS_PING:
+                    sock.sendall(_ws_frame(payload, WS_PONG, mask=True))
+                elif opcode == WS_TEXT:
+                    yield json.loads(payload)
+        except OSError:
+            return  # Closed from another thread
+        finally:
+            self.close()
+    
+    def close(self):
+        if self._socket is not None:
+            try:
+                self._socket.sendall(_ws_frame(struct.pack('!H', 1000), WS_CLOSE, mask=True))
+            except OSError:
+                pass
+            self._socket.close()
+            self._socket = None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='camera_config.json')
+    parser.add_argument('--host', help='override service.host')
+    parser.add_argument('--port', type=int, help='override service.port')
+    parser.add_argument('--no-check-in', action='store_true', help='run recognition only')
+    args = parser.parse_args()
+    
+    service = RecognitionService(args.config, enable_check_in=not args.no_check_in)
+    if args.host:
+        service.host = args.host
+    if args.port:
+        service.port = args.port
+    service.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from events import DEFAULT_LEAD_TIME, EVENTS_FILE, active_events, load_events, parse_roster
+from gallery import FaceGallery
+from presence import DEFAULT_ABSENT_AFTER, ExpiryQueue, PresenceTracker
+from report import REPORT_COLUMNS
+from status import StatusEngine
+
+# Attendance outside scheduled events, and every log written before sessions existed
+DEFAULT_SESSION = 'default'
+DEFAULT_LOG = 'attendance.xlsx'
+# One attendance log per event: sessions/<date>/<event>.xlsx
+SESSIONS_DIR = 'sessions'
+
+Match = Tuple[Optional[str], float]
+
+def session_id(event) -> str:
+    """Partition key of an events.csv row: `<date>/<event name as a file name>`."""
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', str(event['name'])).strip('-').lower() or 'event'
+    return f"{event['date']}/{slug}"
+
+def session_log_path(sid: str) -> str:
+    if sid == DEFAULT_SESSION:
+        return DEFAULT_LOG
+    return os.path.join(SESSIONS_DIR, *sid.split('/')) + '.xlsx'
+
+def list_sessions(date: str) -> List[str]:
+    """Sessions with a log on date (YYYY-MM-DD); only that day's directory is listed."""
+    directory = os.path.join(SESSIONS_DIR, date)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(f"{date}/{name[:-5]}" for name in os.listdir(directory) if name.endswith('.xlsx'))
+
+def read_session_log(sid: str) -> pd.DataFrame:
+    """One session's attendance log; other sessions' files are never opened."""
+    path = session_log_path(sid)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    return pd.read_excel(path)
+
+def write_session_log(sid: str, df: pd.DataFrame):
+    path = session_log_path(sid)
+    if sid != DEFAULT_SESSION:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_excel(path, index=False)
+
+def check_in_sessions(events: List[dict], student_id: str) -> List[str]:
+    """Sessions a check-in belongs to: running events that expect the student, else the default log."""
+    sids = [session_id(event) for event in events
+            if not parse_roster(event.get('roster')) or student_id in parse_roster(event.get('roster'))]
+    return sids or [DEFAULT_SESSION]
+
+class Session:
+    """Attendance state of one event: its cameras, roster, presence timelines, status rules and log."""
+    def __init__(self, sid: str, status_engine: StatusEngine, cameras: Optional[List[str]] = None,
+                 roster: Optional[List[str]] = None, presence: Optional[PresenceTracker] = None,
+                 absent_after: float = DEFAULT_ABSENT_AFTER):
+        self.id = sid
+        self.status_engine = status_engine
+        self.cameras = set(cameras) if cameras else None  # None: every camera
+        self.roster = roster or None
+        self._expected = set(self.roster) if self.roster else None
+        self.presence = presence if presence is not None else PresenceTracker()
+        self.absence = ExpiryQueue()
+        self.absent_after = absent_after
+        self.last_seen: Dict[str, datetime] = {}
+        self.roster_hits = 0
+        self.roster_misses = 0
+        self._view: Optional[FaceGallery] = None
+        self._view_source: Optional[FaceGallery] = None
+        self._view_version = -1
+    
+    def __repr__(self) -> str:
+        return f"Session({self.id!r})"
+    
+    @property
+    def roster_hit_rate(self) -> float:
+        total = self.roster_hits + self.roster_misses
+        return self.roster_hits / total if total else 0.0
+    
+    def covers(self, camera: str) -> bool:
+        return self.cameras is None or camera in self.cameras
+    
+    def expects(self, student_id: str) -> bool:
+        return self._expected is None or student_id in self._expected
+    
+    def view(self, gallery: FaceGallery) -> Optional[FaceGallery]:
+        """The roster's enrolled students as a sub-gallery, or None without a roster."""
+        if self.roster is None:
+            return None
+        if self._view is None or self._view_source is not gallery or self._view_version != gallery.version:
+            self._view = gallery.subset(self.roster)
+            self._view_source = gallery
+            self._view_version = gallery.version
+        return self._view if len(self._view) else None
+    
+    def see(self, student_id: str, when: datetime):
+        if when > self.last_seen.get(student_id, datetime.min):
+            self.last_seen[student_id] = when
+        self.presence.see(student_id, when)
+        self.absence.touch(student_id, when.timestamp() + self.absent_after)
+    
+    def read_log(self) -> pd.DataFrame:
+        return read_session_log(self.id)
+    
+    def write_log(self, df: pd.DataFrame):
+        write_session_log(self.id, df)
+
+class SessionTable:
+    """The sessions open right now: one per running event, or the default session between events.
+    
+    Every session shares the cameras' detection and encoding and the one
+    face gallery; matching, presence, status rules and the attendance log
+    are kept per session, so concurrent events in different rooms never
+    write over each other's rows. An event's `cameras` column limits it
+    to those cameras (edge cameras are named `node/camera`).
+    """
+    def __init__(self, config: dict, gallery: FaceGallery, lead: float = DEFAULT_LEAD_TIME,
+                 path: str = EVENTS_FILE):
+        self.config = config
+        self.gallery = gallery
+        self.lead = lead
+        self.path = path
+        self.absent_after = config.get('presence', {}).get('absent_after', DEFAULT_ABSENT_AFTER)
+        self.sessions: Dict[str, Session] = {}
+        self._by_camera: Dict[str, List[Session]] = {}
+    
+    def __iter__(self) -> Iterator[Session]:
+        return iter(list(self.sessions.values()))
+    
+    def __len__(self) -> int:
+        return len(self.sessions)
+    
+    def get(self, sid: str) -> Optional[Session]:
+        return self.sessions.get(sid)
+    
+    def sync(self, now: Optional[datetime] = None) -> Tuple[List[Session], List[Session]]:
+        """Open sessions for events starting within lead and close those that ended; returns (opened, closed)."""
+        now = datetime.now() if now is None else now
+        try:
+            events = active_events(load_events(self.path), now, self.lead)
+        except Exception as e:
+            print(f"Error reading events: {e}")
+            return [], []
+        wanted: Dict[str, Optional[dict]] = {session_id(event): event for event in events}
+        if not wanted:
+            wanted[DEFAULT_SESSION] = None
+            default = self.sessions.get(DEFAULT_SESSION)
+            if default is not None:
+                # Outside scheduled events statuses use the GUI's default 09:00-17:00 window for today
+                engine = self._default_engine(now)
+                if (engine.start, engine.end) != (default.status_engine.start, default.status_engine.end):
+                    default.status_engine = engine
+        closed = [self.sessions.pop(sid) for sid in list(self.sessions) if sid not in wanted]
+        opened = [self._open(sid, event, now) for sid, event in wanted.items() if sid not in self.sessions]
+        for session in opened:
+            self.sessions[session.id] = session
+        if opened or closed:
+            self._by_camera = {}
+        return opened, closed
+    
+    def _default_engine(self, now: datetime) -> StatusEngine:
+        return StatusEngine.from_strings(now.strftime('%Y-%m-%d'), absent_after=self.absent_after)
+    
+    def _open(self, sid: str, event: Optional[dict], now: datetime) -> Session:
+        if event is None:
+            session = Session(sid, self._default_engine(now), presence=PresenceTracker.from_config(self.config),
+                              absent_after=self.absent_after)
+        else:
+            session = Session(sid, StatusEngine.from_event(event, absent_after=self.absent_after),
+                              parse_roster(event.get('cameras')), parse_roster(event.get('roster')),
+                              PresenceTracker.from_config(self.config), self.absent_after)
+        try:
+            # Carry on from totals already in the log (earlier run or restart)
+            session.presence.resume_from_log(session.read_log(), session.absence, session.absent_after)
+        except Exception as e:
+            print(f"Error reading attendance log {session_log_path(sid)}: {e}")
+        return session
+    
+    def for_camera(self, camera: str) -> List[Session]:
+        """Open sessions watching this camera."""
+        sessions = self._by_camera.get(camera)
+        if sessions is None:
+            sessions = self._by_camera[camera] = [session for session in self.sessions.values()
+                                                  if session.covers(camera)]
+        return sessions
+    
+    def match(self, camera: str, encodings, tolerance: float,
+              fallback: Callable[[np.ndarray], List[Match]]) -> List[Match]:
+        """Match against the rosters of the camera's sessions first, then fallback() for the rest."""
+        encodings = np.atleast_2d(np.asarray(encodings))
+        results: List[Optional[Match]] = [None] * len(encodings)
+        pending = list(range(len(encodings)))
+        for session in self.for_camera(camera):
+            view = session.view(self.gallery)
+            if view is None or not pending:
+                continue
+            missed = []
+            for index, (student_id, distance) in zip(pending, view.match_many(encodings[pending], tolerance)):
+                if student_id is None:
+                    missed.append(index)
+                else:
+                    results[index] = (student_id, distance)
+            session.roster_hits += len(pending) - len(missed)
+            session.roster_misses += len(missed)
+            pending = missed
+        if pending:
+            for index, result in zip(pending, fallback(encodings[pending])):
+                results[index] = result
+        return results
+    
+    def see(self, camera: str, student_id: str, when: datetime) -> List[Session]:
+        """Credit a sighting to the camera's sessions expecting the student (all of them if none does)."""
+        sessions = self.for_camera(camera)
+        expecting = [session for session in sessions if session.expects(student_id)] or sessions
+        for session in expecting:
+            session.see(student_id, when)
+        return expecting
+    
+    def warm(self) -> int:
+        """Build every roster sub-gallery's match index now; returns students indexed."""
+        indexed = 0
+        for session in self:
+            view = session.view(self.gallery)
+            if view is not None:
+                indexed += view.warm()
+        return indexed
@@ -1,11 +1,14 @@
 import gspread
 import json
+import os
 import pandas as pd
 import time
 from datetime import datetime
 from oauth2client.service_account import ServiceAccountCredentials
 from typing import Optional
 
+from metrics import REGISTRY
+
 class SheetsSync:
     def __init__(self, credentials_path: str = 'credentials.json',
                  config_path: str = 'camera_config.json'):
@@ -21,6 +24,11 @@ class SheetsSync:
         self.client = None
         self.worksheet = None
         self.stopped = False
+        self.last_synced: Optional[float] = None
+        self.sync_latency = REGISTRY.histogram('sheets_sync_seconds', 'Time to push the attendance log to Sheets')
+        self.sync_failures = REGISTRY.counter('sheets_sync_failures_total', 'Failed Sheets syncs')
+        REGISTRY.gauge('sheets_sync_backlog_seconds', 'How long local attendance changes have waited for a sync',
+                       func=self.backlog_seconds)
     
     def connect(self, spreadsheet_name: str, worksheet_name: str = 'Attendance') -> bool:
         """Connect to Google Sheets."""
@@ -47,8 +55,20 @@ class SheetsSync:
             print(f"Error connecting to Google Sheets: {e}")
             return False
     
+    def backlog_seconds(self, path: str = 'attendance.xlsx') -> float:
+        """Seconds since the last sync if the local log has changed since, else 0."""
+        try:
+            modified = os.path.getmtime(path)
+        except OSError:
+            return 0.0
+        if self.last_synced is not None and modified <= self.last_synced:
+            return 0.0
+        since = self.last_synced if self.last_synced is not None else modified
+        return max(0.0, time.time() - since)
+    
     def sync_attendance(self) -> bool:
         """Sync local attendance Excel file to Google Sheets."""
+        started = time.time()
         try:
             # Read local attendance file
             df = pd.read_excel('attendance.xlsx')
@@ -69,9 +89,12 @@ class SheetsSync:
             if data:
                 self.worksheet.append_rows(data)
             
+            self.last_synced = started
+            self.sync_latency.observe(time.time() - started)
             return True
         except Exception as e:
             print(f"Error syncing attendance: {e}")
+            self.sync_failures.inc()
             return False
     
     def start_auto_sync(self, interval: Optional[int] = None):
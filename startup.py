@@ -0,0 +1,75 @@
+import importlib
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access.
+    
+    Importing face_recognition loads the dlib models, which takes seconds;
+    through a LazyModule that cost moves from start-up to the first call,
+    or to a Warmup running in the background. Concurrent first accesses
+    are serialised by the import system's module lock.
+    """
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+    
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None or self._name in sys.modules
+    
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+    
+    def __repr__(self) -> str:
+        return f"<lazy module {self._name!r}{'' if self.loaded else ' (not loaded)'}>"
+
+def lazy_import(name: str):
+    """The module if it is already imported, else a LazyModule for it."""
+    return sys.modules.get(name) or LazyModule(name)
+
+class Warmup:
+    """Start-up steps (model loading, gallery indexing) run in order on a background thread.
+    
+    state is 'pending', the name of the running step, 'ready' or 'failed';
+    the GUI polls it for its readiness indicator.
+    """
+    def __init__(self, steps: List[Tuple[str, Callable[[], object]]]):
+        self.steps = list(steps)
+        self.state = 'pending'
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self.done = threading.Event()
+    
+    def start(self) -> 'Warmup':
+        threading.Thread(target=self._run, name='warm-up', daemon=True).start()
+        return self
+    
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            for name, step in self.steps:
+                self.state = name
+                step_started = time.perf_counter()
+                step()
+                self.timings[name] = time.perf_counter() - step_started
+            self.state = 'ready'
+        except Exception as e:
+            print(f"Warm-up failed during {self.state}: {e}")
+            self.error = str(e)
+            self.state = 'failed'
+        finally:
+            self.timings['total'] = time.perf_counter() - started
+            self.done.set()
+    
+    @property
+    def ready(self) -> bool:
+        return self.state == 'ready'
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the warm-up has finished; True if it succeeded."""
+        return self.done.wait(timeout) and self.ready
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from presence import DEFAULT_ABSENT_AFTER
+
+# Minutes after the event start before a check-in counts as LATE
+STATUS_THRESHOLDS = {
+    'PRESENT': 0,
+    'LATE': 15,
+    'LEFT_EARLY': 30,
+    'ABSENT': None
+}
+# Last seen more than this before the end of the event counts as leaving early
+LEFT_EARLY_MARGIN = timedelta(minutes=10)
+DEFAULT_START = '09:00'
+DEFAULT_END = '17:00'
+
+class StatusEngine:
+    """Attendance status rules compiled for one event window.
+    
+    The window and thresholds are turned into datetime64 boundaries once;
+    evaluate() then classifies whole columns of check-in and last-seen
+    times with array comparisons:
+        
+        ABSENT      no check-in
+        LATE        checked in more than STATUS_THRESHOLDS['LATE'] minutes after the start
+        PRESENT     otherwise, unless
+        LEFT_EARLY  last seen more than LEFT_EARLY_MARGIN before the end, and either the
+                    event is over or the student has been unseen for absent_after seconds
+    
+    apply() remembers each student's inputs and only re-evaluates rows
+    whose check-in or last-seen time changed or whose absent_after
+    deadline passed since the previous call, plus every row once when
+    the event ends. A clock that goes backwards re-evaluates everything.
+    """
+    def __init__(self, start: datetime, end: datetime, thresholds: Optional[dict] = None,
+                 absent_after: float = DEFAULT_ABSENT_AFTER):
+        thresholds = STATUS_THRESHOLDS if thresholds is None else thresholds
+        self.start = pd.Timestamp(start)
+        self.end = pd.Timestamp(end)
+        self._late_after = np.datetime64(self.start + timedelta(minutes=thresholds['LATE']), 'ns')
+        self._left_before = np.datetime64(self.end - LEFT_EARLY_MARGIN, 'ns')
+        self._end = np.datetime64(self.end, 'ns')
+        self._absent_after = np.timedelta64(int(absent_after * 1e9), 'ns')
+        self._ids: Optional[np.ndarray] = None
+        self._inputs: Optional[np.ndarray] = None
+        self._ended = False
+        self._now: Optional[np.datetime64] = None
+    
+    @classmethod
+    def from_strings(cls, date: str, start: str = DEFAULT_START, end: str = DEFAULT_END,
+                     **kwargs) -> 'StatusEngine':
+        """Engine for the GUI's date and HH:MM fields, falling back to 09:00-17:00 today."""
+        try:
+            day = pd.to_datetime(date)
+            start_hour, start_minute = map(int, start.split(':'))
+            end_hour, end_minute = map(int, end.split(':'))
+            window = (day.replace(hour=start_hour, minute=start_minute, second=0, microsecond=0),
+                      day.replace(hour=end_hour, minute=end_minute, second=0, microsecond=0))
+        except Exception:
+            today = datetime.now().replace(second=0, microsecond=0)
+            window = (today.replace(hour=9, minute=0), today.replace(hour=17, minute=0))
+        return cls(*window, **kwargs)
+    
+    @classmethod
+    def from_event(cls, event, **kwargs) -> 'StatusEngine':
+        """Engine for an events.csv row (see events.active_event)."""
+        from events import event_window
+        return cls(*event_window(event), **kwargs)
+    
+    def evaluate(self, check_in, last_seen, now: Optional[datetime] = None) -> np.ndarray:
+        """Status for each (check_in, last_seen) pair; unparseable times count as missing."""
+        check_in = pd.to_datetime(pd.Series(check_in), errors='coerce').to_numpy('datetime64[ns]')
+        last_seen = pd.to_datetime(pd.Series(last_seen), errors='coerce').to_numpy('datetime64[ns]')
+        now = np.datetime64(pd.Timestamp(datetime.now() if now is None else now), 'ns')
+        status = np.where(check_in > self._late_after, 'LATE', 'PRESENT').astype(object)
+        # NaT compares False, so students never seen are not marked as leaving
+        gone = (now >= self._end) | (now - last_seen > self._absent_after)
+        status[(last_seen < self._left_before) & gone] = 'LEFT_EARLY'
+        status[np.isnat(check_in)] = 'ABSENT'
+        return status
+    
+    def status(self, check_in, last_seen, now: Optional[datetime] = None) -> str:
+        """Status of a single student."""
+        return self.evaluate([check_in], [last_seen], now)[0]
+    
+    def apply(self, df: pd.DataFrame, now: Optional[datetime] = None) -> List[str]:
+        """Update df['status'] in place for rows whose inputs changed; returns student_ids whose status changed."""
+        if df.empty:
+            return []
+        now = datetime.now() if now is None else now
+        ids = df['student_id'].astype(str).to_numpy()
+        inputs = np.stack([
+            pd.to_datetime(df['check_in_time'], errors='coerce').to_numpy('datetime64[ns]').view('i8'),
+            pd.to_datetime(df['last_seen_time'], errors='coerce').to_numpy('datetime64[ns]').view('i8')
+        ], axis=1)
+        ended = pd.Timestamp(now) >= self.end
+        current = np.datetime64(pd.Timestamp(now), 'ns')
+        if (self._inputs is None or ended != self._ended or 'status' not in df.columns
+                or current < self._now):
+            dirty = np.ones(len(df), dtype=bool)
+        elif np.array_equal(ids, self._ids):
+            dirty = (inputs != self._inputs).any(axis=1)
+        else:
+            # Rows added, removed or reordered: compare against the cached row of the same student
+            previous = pd.Index(self._ids)
+            if previous.is_unique:
+                positions = previous.get_indexer(ids)
+                known = positions >= 0
+                dirty = ~known
+                dirty[known] = (inputs[known] != self._inputs[positions[known]]).any(axis=1)
+            else:
+                dirty = np.ones(len(df), dtype=bool)
+        if self._now is not None:
+            # Unseen for absent_after since the last call: the row may now be LEFT_EARLY
+            last_seen = inputs[:, 1].view('datetime64[ns]')
+            due = last_seen + self._absent_after
+            dirty |= ~np.isnat(last_seen) & (due >= self._now) & (due < current)
+        self._ids, self._inputs, self._ended, self._now = ids, inputs, ended, current
+        if not dirty.any():
+            return []
+        if 'status' not in df.columns or df['status'].dtype != object:
+            df['status'] = df['status'].astype(object) if 'status' in df.columns else None
+        rows = np.flatnonzero(dirty)
+        status = self.evaluate(df['check_in_time'].iloc[rows], df['last_seen_time'].iloc[rows], now)
+        changed = df['status'].iloc[rows].to_numpy() != status
+        df.iloc[rows[changed], df.columns.get_loc('status')] = status[changed]
+        return ids[rows[changed]].tolist()
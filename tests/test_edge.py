@@ -0,0 +1,47 @@
+import io
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from edge import FLAG_ZLIB, HEADER, MAGIC, MIN_COMPRESS_SIZE, frame_payload, pack_batch, read_message
+
+ITEMS = [['Room 1', 7, 1700000000.5, 10, 60, 60, 10], ['Room 1', 7, 1700000000.5, 20, 90, 70, 40]]
+
+@pytest.mark.parametrize('level', [0, 1, 9])
+def test_batch_round_trip(level):
+    encodings = np.random.default_rng(0).normal(size=(2, 128))
+    wire = frame_payload(pack_batch('edge-1', ITEMS, encodings), level)
+    meta, decoded, size = read_message(io.BytesIO(wire))
+    assert size == len(wire)
+    assert meta['node'] == 'edge-1' and meta['items'] == ITEMS
+    assert decoded.dtype == np.float32 and decoded.shape == (2, 128)
+    assert np.allclose(decoded, encodings, atol=1e-6)
+    assert bool(HEADER.unpack(wire[:HEADER.size])[1] & FLAG_ZLIB) == (level > 0)
+
+def test_empty_batch_and_small_payload_stay_uncompressed():
+    wire = frame_payload(pack_batch('edge-1', [], np.empty((0, 128))), 9)
+    assert len(wire) - HEADER.size < MIN_COMPRESS_SIZE
+    assert HEADER.unpack(wire[:HEADER.size])[1] == 0
+    meta, decoded, _ = read_message(io.BytesIO(wire))
+    assert meta['items'] == [] and decoded.size == 0
+
+def test_stream_of_messages_then_eof():
+    encodings = np.ones((1, 128))
+    stream = io.BytesIO(frame_payload(pack_batch('a', ITEMS[:1], encodings))
+                        + frame_payload(pack_batch('b', ITEMS[1:], encodings * 2)))
+    assert read_message(stream)[0]['node'] == 'a'
+    meta, decoded, _ = read_message(stream)
+    assert meta['node'] == 'b' and np.all(decoded == 2)
+    assert read_message(stream) is None
+
+def test_truncated_and_corrupt_messages():
+    wire = frame_payload(pack_batch('edge-1', ITEMS, np.zeros((2, 128))))
+    assert read_message(io.BytesIO(wire[:HEADER.size - 1])) is None
+    assert read_message(io.BytesIO(wire[:-1])) is None
+    with pytest.raises(ValueError):
+        read_message(io.BytesIO(b'XXXX' + wire[len(MAGIC):]))
@@ -0,0 +1,116 @@
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import gallery as gallery_module
+from gallery import ENCODING_SIZE, FaceGallery, MatchCache
+
+def synthetic_gallery(students: int, seed: int = 0, precision: str = 'float64', **kwargs) -> FaceGallery:
+    """Students of 1-4 templates spread 0.2 around a random identity, as in benchmarks/run.py."""
+    rng = np.random.default_rng(seed)
+    gallery = FaceGallery(precision=precision, **kwargs)
+    for index in range(students):
+        identity = rng.normal(scale=0.1, size=ENCODING_SIZE)
+        count = int(rng.integers(1, 5))
+        noise = rng.normal(scale=0.2 / np.sqrt(ENCODING_SIZE), size=(count, ENCODING_SIZE))
+        gallery.add(f"s{index}", identity + noise)
+    return gallery
+
+def brute_force(gallery: FaceGallery, encoding: np.ndarray):
+    distances = {sid: float(np.linalg.norm(block - encoding, axis=1).min())
+                 for sid, block in gallery.templates.items()}
+    return min(distances.items(), key=lambda item: item[1])
+
+def test_exact_match_agrees_with_brute_force_on_hits_and_misses():
+    gallery = synthetic_gallery(200)
+    rng = np.random.default_rng(1)
+    probes = [gallery.templates[f"s{index}"][0] + rng.normal(scale=0.01, size=ENCODING_SIZE)
+              for index in range(0, 200, 7)]
+    probes += list(rng.normal(scale=0.1, size=(20, ENCODING_SIZE)))  # Strangers
+    for probe in probes:
+        nearest, nearest_distance = brute_force(gallery, probe)
+        student_id, distance = gallery.match(probe, tolerance=0.6)
+        assert np.isclose(distance, nearest_distance)
+        assert student_id == (nearest if nearest_distance <= 0.6 else None)
+    # A miss reports the true nearest template, not a centroid distance
+    stranger = np.full(ENCODING_SIZE, 0.5)
+    student_id, distance = gallery.match(stranger, tolerance=0.6)
+    assert student_id is None and np.isclose(distance, brute_force(gallery, stranger)[1])
+
+def test_quantized_match_many_agrees_with_exact_match():
+    exact = synthetic_gallery(300)
+    rng = np.random.default_rng(2)
+    probes = np.vstack([exact.templates[f"s{index}"][-1] + rng.normal(scale=0.01, size=ENCODING_SIZE)
+                        for index in range(0, 300, 5)] + [rng.normal(scale=0.1, size=(10, ENCODING_SIZE))])
+    expected = [exact.match(probe, tolerance=0.6)[0] for probe in probes]
+    assert any(student_id is None for student_id in expected) and any(expected)
+    for precision in ('float16', 'int8'):
+        quantized = synthetic_gallery(300, precision=precision)
+        assert [student_id for student_id, _ in quantized.match_many(probes, tolerance=0.6)] == expected
+
+def test_quantized_empty_and_smaller_than_shortlist():
+    for precision in ('float16', 'int8'):
+        empty = FaceGallery(precision=precision)
+        assert empty.match_many(np.zeros((2, ENCODING_SIZE))) == [(None, float('inf'))] * 2
+        assert empty.match(np.zeros(ENCODING_SIZE)) == (None, float('inf'))
+        
+        small = synthetic_gallery(2, seed=3, precision=precision, shortlist=64)
+        exact = synthetic_gallery(2, seed=3)
+        assert small.template_count < small.shortlist
+        probes = np.vstack([exact.templates['s0'][0], exact.templates['s1'][-1], np.full(ENCODING_SIZE, 0.5)])
+        results = small.match_many(probes, tolerance=0.6)
+        assert [student_id for student_id, _ in results] == [exact.match(probe)[0] for probe in probes]
+        assert [student_id for student_id, _ in results] == ['s0', 's1', None]
+        assert np.allclose([distance for _, distance in results], [exact.match(probe)[1] for probe in probes],
+                           atol=1e-4)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+def test_match_cache_ttl_and_lru_eviction(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(gallery_module.time, 'time', clock)
+    gallery = synthetic_gallery(10, seed=4)
+    cache = MatchCache(gallery, capacity=2, ttl=60, margin=0.05, component='test')
+    probe = {sid: block[0] for sid, block in gallery.templates.items()}
+    
+    assert cache.match(probe['s0'])[0] == 's0'
+    assert cache.match(probe['s1'])[0] == 's1'
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert cache.match(probe['s0'])[0] == 's0'  # Hit: s0 is now the most recently used
+    assert cache.hits == 1
+    assert cache.match(probe['s2'])[0] == 's2'  # Full: evicts s1, the least recently hit
+    assert list(cache.entries) == ['s0', 's2']
+    
+    clock.now += 61
+    assert cache.match(probe['s2'])[0] == 's2'
+    assert cache.misses == 4  # Both entries expired, so the gallery answered
+    assert list(cache.entries) == ['s2']
+
+def test_match_cache_falls_back_when_ambiguous():
+    gallery = FaceGallery()
+    base = np.zeros(ENCODING_SIZE)
+    twin = base.copy()
+    twin[0] = 0.5
+    gallery.add('a', base)
+    gallery.add('b', twin)
+    cache = MatchCache(gallery, capacity=8, margin=0.15, component='test')
+    probe = base.copy()
+    probe[0] = 0.25
+    for sid, encoding in (('a', base), ('b', twin)):
+        assert cache.match(encoding)[0] == sid
+    misses = cache.misses
+    # Equally close to a and b: the cache defers to the gallery
+    assert cache.match(probe) == gallery.match(probe)
+    assert (cache.misses, cache.ambiguous) == (misses + 1, 1)
+    # Far ahead of the runner-up and well under tolerance: answered from the cache
+    assert cache.match(base)[0] == 'a'
+    assert cache.hits == 1
@@ -0,0 +1,75 @@
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from presence import ExpiryQueue, PresenceTimeline, PresenceTracker
+
+def test_timeline_merges_sightings_within_gap_tolerance():
+    timeline = PresenceTimeline(gap_tolerance=60)
+    assert timeline.add(1000.0)
+    assert not timeline.add(1030.0)
+    assert not timeline.add(1020.0)  # Late sighting inside the open interval is ignored
+    assert timeline.add(1200.0)  # Gap longer than the tolerance opens a new interval
+    timeline.add(1250.0)
+    assert timeline.total_seconds() == 30 + 50
+    assert list(timeline.starts) == [1000.0] and list(timeline.ends) == [1030.0]
+
+def test_timeline_trims_old_intervals_but_keeps_their_time():
+    timeline = PresenceTimeline(gap_tolerance=1, max_intervals=2)
+    for start in range(0, 100, 10):
+        timeline.add(float(start))
+        timeline.add(start + 1.0)
+    assert len(timeline.starts) < 4
+    assert timeline.total_seconds() == 10
+
+def test_expiry_queue_touch_and_push_back():
+    queue = ExpiryQueue()
+    queue.touch('a', 10.0)
+    queue.touch('b', 20.0)
+    queue.touch('a', 30.0)  # Seen again: pushed back without a second heap entry
+    assert len(queue._heap) == 2
+    assert queue.pop_due(15.0) == []
+    assert queue.next_deadline() == 20.0
+    assert queue.pop_due(25.0) == ['b']
+    assert queue.pop_due(30.0) == ['a']
+    assert len(queue) == 0 and queue.next_deadline() is None
+
+def test_expiry_queue_earlier_deadline_and_discard_then_touch():
+    queue = ExpiryQueue()
+    queue.touch('a', 50.0)
+    queue.touch('a', 10.0)
+    assert queue.pop_due(10.0) == ['a']
+    assert queue.pop_due(60.0) == []  # The stale entry at 50 does not fire again
+    
+    queue.touch('b', 10.0)
+    queue.discard('b')
+    assert 'b' not in queue and queue.next_deadline() is None
+    queue.touch('b', 40.0)
+    assert queue.pop_due(20.0) == []
+    assert queue.pop_due(40.0) == ['b']
+
+def test_resume_from_log_seeds_expiry_queue():
+    """Students resumed after a restart expire absent_after after their logged last sighting."""
+    df = pd.DataFrame({
+        'student_id': ['s1', 's2', 's3'],
+        'check_in_time': ['2026-03-02 09:00:00', '2026-03-02 09:10:00', None],
+        'last_seen_time': ['2026-03-02 09:20:00', None, None],
+        'total_time_present': ['0:20:00', '0:00:00', ''],
+    })
+    tracker = PresenceTracker()
+    queue = ExpiryQueue()
+    assert tracker.resume_from_log(df, queue, absent_after=600) == 2
+    assert tracker.total_seconds('s1') == 1200
+    seen = datetime(2026, 3, 2, 9, 20).timestamp()
+    assert queue.deadlines == {'s1': seen + 600, 's2': datetime(2026, 3, 2, 9, 10).timestamp() + 600}
+    assert queue.pop_due(seen + 599) == ['s2']
+    tracker.see('s1', seen + 300)
+    queue.touch('s1', seen + 300 + 600)
+    assert queue.pop_due(seen + 600) == []
+    assert queue.pop_due(seen + 900) == ['s1']
+    assert tracker.total_seconds('s1') == 1200 + 300
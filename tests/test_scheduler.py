@@ -0,0 +1,70 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import scheduler
+from scheduler import DeadlineScheduler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+def make_scheduler(monkeypatch, retry_delay: float = 0.01):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler.time, 'monotonic', clock)
+    return DeadlineScheduler(retry_delay), clock
+
+def test_zero_period_runs_every_call(monkeypatch):
+    """Period 0 is a valid 'as fast as possible' task, not a division by zero."""
+    tasks, clock = make_scheduler(monkeypatch)
+    calls = []
+    task = tasks.add('detect', 0, lambda: calls.append(clock.now))
+    for _ in range(3):
+        assert tasks.run_pending() == 0.0
+        clock.now += 0.5
+    assert len(calls) == 3
+    assert task.skipped == 0
+    assert task.deadline == clock.now - 0.5
+    assert tasks.stats()['detect']['target_hz'] == 0.0
+
+def test_overloaded_task_skips_missed_slots(monkeypatch):
+    tasks, clock = make_scheduler(monkeypatch)
+    calls = []
+    task = tasks.add('detect', 1.0, lambda: calls.append(clock.now))
+    tasks.run_pending()
+    assert task.deadline == 1001.0
+    # 3.5 periods late: the missed slots are counted, not run back to back
+    clock.now = 1004.5
+    tasks.run_pending()
+    assert len(calls) == 2
+    assert task.skipped == 3
+    assert task.deadline == 1005.5
+    assert tasks.run_pending() == 1.0
+    assert len(calls) == 2
+
+def test_false_is_retried_without_counting_a_run(monkeypatch):
+    tasks, clock = make_scheduler(monkeypatch, retry_delay=0.25)
+    results = [False, True]
+    task = tasks.add('detect', 1.0, lambda: results.pop(0))
+    assert tasks.run_pending() == 0.25
+    assert task.deadline == 1000.25
+    assert task.runs.total == 0
+    clock.now = 1000.25
+    tasks.run_pending()
+    assert task.runs.total == 1
+    assert task.deadline == 1001.25  # One period after the retry that ran
+    assert task.skipped == 0
+
+def test_failing_task_keeps_its_schedule(monkeypatch):
+    tasks, clock = make_scheduler(monkeypatch)
+    
+    def fail():
+        raise RuntimeError("camera gone")
+    task = tasks.add('detect', 1.0, fail)
+    tasks.run_pending()
+    assert task.deadline == 1001.0
@@ -0,0 +1,44 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from gallery import save_encodings
+from monitor import MonitoringSystem
+
+def test_session_roster_scans_loaded_gallery(tmp_path, monkeypatch):
+    """A running event's roster is matched against a sub-gallery of the gallery the monitor loaded."""
+    config = json.load(open(os.path.join(ROOT, 'camera_config.json')))
+    config['monitoring_cameras'] = []
+    json.dump(config, open(tmp_path / 'camera_config.json', 'w'))
+    faces = tmp_path / 'faces'
+    faces.mkdir()
+    rng = np.random.default_rng(0)
+    encodings = {f"s{index}": rng.normal(size=128) for index in range(5)}
+    for student_id, encoding in encodings.items():
+        save_encodings(str(faces / f"{student_id}.npy"), encoding)
+    with open(tmp_path / 'events.csv', 'w') as f:
+        f.write("name,date,start,end,roster,cameras\n")
+        f.write(f"Lecture,{datetime.now():%Y-%m-%d},00:00,23:59,s1;s2,\n")
+    monkeypatch.chdir(tmp_path)
+    
+    monitor = MonitoringSystem(str(tmp_path / 'camera_config.json'), str(faces))
+    monitor.sessions.sync()
+    (session,) = list(monitor.sessions)
+    assert monitor.sessions.gallery is monitor.gallery
+    view = session.view(monitor.sessions.gallery)
+    assert view is not None and sorted(view.templates) == ['s1', 's2']
+    assert monitor.sessions.warm() == 2
+    
+    fallback_calls = []
+    matches = monitor.sessions.match('', np.stack([encodings['s1'], encodings['s4']]), 0.6,
+                                     lambda pending: fallback_calls.append(len(pending))
+                                     or monitor.gallery.match_many(pending, tolerance=0.6))
+    assert [student_id for student_id, _ in matches] == ['s1', 's4']
+    assert (session.roster_hits, session.roster_misses) == (1, 1)
+    assert fallback_calls == [1]  # Only the student off the roster needed the full gallery
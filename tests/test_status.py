@@ -0,0 +1,51 @@
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from status import StatusEngine
+
+START = datetime(2026, 3, 2, 9, 0)
+END = datetime(2026, 3, 2, 10, 0)
+
+def frame(*rows) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=['student_id', 'check_in_time', 'last_seen_time'])
+
+def test_apply_marks_left_early_once_absent_after_passes():
+    """A row whose inputs never change still leaves once it has been unseen for absent_after."""
+    engine = StatusEngine(START, END, absent_after=600)
+    df = frame(('s1', '2026-03-02 09:05:00', '2026-03-02 09:06:00'),
+               ('s2', '2026-03-02 09:20:00', '2026-03-02 09:40:00'))
+    assert engine.apply(df, now=datetime(2026, 3, 2, 9, 10)) == ['s1', 's2']
+    assert df['status'].tolist() == ['PRESENT', 'LATE']
+    assert engine.apply(df, now=datetime(2026, 3, 2, 9, 15)) == []
+    
+    assert engine.apply(df, now=datetime(2026, 3, 2, 9, 45)) == ['s1']
+    assert df['status'].tolist() == ['LEFT_EARLY', 'LATE']
+    assert df['status'].tolist() == engine.evaluate(df['check_in_time'], df['last_seen_time'],
+                                                    datetime(2026, 3, 2, 9, 45)).tolist()
+    assert engine.apply(df, now=datetime(2026, 3, 2, 9, 46)) == []
+
+def test_apply_agrees_with_evaluate_over_the_event():
+    engine = StatusEngine(START, END, absent_after=300)
+    df = frame(('s1', '2026-03-02 09:01:00', '2026-03-02 09:02:00'),
+               ('s2', None, None),
+               ('s3', '2026-03-02 09:30:00', '2026-03-02 09:55:00'))
+    for minute in range(0, 75, 3):
+        now = pd.Timestamp(START) + pd.Timedelta(minutes=minute)
+        engine.apply(df, now=now)
+        expected = engine.evaluate(df['check_in_time'], df['last_seen_time'], now)
+        assert df['status'].tolist() == expected.tolist(), now
+    assert df['status'].tolist() == ['LEFT_EARLY', 'ABSENT', 'LATE']
+
+def test_apply_reevaluates_everything_when_the_clock_goes_back():
+    engine = StatusEngine(START, END, absent_after=600)
+    df = frame(('s1', '2026-03-02 09:05:00', '2026-03-02 09:06:00'))
+    engine.apply(df, now=datetime(2026, 3, 2, 9, 45))
+    assert df['status'].tolist() == ['LEFT_EARLY']
+    assert engine.apply(df, now=datetime(2026, 3, 2, 9, 10)) == ['s1']
+    assert df['status'].tolist() == ['PRESENT']
@@ -0,0 +1,69 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from voting import IdentityVoter
+
+SEAT_A = (40, 120, 120, 40)
+SEAT_B = (40, 220, 120, 140)
+
+def test_identity_confirms_after_min_votes_of_window():
+    voter = IdentityVoter(window=5, min_votes=3, release_votes=2)
+    names = []
+    for now, vote in enumerate(['s1', None, 's1', 's2', 's1']):
+        identities, track_ids, confirmed, released = voter.update('cam', [SEAT_A], [vote], float(now))
+        names.append(identities[0])
+        assert track_ids == [0] and released == []
+        if now == 4:
+            assert confirmed == ['s1']
+    assert names == [None, None, None, None, 's1']
+    assert voter.confirmed() == {'s1'}
+    assert voter.confirmations == 1
+
+def test_single_false_match_neither_names_nor_flips_a_track():
+    voter = IdentityVoter(window=5, min_votes=3, release_votes=2)
+    for now in range(3):
+        voter.update('cam', [SEAT_A], ['s1'], float(now))
+    identities, _, confirmed, released = voter.update('cam', [SEAT_A], ['s2'], 3.0)
+    assert identities == ['s1'] and confirmed == [] and released == []
+
+def test_hysteresis_releases_only_below_release_votes():
+    voter = IdentityVoter(window=5, min_votes=3, release_votes=2)
+    for now in range(5):
+        voter.update('cam', [SEAT_A], ['s1'], float(now))
+    # Window s1 s1 s1 s1 s1 -> three misses leave two s1 votes: still held
+    for now in range(5, 8):
+        identities, _, _, released = voter.update('cam', [SEAT_A], [None], float(now))
+        assert identities == ['s1'] and released == []
+    identities, _, _, released = voter.update('cam', [SEAT_A], [None], 8.0)
+    assert identities == [None] and released == ['s1']
+    assert voter.releases == 1 and voter.confirmed() == set()
+
+def test_faces_are_assigned_one_to_one_by_overlap():
+    voter = IdentityVoter(window=1, min_votes=1)
+    _, first, _, _ = voter.update('cam', [SEAT_A, SEAT_B], ['s1', 's2'], 0.0)
+    # Listed in the other order and nudged: each face keeps the track of the seat it overlaps
+    nudged_b = (SEAT_B[0] + 5, SEAT_B[1] + 5, SEAT_B[2] + 5, SEAT_B[3] + 5)
+    identities, second, _, _ = voter.update('cam', [nudged_b, SEAT_A], ['s2', 's1'], 1.0)
+    assert second == [first[1], first[0]]
+    assert identities == ['s2', 's1']
+    # Two faces on one seat: only one can continue the track, the other starts a new one
+    _, third, _, _ = voter.update('cam', [SEAT_A, SEAT_A], ['s1', 's3'], 2.0)
+    assert len(set(third)) == 2 and first[0] in third
+    # Cameras keep separate tracks
+    _, other, _, _ = voter.update('other', [SEAT_A], ['s1'], 2.0)
+    assert other[0] not in first + third
+
+def test_unmatched_track_ends_after_max_age():
+    voter = IdentityVoter(window=1, min_votes=1, max_age=3.0)
+    _, first, confirmed, _ = voter.update('cam', [SEAT_A], ['s1'], 0.0)
+    assert confirmed == ['s1']
+    _, _, _, released = voter.update('cam', [SEAT_B], ['s2'], 3.0)
+    assert released == [] and len(voter.tracks['cam']) == 2
+    _, _, _, released = voter.update('cam', [SEAT_B], ['s2'], 3.5)
+    assert released == ['s1'] and len(voter.tracks['cam']) == 1
+    # The seat's next face starts a fresh track
+    _, track_ids, _, _ = voter.update('cam', [SEAT_A], ['s1'], 4.0)
+    assert track_ids != first
@@ -0,0 +1,135 @@
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+# A track confirms an identity once min_votes of its last window frames match it...
+DEFAULT_WINDOW = 5
+DEFAULT_MIN_VOTES = 3
+# ...and keeps it until fewer than release_votes of the window still do
+DEFAULT_RELEASE_VOTES = 2
+# A track not matched to a face for this long (seconds) ends
+DEFAULT_MAX_AGE = 3.0
+# Boxes in consecutive frames overlapping at least this much belong to one track
+DEFAULT_TRACK_IOU = 0.3
+
+Location = Tuple[int, int, int, int]
+
+def _iou(a: Location, b: Location) -> float:
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    overlap = max(0, right - left) * max(0, bottom - top)
+    union = (a[1] - a[3]) * (a[2] - a[0]) + (b[1] - b[3]) * (b[2] - b[0]) - overlap
+    return overlap / union if union > 0 else 0.0
+
+class Track:
+    """One face followed across a camera's frames, with the gallery match of each frame as a vote."""
+    __slots__ = ('id', 'location', 'votes', 'identity', 'last_seen')
+    
+    def __init__(self, track_id: int, location: Location, window: int, now: float):
+        self.id = track_id
+        self.location = location
+        self.votes: Deque[Optional[str]] = deque(maxlen=window)
+        self.identity: Optional[str] = None
+        self.last_seen = now
+    
+    def tally(self) -> Counter:
+        return Counter(vote for vote in self.votes if vote is not None)
+
+class IdentityVoter:
+    """Per-camera face tracks that only name a student after several frames agree.
+    
+    Each frame's faces are matched to the camera's tracks by box overlap
+    and every gallery match (or miss) is a vote. A track confirms the
+    student with min_votes of its last window votes and holds on to them
+    until fewer than release_votes remain, so a single false match neither
+    names a face nor flips a confirmed one. update() reports the students
+    confirmed and released, which are the only changes attendance needs
+    to be written for. window 1 with min_votes 1 names every match at once.
+    """
+    def __init__(self, window: int = DEFAULT_WINDOW, min_votes: int = DEFAULT_MIN_VOTES,
+                 release_votes: int = DEFAULT_RELEASE_VOTES, max_age: float = DEFAULT_MAX_AGE,
+                 iou: float = DEFAULT_TRACK_IOU):
+        self.window = max(1, window)
+        self.min_votes = min(max(1, min_votes), self.window)
+        self.release_votes = min(max(1, release_votes), self.min_votes)
+        self.max_age = max_age
+        self.iou = iou
+        self.tracks: Dict[str, List[Track]] = {}
+        self._next_id = 0
+        self.confirmations = 0
+        self.releases = 0
+    
+    @classmethod
+    def from_config(cls, config: dict) -> 'IdentityVoter':
+        """Voter using the `processing.voting` section of camera_config.json."""
+        options = config.get('processing', {}).get('voting', {})
+        return cls(options.get('window', DEFAULT_WINDOW), options.get('min_votes', DEFAULT_MIN_VOTES),
+                   options.get('release_votes', DEFAULT_RELEASE_VOTES), options.get('max_age', DEFAULT_MAX_AGE),
+                   options.get('iou', DEFAULT_TRACK_IOU))
+    
+    def update(self, camera: str, locations: Sequence[Location], student_ids: Sequence[Optional[str]],
+               now: float) -> Tuple[List[Optional[str]], List[int], List[str], List[str]]:
+        """Vote with one frame's matches (None for unknown faces).
+        
+        Returns the confirmed student of each face (None until its track
+        has one), each face's track id, and the students confirmed and
+        released by this frame.
+        """
+        tracks = self.tracks.setdefault(camera, [])
+        confirmed: List[str] = []
+        released: List[str] = []
+        
+        # Greedy one-to-one assignment of faces to tracks, best overlap first
+        pairs = sorted(((_iou(tuple(location), track.location), face, index)
+                        for face, location in enumerate(locations) for index, track in enumerate(tracks)),
+                       reverse=True)
+        assigned: Dict[int, Track] = {}
+        used = set()
+        for overlap, face, index in pairs:
+            if overlap < self.iou:
+                break
+            if face not in assigned and index not in used:
+                assigned[face] = tracks[index]
+                used.add(index)
+        
+        identities: List[Optional[str]] = []
+        track_ids: List[int] = []
+        for face, (location, student_id) in enumerate(zip(locations, student_ids)):
+            track = assigned.get(face)
+            if track is None:
+                track = Track(self._next_id, tuple(location), self.window, now)
+                self._next_id += 1
+                tracks.append(track)
+            track.location = tuple(location)
+            track.last_seen = now
+            track.votes.append(student_id)
+            tally = track.tally()
+            if track.identity is not None and tally[track.identity] < self.release_votes:
+                released.append(track.identity)
+                track.identity = None
+                self.releases += 1
+            if track.identity is None and tally:
+                leader, votes = tally.most_common(1)[0]
+                if votes >= self.min_votes:
+                    track.identity = leader
+                    confirmed.append(leader)
+                    self.confirmations += 1
+            identities.append(track.identity)
+            track_ids.append(track.id)
+        
+        # Tracks nobody has been matched to for max_age end, releasing their student
+        live = []
+        for track in tracks:
+            if now - track.last_seen <= self.max_age:
+                live.append(track)
+            elif track.identity is not None:
+                released.append(track.identity)
+                self.releases += 1
+        self.tracks[camera] = live
+        return identities, track_ids, confirmed, released
+    
+    def confirmed(self) -> Set[str]:
+        """Students held by a track on any camera right now."""
+        return {track.identity for tracks in self.tracks.values() for track in tracks if track.identity is not None}
+    
+    def reset(self):
+        self.tracks.clear()